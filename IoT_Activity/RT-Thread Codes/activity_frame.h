@@ -0,0 +1,80 @@
+#ifndef ACTIVITY_FRAME_H__
+#define ACTIVITY_FRAME_H__
+
+#include <rtthread.h>
+
+/*
+ * Binary upload frame - must match PythonAnywhere Codes/wire_protocol.py
+ * POST the frame bytes to /api/upload/binary with
+ * Content-Type: application/octet-stream
+ */
+
+#define FRAME_MAGIC_0           'A'
+#define FRAME_MAGIC_1           'R'
+#define FRAME_VERSION           1
+#define FRAME_MAX_SAMPLES       50      /* one STM32 window */
+
+#define FRAME_ACT_UNKNOWN       0
+#define FRAME_ACT_IDLE          1
+#define FRAME_ACT_WALKING       2
+#define FRAME_ACT_RUNNING       3
+#define FRAME_ACT_CALIBRATING   4
+
+#pragma pack(push, 1)
+struct frame_header
+{
+    char        magic[2];
+    rt_uint8_t  version;
+    rt_uint8_t  activity;
+    rt_uint32_t device_id;
+    rt_uint32_t seq;            /* sequence number of samples[0] */
+    rt_uint16_t sample_rate;    /* Hz */
+    rt_uint16_t count;
+};
+
+struct frame_sample
+{
+    rt_int16_t ax, ay, az;      /* raw ICM20608 LSB */
+    rt_int16_t gx, gy, gz;
+};
+
+struct activity_frame
+{
+    struct frame_header header;
+    struct frame_sample samples[FRAME_MAX_SAMPLES];
+};
+#pragma pack(pop)
+
+/* Cortex-M is little-endian, so the struct is already in wire order */
+rt_inline void frame_init(struct activity_frame *frame, rt_uint32_t device_id,
+                          rt_uint32_t seq, rt_uint16_t sample_rate)
+{
+    frame->header.magic[0] = FRAME_MAGIC_0;
+    frame->header.magic[1] = FRAME_MAGIC_1;
+    frame->header.version = FRAME_VERSION;
+    frame->header.activity = FRAME_ACT_UNKNOWN;
+    frame->header.device_id = device_id;
+    frame->header.seq = seq;
+    frame->header.sample_rate = sample_rate;
+    frame->header.count = 0;
+}
+
+/* Returns RT_TRUE once the frame is full and should be sent */
+rt_inline rt_bool_t frame_push(struct activity_frame *frame,
+                               rt_int16_t ax, rt_int16_t ay, rt_int16_t az,
+                               rt_int16_t gx, rt_int16_t gy, rt_int16_t gz)
+{
+    struct frame_sample *s = &frame->samples[frame->header.count++];
+
+    s->ax = ax; s->ay = ay; s->az = az;
+    s->gx = gx; s->gy = gy; s->gz = gz;
+
+    return frame->header.count >= FRAME_MAX_SAMPLES;
+}
+
+rt_inline rt_size_t frame_size(const struct activity_frame *frame)
+{
+    return sizeof(struct frame_header) + frame->header.count * sizeof(struct frame_sample);
+}
+
+#endif /* ACTIVITY_FRAME_H__ */
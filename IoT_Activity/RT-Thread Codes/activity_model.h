@@ -0,0 +1,342 @@
+#ifndef ACTIVITY_MODEL_H__
+#define ACTIVITY_MODEL_H__
+
+#include <rtthread.h>
+#include "activity_frame.h"
+
+/*
+ * GENERATED by Machine Learning Files/fixed_point_model.py - do not edit.
+ * Source: Machine Learning Files/lightweight_model.pkl
+ *
+ * Fixed-point random forest on raw ICM20608 samples. The scaler and LSB
+ * scales are folded into the int16 thresholds; leaves are P(running) * 255.
+ * Nodes are in preorder per tree: left child = i + 1, right child =
+ * root + model_right[i]. Features, per axis ax ay az gx gy gz:
+ * mean, std, min, max, median (integer, see activity_model_features).
+ *
+ *    0  ax_mean
+ *    1  ax_std
+ *    2  ax_min
+ *    3  ax_max
+ *    4  ax_median
+ *    5  ay_mean
+ *    6  ay_std
+ *    7  ay_min
+ *    8  ay_max
+ *    9  ay_median
+ *   10  az_mean
+ *   11  az_std
+ *   12  az_min
+ *   13  az_max
+ *   14  az_median
+ *   15  gx_mean
+ *   16  gx_std
+ *   17  gx_min
+ *   18  gx_max
+ *   19  gx_median
+ *   20  gy_mean
+ *   21  gy_std
+ *   22  gy_min
+ *   23  gy_max
+ *   24  gy_median
+ *   25  gz_mean
+ *   26  gz_std
+ *   27  gz_min
+ *   28  gz_max
+ *   29  gz_median
+ */
+
+#define ACTIVITY_MODEL_WINDOW       50
+#define ACTIVITY_MODEL_N_FEATURES   30
+#define ACTIVITY_MODEL_N_TREES      50
+#define ACTIVITY_MODEL_N_NODES      750
+#define ACTIVITY_MODEL_LEAF         255
+#define ACTIVITY_MODEL_PROB_ONE     255
+
+static const rt_uint16_t model_roots[50] =
+{
+    0, 3, 20, 39, 60, 79, 102, 125, 150, 163, 176, 187, 198, 209, 224, 235,
+    254, 267, 294, 301, 324, 347, 372, 377, 398, 409, 412, 431, 438, 461, 474, 501,
+    516, 527, 542, 563, 572, 577, 600, 607, 618, 629, 642, 649, 680, 697, 700, 719,
+    734, 743,
+};
+
+static const rt_uint8_t model_feature[750] =
+{
+    5, 255, 255, 8, 255, 27, 23, 27, 18, 255, 255, 255, 255, 21, 9, 255,
+    255, 9, 255, 255, 13, 5, 255, 255, 26, 29, 255, 255, 8, 255, 5, 255,
+    20, 7, 11, 255, 255, 255, 255, 6, 5, 255, 255, 9, 15, 18, 255, 4,
+    22, 9, 255, 255, 255, 255, 255, 9, 15, 255, 255, 255, 1, 11, 255, 255,
+    28, 11, 255, 255, 8, 255, 9, 255, 29, 23, 14, 255, 255, 255, 255, 1,
+    9, 255, 255, 15, 1, 5, 255, 255, 23, 13, 255, 255, 255, 26, 255, 13,
+    5, 255, 255, 9, 255, 255, 12, 1, 11, 255, 255, 9, 255, 11, 18, 255,
+    255, 23, 13, 255, 255, 28, 16, 255, 255, 255, 9, 255, 255, 11, 4, 255,
+    0, 255, 255, 11, 24, 255, 255, 8, 255, 13, 0, 255, 255, 5, 255, 28,
+    255, 19, 255, 22, 255, 255, 5, 255, 5, 28, 255, 0, 255, 255, 9, 17,
+    255, 255, 255, 6, 8, 255, 255, 1, 255, 5, 20, 255, 24, 255, 255, 255,
+    8, 255, 1, 10, 255, 255, 1, 9, 255, 255, 255, 1, 11, 255, 255, 5,
+    255, 29, 19, 255, 255, 255, 1, 255, 9, 255, 15, 9, 15, 255, 255, 255,
+    255, 3, 1, 255, 1, 0, 255, 255, 12, 15, 255, 255, 255, 9, 255, 255,
+    5, 255, 29, 255, 18, 255, 23, 23, 255, 255, 255, 1, 29, 0, 255, 255,
+    255, 13, 255, 26, 28, 255, 255, 11, 17, 255, 255, 5, 255, 255, 5, 255,
+    3, 29, 7, 255, 255, 19, 7, 255, 255, 255, 255, 13, 8, 255, 9, 255,
+    255, 3, 26, 255, 255, 28, 5, 255, 255, 5, 255, 19, 20, 9, 255, 255,
+    255, 3, 17, 255, 255, 255, 5, 255, 9, 24, 255, 255, 255, 6, 8, 255,
+    255, 28, 5, 255, 255, 11, 255, 1, 22, 255, 255, 26, 5, 255, 255, 10,
+    255, 5, 255, 255, 11, 8, 255, 7, 255, 255, 6, 27, 255, 255, 1, 255,
+    9, 7, 21, 255, 255, 255, 5, 10, 255, 255, 255, 27, 11, 12, 10, 255,
+    255, 255, 1, 22, 255, 255, 23, 255, 9, 15, 255, 255, 255, 11, 4, 255,
+    255, 5, 255, 255, 5, 255, 8, 255, 255, 1, 6, 255, 255, 13, 4, 255,
+    255, 11, 255, 9, 20, 255, 255, 19, 9, 23, 255, 255, 255, 255, 5, 255,
+    1, 6, 255, 255, 5, 15, 255, 255, 255, 9, 255, 255, 27, 8, 255, 5,
+    3, 255, 255, 255, 13, 5, 255, 255, 1, 255, 22, 255, 26, 255, 255, 9,
+    255, 5, 1, 255, 255, 255, 0, 13, 5, 255, 255, 17, 1, 255, 9, 255,
+    255, 6, 21, 255, 255, 255, 10, 5, 255, 255, 28, 255, 255, 1, 4, 255,
+    255, 5, 16, 255, 255, 29, 255, 29, 255, 255, 8, 255, 22, 11, 15, 255,
+    255, 18, 5, 255, 255, 8, 15, 13, 255, 255, 255, 23, 2, 255, 14, 255,
+    255, 255, 28, 255, 255, 8, 255, 5, 255, 19, 23, 7, 255, 255, 255, 9,
+    2, 255, 255, 255, 9, 5, 255, 24, 255, 255, 11, 5, 255, 255, 255, 13,
+    1, 255, 27, 255, 255, 8, 255, 27, 5, 255, 255, 7, 255, 255, 8, 255,
+    11, 255, 15, 0, 17, 255, 15, 28, 255, 2, 255, 22, 255, 255, 255, 22,
+    255, 255, 255, 9, 255, 7, 3, 0, 255, 255, 255, 255, 9, 11, 255, 255,
+    255, 0, 4, 9, 255, 255, 0, 19, 255, 255, 5, 255, 255, 1, 29, 255,
+    255, 4, 16, 255, 255, 5, 255, 255, 5, 255, 27, 1, 255, 255, 255, 1,
+    4, 255, 255, 26, 18, 255, 255, 5, 255, 255, 9, 255, 9, 18, 255, 255,
+    5, 14, 255, 255, 255, 8, 255, 5, 17, 255, 255, 21, 22, 21, 255, 255,
+    255, 255, 1, 5, 255, 255, 9, 255, 255, 11, 27, 255, 0, 255, 255, 26,
+    2, 255, 255, 6, 14, 255, 255, 28, 28, 255, 255, 5, 255, 23, 23, 255,
+    255, 13, 19, 255, 27, 255, 255, 255, 8, 255, 27, 23, 255, 255, 26, 7,
+    14, 255, 16, 255, 255, 255, 25, 255, 255, 9, 255, 255, 10, 28, 255, 14,
+    255, 255, 2, 18, 11, 255, 255, 16, 16, 255, 255, 255, 9, 255, 255, 6,
+    26, 255, 7, 255, 255, 5, 0, 255, 5, 255, 255, 5, 255, 255, 11, 255,
+    5, 255, 11, 5, 255, 255, 255, 5, 255, 5, 4, 255, 255, 255,
+};
+
+static const rt_int16_t model_threshold[750] =
+{
+    -1775, 0, 255, 24247, 0, -235, 282, -348, 245, 0, 255, 255,
+    255, 114, -5299, 0, 255, -5175, 0, 255, 16085, -765, 0, 255,
+    80, 10, 0, 255, 16533, 0, -2144, 0, -22, -23584, 9952, 0,
+    255, 255, 255, 9465, 3088, 0, 255, -4545, 6, 137, 255, 9299,
+    -482, -8362, 0, 255, 0, 255, 255, -2122, -11, 0, 255, 255,
+    4472, 9185, 0, 255, 188, 9969, 255, 0, 11986, 0, -6891, 0,
+    -58, 256, -1515, 255, 0, 255, 255, 5775, -5394, 0, 255, -14,
+    9528, -2286, 0, 255, 184, 30273, 255, 0, 255, 78, 0, 16420,
+    -3958, 0, 255, -3913, 0, 255, -13300, 4668, 8824, 0, 255, -6757,
+    0, 7612, 194, 0, 255, 184, 32246, 255, 0, 184, 106, 0,
+    255, 255, -4875, 0, 255, 5778, -8944, 255, 11156, 0, 255, 6168,
+    -13, 255, 0, 24247, 0, 12152, 10006, 0, 255, -2374, 0, 332,
+    255, 55, 255, -308, 255, 0, -2175, 0, -359, 233, 0, 1116,
+    0, 255, -2122, -259, 255, 255, 255, 9513, 25365, 0, 255, 4573,
+    0, -679, 15, 0, 40, 0, 255, 255, 24247, 0, 5775, 2126,
+    255, 0, 9431, -6405, 0, 255, 255, 4579, 8065, 0, 255, -2144,
+    0, -58, 48, 255, 0, 255, 4579, 0, -5691, 0, -16, -1515,
+    -19, 255, 0, 255, 255, 18667, 7215, 0, 11376, -7394, 255, 0,
+    -20857, -15, 255, 255, 255, -6751, 0, 255, -1775, 0, 10, 255,
+    326, 255, 184, 179, 255, 0, 255, 5282, 63, 9057, 0, 255,
+    255, 9585, 0, 75, 108, 255, 0, 5058, -233, 255, 0, -2175,
+    0, 255, -1185, 0, 11802, -58, -23794, 0, 255, -28, -23794, 0,
+    255, 255, 255, 16341, 21078, 0, -5967, 0, 255, 508, 142, 0,
+    255, 188, 446, 0, 255, -2144, 0, 56, -23, -2122, 0, 255,
+    255, 7258, -231, 255, 0, 255, -1775, 0, -2122, -8, 0, 255,
+    255, 9464, 22196, 0, 255, 182, 2351, 0, 255, 4374, 0, 4472,
+    -200, 0, 255, 111, -4378, 0, 255, -3064, 255, 3189, 0, 255,
+    5823, 25202, 0, -19136, 0, 255, 8773, -255, 255, 0, 4472, 0,
+    -4545, -17689, 163, 0, 255, 255, 2198, -2067, 255, 0, 255, -240,
+    6075, -876, 7910, 0, 255, 255, 4061, -191, 0, 255, 184, 255,
+    -4545, 6, 0, 255, 255, 6239, 11151, 0, 255, -1185, 0, 255,
+    -1775, 0, 20697, 0, 255, 4573, 14757, 0, 255, 13039, 8951, 0,
+    255, 4812, 0, -4378, 1, 0, 255, -28, -2107, 212, 0, 255,
+    255, 255, -2286, 0, 6584, 12601, 0, 255, 2198, -12, 0, 255,
+    255, -5103, 0, 255, -240, 19799, 0, 2208, 16260, 0, 255, 255,
+    17106, -1185, 0, 255, 6450, 0, -186, 255, 127, 0, 255, -5590,
+    0, -767, 10821, 0, 255, 255, 9078, 17708, 5000, 0, 255, -188,
+    5291, 0, 419, 0, 255, 11977, 145, 0, 255, 255, 2396, -2175,
+    0, 255, 255, 0, 255, 5639, 9423, 0, 255, -679, 78, 255,
+    0, 10, 255, 10, 0, 255, 24247, 0, -157, 5691, -2, 0,
+    255, 176, -1993, 0, 255, 31999, -8, 16365, 0, 255, 255, 282,
+    -9025, 255, 2040, 255, 0, 255, 234, 0, 255, 24491, 0, -2837,
+    0, -28, 195, -19557, 0, 255, 255, -4378, -25941, 0, 255, 255,
+    -4545, -1775, 0, 12, 0, 255, 9764, 4012, 0, 255, 255, 16060,
+    6435, 0, -323, 0, 255, 21035, 0, -152, -2144, 0, 255, -21973,
+    0, 255, 24204, 0, 4812, 0, -1, 16103, -282, 255, -1, 192,
+    0, -3185, 255, -215, 255, 0, 0, -403, 0, 255, 255, -5691,
+    0, -27239, 11964, -13329, 255, 0, 255, 255, -4378, 18501, 0, 255,
+    255, 9143, -6348, 766, 0, 255, -6447, 46, 255, 0, 825, 0,
+    255, 4441, -2, 255, 0, 6585, 132, 255, 0, -2175, 0, 255,
+    -1775, 0, -378, 11263, 0, 255, 255, 4573, 9423, 0, 255, 75,
+    329, 255, 0, -679, 0, 255, -5691, 0, -4545, 209, 0, 255,
+    2198, -1069, 255, 0, 255, 24247, 0, -679, -155, 0, 255, 125,
+    -393, 125, 255, 0, 255, 255, 6123, 1430, 0, 255, -4545, 0,
+    255, 5756, -345, 255, -11858, 255, 0, 96, -24593, 255, 0, 9106,
+    6780, 0, 255, 179, 172, 255, 0, -2837, 0, 184, 184, 255,
+    0, 19687, 52, 255, -318, 0, 255, 255, 24204, 0, -235, 185,
+    255, 255, 176, -20371, 1511, 255, 178, 0, 255, 255, 10, 0,
+    255, -4545, 0, 255, -513, 190, 0, 3077, 255, 0, -21556, 188,
+    8071, 0, 255, 132, 129, 255, 0, 255, -4875, 0, 255, 9340,
+    166, 0, -12638, 0, 255, -359, 10849, 0, -2656, 0, 255, 2236,
+    255, 255, 5864, 0, -2175, 0, 9764, 4002, 0, 255, 255, -1775,
+    0, 2198, -203, 0, 255, 255,
+};
+
+static const rt_uint16_t model_right[750] =
+{
+    2, 0, 0, 2, 0, 10, 9, 8, 7, 0, 0, 0, 0, 14, 13, 0,
+    0, 16, 0, 0, 4, 3, 0, 0, 8, 7, 0, 0, 10, 0, 12, 0,
+    18, 17, 16, 0, 0, 0, 0, 4, 3, 0, 0, 16, 15, 8, 0, 14,
+    13, 12, 0, 0, 0, 0, 0, 20, 19, 0, 0, 0, 4, 3, 0, 0,
+    8, 7, 0, 0, 10, 0, 12, 0, 18, 17, 16, 0, 0, 0, 0, 4,
+    3, 0, 0, 14, 9, 8, 0, 0, 13, 12, 0, 0, 0, 16, 0, 20,
+    19, 0, 0, 22, 0, 0, 20, 5, 4, 0, 0, 7, 0, 11, 10, 0,
+    0, 15, 14, 0, 0, 19, 18, 0, 0, 0, 22, 0, 0, 6, 3, 0,
+    5, 0, 0, 10, 9, 0, 0, 12, 0, 16, 15, 0, 0, 18, 0, 20,
+    0, 22, 0, 24, 0, 0, 2, 0, 8, 5, 0, 7, 0, 0, 12, 11,
+    0, 0, 0, 4, 3, 0, 0, 6, 0, 12, 9, 0, 11, 0, 0, 0,
+    2, 0, 6, 5, 0, 0, 10, 9, 0, 0, 0, 4, 3, 0, 0, 6,
+    0, 10, 9, 0, 0, 0, 2, 0, 4, 0, 10, 9, 8, 0, 0, 0,
+    0, 12, 3, 0, 7, 6, 0, 0, 11, 10, 0, 0, 0, 14, 0, 0,
+    2, 0, 4, 0, 6, 0, 10, 9, 0, 0, 0, 6, 5, 4, 0, 0,
+    0, 8, 0, 12, 11, 0, 0, 16, 15, 0, 0, 18, 0, 0, 2, 0,
+    12, 7, 6, 0, 0, 11, 10, 0, 0, 0, 0, 6, 3, 0, 5, 0,
+    0, 10, 9, 0, 0, 14, 13, 0, 0, 16, 0, 22, 21, 20, 0, 0,
+    0, 26, 25, 0, 0, 0, 2, 0, 6, 5, 0, 0, 0, 4, 3, 0,
+    0, 8, 7, 0, 0, 10, 0, 14, 13, 0, 0, 18, 17, 0, 0, 20,
+    0, 22, 0, 0, 6, 3, 0, 5, 0, 0, 10, 9, 0, 0, 12, 0,
+    18, 17, 16, 0, 0, 0, 22, 21, 0, 0, 0, 18, 7, 6, 5, 0,
+    0, 0, 11, 10, 0, 0, 13, 0, 17, 16, 0, 0, 0, 22, 21, 0,
+    0, 24, 0, 0, 2, 0, 4, 0, 0, 4, 3, 0, 0, 8, 7, 0,
+    0, 10, 0, 14, 13, 0, 0, 20, 19, 18, 0, 0, 0, 0, 2, 0,
+    6, 5, 0, 0, 10, 9, 0, 0, 0, 2, 0, 0, 8, 3, 0, 7,
+    6, 0, 0, 0, 12, 11, 0, 0, 14, 0, 16, 0, 18, 0, 0, 2,
+    0, 6, 5, 0, 0, 0, 16, 5, 4, 0, 0, 11, 8, 0, 10, 0,
+    0, 15, 14, 0, 0, 0, 20, 19, 0, 0, 22, 0, 0, 4, 3, 0,
+    0, 8, 7, 0, 0, 10, 0, 12, 0, 0, 2, 0, 24, 7, 6, 0,
+    0, 11, 10, 0, 0, 17, 16, 15, 0, 0, 0, 23, 20, 0, 22, 0,
+    0, 0, 26, 0, 0, 2, 0, 4, 0, 10, 9, 8, 0, 0, 0, 14,
+    13, 0, 0, 0, 6, 3, 0, 5, 0, 0, 10, 9, 0, 0, 0, 6,
+    3, 0, 5, 0, 0, 8, 0, 12, 11, 0, 0, 14, 0, 0, 2, 0,
+    4, 0, 20, 17, 8, 0, 16, 11, 0, 13, 0, 15, 0, 0, 0, 19,
+    0, 0, 0, 2, 0, 8, 7, 6, 0, 0, 0, 0, 4, 3, 0, 0,
+    0, 12, 5, 4, 0, 0, 9, 8, 0, 0, 11, 0, 0, 16, 15, 0,
+    0, 20, 19, 0, 0, 22, 0, 0, 2, 0, 6, 5, 0, 0, 0, 4,
+    3, 0, 0, 8, 7, 0, 0, 10, 0, 0, 2, 0, 6, 5, 0, 0,
+    10, 9, 0, 0, 0, 2, 0, 6, 5, 0, 0, 12, 11, 10, 0, 0,
+    0, 0, 4, 3, 0, 0, 6, 0, 0, 6, 3, 0, 5, 0, 0, 10,
+    9, 0, 0, 14, 13, 0, 0, 18, 17, 0, 0, 20, 0, 24, 23, 0,
+    0, 30, 27, 0, 29, 0, 0, 0, 2, 0, 6, 5, 0, 0, 14, 13,
+    10, 0, 12, 0, 0, 0, 16, 0, 0, 2, 0, 0, 6, 3, 0, 5,
+    0, 0, 16, 11, 10, 0, 0, 15, 14, 0, 0, 0, 18, 0, 0, 6,
+    3, 0, 5, 0, 0, 12, 9, 0, 11, 0, 0, 14, 0, 0, 2, 0,
+    4, 0, 8, 7, 0, 0, 0, 2, 0, 6, 5, 0, 0, 0,
+};
+
+rt_inline rt_uint32_t model_isqrt(rt_uint64_t v)
+{
+    rt_uint64_t bit = (rt_uint64_t)1 << 62;
+    rt_uint64_t res = 0;
+
+    while (bit > v) bit >>= 2;
+    while (bit != 0)
+    {
+        if (v >= res + bit)
+        {
+            v -= res + bit;
+            res = (res >> 1) + bit;
+        }
+        else
+        {
+            res >>= 1;
+        }
+        bit >>= 2;
+    }
+    return (rt_uint32_t)res;
+}
+
+/* Rounds toward minus infinity, unlike C '/' (b > 0) */
+rt_inline rt_int32_t model_floor_div(rt_int32_t a, rt_int32_t b)
+{
+    rt_int32_t q = a / b;
+
+    if ((a % b) != 0 && a < 0)
+        q--;
+    return q;
+}
+
+/* out[axis * 5 + stat] for stat = mean, std, min, max, median */
+rt_inline void activity_model_features(const struct frame_sample *samples, rt_int16_t *out)
+{
+    rt_int16_t sorted[ACTIVITY_MODEL_WINDOW];
+    int axis, i, j;
+
+    for (axis = 0; axis < 6; axis++)
+    {
+        rt_int32_t sum = 0;
+        rt_int64_t sum_sq = 0;
+        rt_int64_t variance;
+
+        for (i = 0; i < ACTIVITY_MODEL_WINDOW; i++)
+        {
+            rt_int16_t v = ((const rt_int16_t *)&samples[i])[axis];
+
+            sum += v;
+            sum_sq += (rt_int32_t)v * v;
+
+            /* insertion sort for min / max / median */
+            for (j = i; j > 0 && sorted[j - 1] > v; j--)
+                sorted[j] = sorted[j - 1];
+            sorted[j] = v;
+        }
+
+        variance = ((rt_int64_t)ACTIVITY_MODEL_WINDOW * sum_sq - (rt_int64_t)sum * sum)
+                   / ((rt_int64_t)ACTIVITY_MODEL_WINDOW * ACTIVITY_MODEL_WINDOW);
+
+        out[axis * 5 + 0] = (rt_int16_t)model_floor_div(sum, ACTIVITY_MODEL_WINDOW);
+        out[axis * 5 + 1] = (rt_int16_t)model_isqrt((rt_uint64_t)variance);
+        out[axis * 5 + 2] = sorted[0];
+        out[axis * 5 + 3] = sorted[ACTIVITY_MODEL_WINDOW - 1];
+#if ACTIVITY_MODEL_WINDOW % 2
+        out[axis * 5 + 4] = sorted[ACTIVITY_MODEL_WINDOW / 2];
+#else
+        out[axis * 5 + 4] = (rt_int16_t)model_floor_div((rt_int32_t)sorted[ACTIVITY_MODEL_WINDOW / 2 - 1]
+                                                        + sorted[ACTIVITY_MODEL_WINDOW / 2], 2);
+#endif
+    }
+}
+
+/*
+ * Classify one full window of raw samples.
+ * Returns FRAME_ACT_RUNNING or FRAME_ACT_WALKING; *confidence is 0..255.
+ */
+rt_inline rt_uint8_t activity_model_predict(const struct frame_sample *samples, rt_uint8_t *confidence)
+{
+    rt_int16_t features[ACTIVITY_MODEL_N_FEATURES];
+    rt_uint32_t votes = 0;
+    rt_uint32_t full = (rt_uint32_t)ACTIVITY_MODEL_PROB_ONE * ACTIVITY_MODEL_N_TREES;
+    rt_bool_t running;
+    int t;
+
+    activity_model_features(samples, features);
+
+    for (t = 0; t < ACTIVITY_MODEL_N_TREES; t++)
+    {
+        rt_uint32_t root = model_roots[t];
+        rt_uint32_t i = root;
+
+        while (model_feature[i] != ACTIVITY_MODEL_LEAF)
+        {
+            if (features[model_feature[i]] <= model_threshold[i])
+                i = i + 1;
+            else
+                i = root + model_right[i];
+        }
+        votes += (rt_uint32_t)model_threshold[i];
+    }
+
+    running = 2 * votes > full;
+    if (confidence != RT_NULL)
+        *confidence = (rt_uint8_t)((running ? votes : full - votes) / ACTIVITY_MODEL_N_TREES);
+
+    return running ? FRAME_ACT_RUNNING : FRAME_ACT_WALKING;
+}
+
+#endif /* ACTIVITY_MODEL_H__ */
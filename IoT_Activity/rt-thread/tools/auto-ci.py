@@ -42,33 +42,42 @@ bsp_to_cpu = {
     'stm32f40x': 'arm',
 }
 
-results = {
-    'success': [],
-    'fail': [],
-    'ignore': []
-}
+# buildfleet's process pool imports this script again on Windows
+if __name__ == '__main__':
+    results = {
+        'success': [],
+        'fail': [],
+        'ignore': []
+    }
+
+    fail = False
+
+    BSP_ROOT = '../bsp'
 
-fail = False
+    import buildfleet
 
-BSP_ROOT = '../bsp'
+    selected = []
+    for bsp,cpu in bsp_to_cpu.items():
+        project_dir = os.path.join(BSP_ROOT, bsp)
+        if os.getenv('RTT_CPU') == cpu and os.path.isfile(os.path.join(project_dir, 'SConstruct')):
+            selected.append(os.path.abspath(project_dir))
+        else:
+            results['ignore'].append(bsp)
 
-for bsp,cpu in bsp_to_cpu.items():
-    project_dir = os.path.join(BSP_ROOT, bsp)
-    if os.getenv('RTT_CPU') == cpu and os.path.isfile(os.path.join(project_dir, 'SConstruct')):
-        if os.system('scons --directory=' + project_dir) != 0:
-            results['fail'].append(bsp)
+    # build the selected BSPs concurrently, logs and summaries go to ../../rt-thread-fleet/
+    for r in buildfleet.build(selected, [BSP_ROOT]):
+        if r['status'] == 'fail':
+            results['fail'].append(r['bsp'])
             fail = True
         else:
-            results['success'].append(bsp)
-    else:
-        results['ignore'].append(bsp)
+            results['success'].append(r['bsp'])
 
-for result,bsp_list in results.items():
-    print("## {0}: {1}\n".format(result, len(bsp_list)))
-    for bsp in bsp_list:
-        print("* " + bsp)
+    for result,bsp_list in results.items():
+        print("## {0}: {1}\n".format(result, len(bsp_list)))
+        for bsp in bsp_list:
+            print("* " + bsp)
 
-if fail:
-    sys.exit(1)
-else:
-    sys.exit(0)
+    if fail:
+        sys.exit(1)
+    else:
+        sys.exit(0)
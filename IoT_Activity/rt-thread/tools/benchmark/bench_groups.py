@@ -0,0 +1,74 @@
+#
+# File      : bench_groups.py
+# This file is part of RT-Thread RTOS
+# COPYRIGHT (C) 2006 - 2023, RT-Thread Development Team
+#
+#  This program is free software; you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation; either version 2 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License along
+#  with this program; if not, write to the Free Software Foundation, Inc.,
+#  51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+# Change Logs:
+# Date           Author       Notes
+#
+
+"""
+SConscript evaluation time of synthetic BSPs with growing group counts.
+
+    python bench_groups.py --groups 250 500 1000 2000 --merge 4
+    python bench_groups.py --tools ../ /tmp/tools-before
+
+Each tree is evaluated with `scons -h --debug=time` once per tools
+directory, so the DefineGroup bookkeeping of two revisions can be compared
+(e.g. a `git worktree` of the previous commit). Reported is SCons' own
+"SConscript file execution time", best of --repeat runs.
+"""
+
+import argparse
+import os
+import re
+import subprocess
+import sys
+import tempfile
+
+import synthetic_bsp
+
+EXEC_TIME = re.compile(r'Total SConscript file execution time:\s*([0-9.]+)')
+
+def sconscript_time(bsp, tools):
+    cmd = [sys.executable, '-m', 'SCons', '-h', '-Q', '--debug=time', 'TOOLS=' + os.path.abspath(tools)]
+    out = subprocess.run(cmd, cwd=bsp, stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                         universal_newlines=True)
+    match = EXEC_TIME.search(out.stdout)
+    if out.returncode != 0 or not match:
+        sys.exit('scons failed in %s:\n%s' % (bsp, out.stdout[-2000:]))
+    return float(match.group(1))
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark DefineGroup with synthetic SConscript trees')
+    parser.add_argument('--groups', type=int, nargs='+', default=[250, 500, 1000, 2000])
+    parser.add_argument('--files', type=int, default=4, help='C files per group directory')
+    parser.add_argument('--merge', type=int, default=1, help='SConscripts sharing one group name')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--tools', nargs='+', default=[synthetic_bsp.tools_dir()])
+    parser.add_argument('--root', default=os.path.join(tempfile.gettempdir(), 'rtt_bench_groups'))
+    args = parser.parse_args()
+
+    print('%8s %8s  %s' % ('dirs', 'groups', '  '.join('%14s' % os.path.basename(os.path.abspath(t)) for t in args.tools)))
+    for groups in args.groups:
+        bsp = synthetic_bsp.generate(args.root, groups=groups, files=args.files, merge=args.merge)
+        times = [min(sconscript_time(bsp, tools) for _ in range(args.repeat)) for tools in args.tools]
+        print('%8d %8d  %s' % (groups, (groups + args.merge - 1) // args.merge,
+                               '  '.join('%13.3fs' % t for t in times)))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,112 @@
+#
+# File      : bench_snapshot.py
+# This file is part of RT-Thread RTOS
+# COPYRIGHT (C) 2006 - 2023, RT-Thread Development Team
+#
+#  This program is free software; you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation; either version 2 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License along
+#  with this program; if not, write to the Free Software Foundation, Inc.,
+#  51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+# Change Logs:
+# Date           Author       Notes
+#
+
+"""
+Project generation with and without the project snapshot (.rtproject.json).
+
+    python bench_snapshot.py
+    python bench_snapshot.py --groups 2000 --targets cmake makefile vsc
+
+Every target is generated twice on a synthetic BSP, with --no-snapshot
+(all SConscripts evaluated) and from the snapshot the previous run left.
+The generated files of both runs must be identical, the script exits
+non-zero otherwise. Runs use `scons -h` so only the SConscript phase and
+the generator are timed, not SCons walking the whole build graph.
+"""
+
+import argparse
+import filecmp
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+import synthetic_bsp
+
+OUTPUTS = ['CMakeLists.txt', 'Makefile', 'config.mk', 'rtconfig.mk', '.vscode']
+
+def generate(bsp, tools, target, snapshot):
+    cmd = [sys.executable, '-m', 'SCons', '-h', '-Q', '--target=' + target, 'TOOLS=' + os.path.abspath(tools)]
+    if not snapshot:
+        cmd.append('--no-snapshot')
+
+    start = time.time()
+    out = subprocess.run(cmd, cwd=bsp, stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                         universal_newlines=True)
+    elapsed = time.time() - start
+    if out.returncode != 0:
+        sys.exit('scons failed in %s:\n%s' % (bsp, out.stdout[-2000:]))
+    if snapshot and 'Reuse project snapshot' not in out.stdout:
+        sys.exit('--target=%s did not reuse the snapshot' % target)
+    return elapsed
+
+def save_outputs(bsp, dst):
+    if os.path.exists(dst):
+        shutil.rmtree(dst)
+    os.makedirs(dst)
+    for name in OUTPUTS:
+        src = os.path.join(bsp, name)
+        if os.path.isdir(src):
+            shutil.copytree(src, os.path.join(dst, name))
+        elif os.path.isfile(src):
+            shutil.copy2(src, dst)
+            os.remove(src)
+
+def same_tree(a, b):
+    cmp = filecmp.dircmp(a, b)
+    if cmp.left_only or cmp.right_only or cmp.diff_files or cmp.funny_files:
+        return False
+    return all(same_tree(os.path.join(a, d), os.path.join(b, d)) for d in cmp.common_dirs)
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark --target with the project snapshot')
+    parser.add_argument('--groups', type=int, default=1000)
+    parser.add_argument('--files', type=int, default=4, help='C files per group directory')
+    parser.add_argument('--local', type=int, default=20, help='groups with LOCAL_* flags')
+    parser.add_argument('--targets', nargs='+', default=['cmake', 'makefile', 'vsc'])
+    parser.add_argument('--tools', default=synthetic_bsp.tools_dir())
+    parser.add_argument('--root', default=os.path.join(tempfile.gettempdir(), 'rtt_bench_snapshot'))
+    args = parser.parse_args()
+
+    bsp = synthetic_bsp.generate(args.root, groups=args.groups, files=args.files, local=args.local)
+    out = os.path.join(args.root, 'out')
+
+    print('%-10s %14s %14s' % ('target', 'no snapshot', 'snapshot'))
+    failed = False
+    for target in args.targets:
+        full = generate(bsp, args.tools, target, False)
+        save_outputs(bsp, os.path.join(out, target, 'full'))
+        reused = generate(bsp, args.tools, target, True)
+        save_outputs(bsp, os.path.join(out, target, 'snapshot'))
+
+        same = same_tree(os.path.join(out, target, 'full'), os.path.join(out, target, 'snapshot'))
+        failed = failed or not same
+        print('%-10s %13.2fs %13.2fs  %s' % (target, full, reused, 'same output' if same else 'OUTPUT DIFFERS'))
+
+    if failed:
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,107 @@
+#
+# File      : bench_unity.py
+# This file is part of RT-Thread RTOS
+# COPYRIGHT (C) 2006 - 2023, RT-Thread Development Team
+#
+#  This program is free software; you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation; either version 2 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License along
+#  with this program; if not, write to the Free Software Foundation, Inc.,
+#  51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+# Change Logs:
+# Date           Author       Notes
+#
+
+"""
+Clean build time of the per-file build against `scons --unity`.
+
+    python bench_unity.py
+    python bench_unity.py --groups 100 --files 16 --jobs 8 --sizes 4 8 16
+
+A synthetic BSP is built from clean once per file and once for every
+--unity-size. The shared header is padded to `--header-lines` declarations
+so each translation unit parses about as much as one including rtthread.h.
+The global symbols of every unity build must be the ones of the per-file
+build, the script exits non-zero otherwise.
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import synthetic_bsp
+
+def write_header(bsp, lines):
+    text = '#ifndef SHARED_H__\n#define SHARED_H__\n#define SHARED_SCALE 3\n\n'
+    for i in range(lines // 4):
+        text += 'struct shared_object%d\n{\n    int value;\n};\n' % i
+    text += '\n#endif\n'
+    with open(os.path.join(bsp, 'shared.h'), 'w') as f:
+        f.write(text)
+
+def scons(bsp, tools, args):
+    cmd = [sys.executable, '-m', 'SCons', '-Q', 'TOOLS=' + os.path.abspath(tools)] + args
+    out = subprocess.run(cmd, cwd=bsp, stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                         universal_newlines=True)
+    if out.returncode != 0:
+        sys.exit('scons %s failed in %s:\n%s' % (' '.join(args), bsp, out.stdout[-2000:]))
+    return out.stdout
+
+def build(bsp, tools, jobs, args):
+    scons(bsp, tools, ['-c'] + args)
+    start = time.time()
+    out = scons(bsp, tools, ['-j%d' % jobs] + args)
+    elapsed = time.time() - start
+    compiles = len([l for l in out.splitlines() if l.startswith('CC ') or l.startswith('CXX ')])
+    return elapsed, compiles
+
+def symbols(bsp):
+    out = subprocess.check_output(['nm', '-g', '--defined-only', os.path.join(bsp, 'rtthread.elf')],
+                                  universal_newlines=True)
+    return set(l.split()[-1] for l in out.splitlines() if l.strip())
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark clean builds with --unity')
+    parser.add_argument('--groups', type=int, default=50)
+    parser.add_argument('--files', type=int, default=16, help='C files per group directory')
+    parser.add_argument('--local', type=int, default=5, help='groups with LOCAL_* flags, built per file')
+    parser.add_argument('--header-lines', type=int, default=20000)
+    parser.add_argument('--jobs', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[4, 8, 16], help='--unity-size values')
+    parser.add_argument('--tools', default=synthetic_bsp.tools_dir())
+    parser.add_argument('--root', default=os.path.join(tempfile.gettempdir(), 'rtt_bench_unity'))
+    args = parser.parse_args()
+
+    bsp = synthetic_bsp.generate(args.root, groups=args.groups, files=args.files, local=args.local)
+    write_header(bsp, args.header_lines)
+
+    elapsed, compiles = build(bsp, args.tools, args.jobs, [])
+    expected = symbols(bsp)
+    print('%-16s %8s %10s' % ('mode', 'compiles', 'clean build'))
+    print('%-16s %8d %9.2fs' % ('per file', compiles, elapsed))
+
+    failed = False
+    for size in args.sizes:
+        elapsed, compiles = build(bsp, args.tools, args.jobs, ['--unity', '--unity-size=%d' % size])
+        same = symbols(bsp) == expected
+        failed = failed or not same
+        print('%-16s %8d %9.2fs  %s' % ('unity size %d' % size, compiles, elapsed,
+                                         'same symbols' if same else 'SYMBOLS DIFFER'))
+
+    if failed:
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,139 @@
+#
+# File      : check_local_objects.py
+# This file is part of RT-Thread RTOS
+# COPYRIGHT (C) 2006 - 2023, RT-Thread Development Team
+#
+#  This program is free software; you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation; either version 2 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License along
+#  with this program; if not, write to the Free Software Foundation, Inc.,
+#  51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+# Change Logs:
+# Date           Author       Notes
+#
+
+"""
+Check building.RemoveLocalObjects against the loop DoBuilding used before.
+
+    python check_local_objects.py
+    python check_local_objects.py --groups 400 --files 20 --local 60
+
+Builds a synthetic project with real SCons nodes: groups of source files,
+some SConscripts returning their sources and some returning Env.Object()
+nodes, plus prebuilt objects that belong to no group. Both implementations
+get the same flattened object list; the check fails unless they return the
+same nodes in the same order. Exits non-zero on a mismatch.
+"""
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+import synthetic_bsp
+
+RTCONFIG_PY = '''PLATFORM = 'gcc'
+CROSS_TOOL = 'gcc'
+CC = 'gcc'
+EXEC_PATH = '/usr/bin'
+POST_ACTION = ''
+'''
+
+LOCAL_KEYS = ['LOCAL_CFLAGS', 'LOCAL_CCFLAGS', 'LOCAL_CXXFLAGS', 'LOCAL_CPPPATH', 'LOCAL_CPPDEFINES']
+
+def reference_remove(objects, groups):
+    # DoBuilding before RemoveLocalObjects, kept verbatim
+    for group in groups:
+        if 'LOCAL_CFLAGS' in group or 'LOCAL_CXXFLAGS' in group or 'LOCAL_CCFLAGS' in group or 'LOCAL_CPPPATH' in group or 'LOCAL_CPPDEFINES' in group:
+            for source in group['src']:
+                for obj in objects:
+                    if source.abspath == obj.abspath or (len(obj.sources) > 0 and source.abspath == obj.sources[0].abspath):
+                        objects.remove(obj)
+    return objects
+
+def synthetic_project(env, groups, files, local, seed):
+    from SCons.Script import File
+
+    rnd = random.Random(seed)
+    local_index = set(rnd.sample(range(groups), local))
+
+    projects = []
+    objects = []
+    for g in range(groups):
+        src = File(['build/g%04d/f%03d.c' % (g, f) for f in range(files)])
+        group = {'name': 'group%04d' % g, 'src': src}
+        if g in local_index:
+            group[rnd.choice(LOCAL_KEYS)] = ['-DLOCAL_%d' % g]
+        projects.append(group)
+
+        # SConscripts return either their sources or objects built from them
+        if rnd.random() < 0.25:
+            objects.append([env.Object(s)[0] for s in src])
+        else:
+            objects.append(src)
+
+        # a prebuilt object now and then, part of no group
+        if rnd.random() < 0.1:
+            objects.append(File('build/g%04d/prebuilt.o' % g))
+
+    def one_list(l):
+        lst = []
+        for item in l:
+            if type(item) == type([]):
+                lst += one_list(item)
+            else:
+                lst.append(item)
+        return lst
+
+    return projects, one_list(objects)
+
+def main():
+    parser = argparse.ArgumentParser(description='Check RemoveLocalObjects against the previous DoBuilding loop')
+    parser.add_argument('--groups', type=int, default=300)
+    parser.add_argument('--files', type=int, default=15, help='sources per group')
+    parser.add_argument('--local', type=int, default=40, help='groups with LOCAL_* flags')
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    work = tempfile.mkdtemp(prefix='rtt_local_objects_')
+    with open(os.path.join(work, 'rtconfig.py'), 'w') as f:
+        f.write(RTCONFIG_PY)
+    os.chdir(work)
+    sys.path = [synthetic_bsp.tools_dir(), work] + sys.path
+
+    import building
+    from SCons.Script import Environment
+
+    env = Environment(tools=['gcc'])
+    projects, objects = synthetic_project(env, args.groups, args.files, args.local, args.seed)
+
+    start = time.time()
+    expected = reference_remove(list(objects), projects)
+    reference_time = time.time() - start
+
+    start = time.time()
+    result = building.RemoveLocalObjects(list(objects), projects)
+    new_time = time.time() - start
+
+    print('objects: %d, groups: %d (%d local), kept: %d' % (len(objects), len(projects), args.local, len(result)))
+    print('previous loop:      %8.3fs' % reference_time)
+    print('RemoveLocalObjects: %8.3fs' % new_time)
+
+    if [id(o) for o in result] != [id(o) for o in expected]:
+        print('MISMATCH: %d objects expected, %d returned' % (len(expected), len(result)))
+        sys.exit(1)
+    print('OK: identical object lists')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,186 @@
+#
+# File      : synthetic_bsp.py
+# This file is part of RT-Thread RTOS
+# COPYRIGHT (C) 2006 - 2023, RT-Thread Development Team
+#
+#  This program is free software; you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation; either version 2 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License along
+#  with this program; if not, write to the Free Software Foundation, Inc.,
+#  51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+# Change Logs:
+# Date           Author       Notes
+#
+
+"""
+Generate a self-contained BSP + RT-Thread root for benchmarking the tools.
+
+    bsp/        SConstruct, rtconfig.py, rtconfig.h and one SConscript per
+                group directory (g0000/, g0001/, ...)
+    rtt/        src/, libcpu/, components/ SConscripts as PrepareBuilding
+                expects them
+
+Every group directory holds `files` small C files that include a shared
+header. `merge` SConscripts define the same group name, `local` of the
+groups carry LOCAL_CFLAGS/LOCAL_CPPPATH/LOCAL_CPPDEFINES. The SConstruct
+imports building.py from the TOOLS directory given on the command line, so
+the same tree can be run against two checkouts of tools/.
+"""
+
+import os
+import shutil
+
+SCONSTRUCT = '''import os
+import sys
+
+TOOLS = ARGUMENTS.get('TOOLS')
+RTT_ROOT = os.path.normpath(os.path.join(os.getcwd(), '..', 'rtt'))
+
+sys.path = [TOOLS] + sys.path
+from building import *
+import rtconfig
+
+env = Environment(tools = ['gcc', 'gnulink', 'ar', 'as'],
+    CC = rtconfig.CC, CFLAGS = rtconfig.CFLAGS,
+    AR = rtconfig.AR, ARFLAGS = '-rc',
+    LINK = rtconfig.LINK, LINKFLAGS = rtconfig.LFLAGS)
+env.PrependENVPath('PATH', rtconfig.EXEC_PATH)
+
+objs = PrepareBuilding(env, RTT_ROOT, has_libcpu=False)
+
+DoBuilding(rtconfig.TARGET_NAME, objs)
+'''
+
+RTCONFIG_PY = '''import os
+
+ARCH = 'sim'
+CPU = 'posix'
+CROSS_TOOL = 'gcc'
+PLATFORM = 'gcc'
+EXEC_PATH = os.path.dirname(os.path.realpath('{cc}'))
+BUILD = 'debug'
+
+PREFIX = ''
+CC = '{cc}'
+CXX = '{cc}'
+AS = '{cc}'
+AR = 'ar'
+LINK = '{cc}'
+OBJCPY = 'objcopy'
+OBJDUMP = 'objdump'
+SIZE = 'size'
+TARGET_NAME = 'rtthread.elf'
+
+CFLAGS = '-O0 -g'
+CXXFLAGS = CFLAGS
+AFLAGS = '-c -x assembler-with-cpp'
+LFLAGS = ''
+POST_ACTION = ''
+'''
+
+GROUP_SCONSCRIPT = '''from building import *
+
+cwd = GetCurrentDir()
+src = Glob('*.c')
+CPPPATH = [cwd]
+
+group = DefineGroup('{name}', src, depend = [''], CPPPATH = CPPPATH{local_args})
+
+Return('group')
+'''
+
+LOCAL_ARGS = ", LOCAL_CFLAGS = ' -DLOCAL_{index}', LOCAL_CPPPATH = [cwd + '/private'], LOCAL_CPPDEFINES = ['GROUP_{index}']"
+
+DIRS_SCONSCRIPT = '''import os
+from building import *
+
+cwd = GetCurrentDir()
+objs = []
+
+for d in sorted(os.listdir(cwd)):
+    if os.path.isfile(os.path.join(cwd, d, 'SConscript')):
+        objs = objs + SConscript(os.path.join(d, 'SConscript'))
+
+Return('objs')
+'''
+
+EMPTY_SCONSCRIPT = '''objs = []
+Return('objs')
+'''
+
+KERNEL_SCONSCRIPT = '''from building import *
+
+src = Glob('*.c')
+group = DefineGroup('Kernel', src, depend = [''])
+
+Return('group')
+'''
+
+def _write(path, contents):
+    folder = os.path.dirname(path)
+    if not os.path.exists(folder):
+        os.makedirs(folder)
+    with open(path, 'w') as f:
+        f.write(contents)
+
+def _c_file(group, index):
+    return '#include "shared.h"\n\nint g%d_f%d(int v)\n{\n    return SHARED_SCALE * v + %d;\n}\n' % (group, index, index)
+
+def group_name(index, merge):
+    # every `merge` directories share one group name; mixed case exercises the sort
+    n = index // merge
+    return ('Group%04d' if n % 2 else 'group%04d') % n
+
+def generate(root, groups=200, files=10, local=0, merge=1, cc='gcc', extra=None):
+    """
+    Write the synthetic tree under root (replacing it) and return the BSP
+    directory to run scons in. `extra(path, index)` may add files to each
+    group directory.
+    """
+    if os.path.exists(root):
+        shutil.rmtree(root)
+
+    bsp = os.path.join(root, 'bsp')
+    rtt = os.path.join(root, 'rtt')
+
+    _write(os.path.join(bsp, 'SConstruct'), SCONSTRUCT)
+    _write(os.path.join(bsp, 'rtconfig.py'), RTCONFIG_PY.format(cc=shutil.which(cc) or cc))
+    _write(os.path.join(bsp, 'rtconfig.h'), '#ifndef RT_CONFIG_H__\n#define RT_CONFIG_H__\n\n#define RT_NAME_MAX 8\n\n#endif\n')
+    # keep PrepareBuilding from probing the compiler for cconfig.h
+    _write(os.path.join(bsp, 'cconfig.h'), '#ifndef CCONFIG_H__\n#define CCONFIG_H__\n#endif\n')
+    _write(os.path.join(bsp, 'shared.h'), '#ifndef SHARED_H__\n#define SHARED_H__\n#define SHARED_SCALE 3\n#endif\n')
+    _write(os.path.join(bsp, 'main.c'), '#include "shared.h"\n\nint main(void)\n{\n    return 0;\n}\n')
+    _write(os.path.join(bsp, 'SConscript'), DIRS_SCONSCRIPT.replace(
+        "objs = []\n", "objs = DefineGroup('Applications', [cwd + '/main.c'], depend = [''], CPPPATH = [cwd])\n", 1))
+
+    for index in range(groups):
+        folder = os.path.join(bsp, 'g%04d' % index)
+        is_local = index < local
+        _write(os.path.join(folder, 'SConscript'), GROUP_SCONSCRIPT.format(
+            name = group_name(index, merge),
+            local_args = LOCAL_ARGS.format(index=index) if is_local else ''))
+        if is_local:
+            _write(os.path.join(folder, 'private', 'private.h'), '#define PRIVATE_%d 1\n' % index)
+        for f in range(files):
+            _write(os.path.join(folder, 'f%03d.c' % f), _c_file(index, f))
+        if extra:
+            extra(folder, index)
+
+    _write(os.path.join(rtt, 'src', 'SConscript'), KERNEL_SCONSCRIPT)
+    _write(os.path.join(rtt, 'src', 'kservice.c'), 'int rt_kservice(void)\n{\n    return 0;\n}\n')
+    _write(os.path.join(rtt, 'libcpu', 'SConscript'), EMPTY_SCONSCRIPT)
+    _write(os.path.join(rtt, 'components', 'SConscript'), EMPTY_SCONSCRIPT)
+
+    return bsp
+
+def tools_dir():
+    return os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
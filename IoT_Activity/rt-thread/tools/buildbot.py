@@ -13,24 +13,26 @@ if len(sys.argv) != 2:
     sys.exit(0)
 
 def update_project_file(project_dir):
+    targets = []
     if os.path.isfile(os.path.join(project_dir, 'template.Uv2')):
         print('prepare MDK3 project file on ' + project_dir)
-        command = ' --target=mdk -s'
-        os.system('scons --directory=' + project_dir + command + ' > 1.txt')
+        targets.append('mdk')
 
     if os.path.isfile(os.path.join(project_dir, 'template.uvproj')):
         print('prepare MDK4 project file on ' + project_dir)
-        command = ' --target=mdk4 -s'
-        os.system('scons --directory=' + project_dir + command + ' > 1.txt')
+        targets.append('mdk4')
 
     if os.path.isfile(os.path.join(project_dir, 'template.uvprojx')):
         print('prepare MDK5 project file on ' + project_dir)
-        command = ' --target=mdk5 -s'
-        os.system('scons --directory=' + project_dir + command + ' > 1.txt')
+        targets.append('mdk5')
 
     if os.path.isfile(os.path.join(project_dir, 'template.ewp')):
         print('prepare IAR project file on ' + project_dir)
-        command = ' --target=iar -s'
+        targets.append('iar')
+
+    # one scons run generates all of them
+    if targets:
+        command = ' --target=' + ','.join(targets) + ' -s'
         os.system('scons --directory=' + project_dir + command + ' > 1.txt')
 
 
@@ -59,24 +61,19 @@ def update_all_project_files(root_path):
                 new_root_path = os.path.join(root_path, i)
                 update_all_project_files(new_root_path)
 
-# get command options
-command = ''
-if sys.argv[1] == 'all':
-    command = ' '
-elif sys.argv[1] == 'clean':
-    command = ' -c'
-elif sys.argv[1] == 'project':
-    update_all_project_files(BSP_ROOT)
-
-    sys.exit(0)
-else:
-    usage()
-    sys.exit(0)
+# get command options, guarded as buildfleet's process pool imports this
+# script again on Windows
+if __name__ == '__main__':
+    if sys.argv[1] == 'all':
+        import buildfleet
+        sys.exit(buildfleet.main([BSP_ROOT]))
+    elif sys.argv[1] == 'clean':
+        import buildfleet
+        sys.exit(buildfleet.main([BSP_ROOT, '--clean']))
+    elif sys.argv[1] == 'project':
+        update_all_project_files(BSP_ROOT)
 
-projects = os.listdir(BSP_ROOT)
-for item in projects:
-    project_dir = os.path.join(BSP_ROOT, item)
-    if os.path.isfile(os.path.join(project_dir, 'SConstruct')):
-        if os.system('scons --directory=' + project_dir + command) != 0:
-            print('build failed!!')
-            break
+        sys.exit(0)
+    else:
+        usage()
+        sys.exit(0)
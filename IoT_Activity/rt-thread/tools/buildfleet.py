@@ -0,0 +1,350 @@
+#
+# File      : buildfleet.py
+# This file is part of RT-Thread RTOS
+# COPYRIGHT (C) 2006 - 2023, RT-Thread Development Team
+#
+#  This program is free software; you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation; either version 2 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License along
+#  with this program; if not, write to the Free Software Foundation, Inc.,
+#  51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+# Change Logs:
+# Date           Author       Notes
+#
+
+"""
+Build many BSPs concurrently.
+
+    python buildfleet.py ../bsp
+    python buildfleet.py ../bsp --parallel 4 --jobs 16 --out /tmp/fleet
+    python buildfleet.py ../bsp/stm32 --clean
+
+Every directory below the roots holding a SConstruct is a BSP. --parallel
+BSPs are built at a time on a process pool, each with `scons -j` of its
+share of --jobs. The output of each build goes to <out>/logs/<bsp>.log,
+<out> is rt-thread-fleet/ next to the RT-Thread root unless --out is given.
+
+A BSP whose files, RT-Thread files, toolchain environment and scons
+arguments hash the same as at its last successful build, and whose target
+binaries from that build are still there, is not built again
+(<out>/cache.json, --no-cache to build anyway, --clean forgets the cleaned
+BSPs). <out>/summary.json and <out>/junit.xml list every BSP with status
+and build duration; the exit code is non-zero if any build failed.
+"""
+
+import hashlib
+import json
+import os
+import subprocess
+import sys
+import time
+
+# build outputs and generated files, not part of a BSP's source hash
+IGNORE_DIRS = ['build', 'dist', 'dist-strip', 'dist_ide_project', '.git', '__pycache__']
+IGNORE_FILES = ['.sconsign.dblite', '.rtconfig.cache', '.rtproject.json', '.objcache.stats', 'cconfig.h', '1.txt']
+IGNORE_EXTS = ['.o', '.obj', '.a', '.elf', '.axf', '.bin', '.hex', '.map', '.pyc', '.lst', '.dep']
+
+# the toolchain a build picks up from the environment
+TOOLCHAIN_ENV = ['RTT_CC', 'RTT_EXEC_PATH', 'RTT_ROOT', 'PATH']
+
+# binaries a build leaves in the BSP root
+TARGET_EXTS = ['.elf', '.axf', '.bin', '.hex']
+
+def discover(roots):
+    """Return the BSP directories (holding a SConstruct) below roots, sorted."""
+    bsps = []
+    for root in roots:
+        for path, dirs, files in os.walk(root):
+            if 'SConstruct' in files:
+                bsps.append(os.path.abspath(path))
+                # a BSP's sub directories are part of it
+                del dirs[:]
+            else:
+                dirs[:] = [d for d in dirs if d not in IGNORE_DIRS]
+    return sorted(set(bsps))
+
+def bsp_name(bsp, roots):
+    for root in roots:
+        root = os.path.abspath(root)
+        if bsp.startswith(root + os.sep):
+            return os.path.relpath(bsp, root).replace(os.sep, '/')
+    return os.path.basename(bsp)
+
+def _under(fn, top):
+    return fn.startswith(top + os.sep)
+
+def _source_files(top, skip=()):
+    for path, dirs, files in os.walk(top):
+        dirs[:] = sorted(d for d in dirs if d not in IGNORE_DIRS and os.path.join(path, d) not in skip)
+        for name in sorted(files):
+            if name in IGNORE_FILES or os.path.splitext(name)[1].lower() in IGNORE_EXTS:
+                continue
+            yield os.path.join(path, name)
+
+def tree_digest(top, digests, fresh, skip=()):
+    """
+    sha1 over the paths and contents of the source files below top, leaving
+    out the directories in skip. File
+    contents are hashed again only if size or mtime changed since digests
+    (path -> [size, mtime, sha1]) was filled; fresh gets the entries of the
+    files seen now.
+    """
+    h = hashlib.sha1()
+    for fn in _source_files(top, skip):
+        try:
+            st = os.stat(fn)
+        except OSError:
+            continue
+        old = digests.get(fn)
+        if old and old[0] == st.st_size and old[1] == st.st_mtime:
+            digest = old[2]
+        else:
+            sha = hashlib.sha1()
+            with open(fn, 'rb') as f:
+                for chunk in iter(lambda: f.read(1 << 16), b''):
+                    sha.update(chunk)
+            digest = sha.hexdigest()
+        fresh[fn] = [st.st_size, st.st_mtime, digest]
+        h.update((os.path.relpath(fn, top) + '\0' + digest + '\n').encode('utf-8'))
+    return h.hexdigest()
+
+def config_digest(args):
+    h = hashlib.sha1()
+    h.update(repr(args).encode('utf-8'))
+    for name in TOOLCHAIN_ENV:
+        h.update((name + '=' + os.environ.get(name, '') + '\n').encode('utf-8'))
+    return h.hexdigest()
+
+def _targets(bsp):
+    """Return the target binaries in the BSP root."""
+    return [name for name in sorted(os.listdir(bsp))
+            if os.path.splitext(name)[1].lower() in TARGET_EXTS and os.path.isfile(os.path.join(bsp, name))]
+
+def _is_cached(bsp, key, cached):
+    # entries from before targets were recorded build once more
+    if not cached or cached.get('key') != key or cached.get('status') != 'pass':
+        return False
+    targets = cached.get('targets')
+    return targets is not None and all(os.path.isfile(os.path.join(bsp, t)) for t in targets)
+
+def _find_scons():
+    for path in os.environ.get('PATH', '').split(os.pathsep):
+        for name in ['scons', 'scons.bat', 'scons.exe']:
+            fn = os.path.join(path, name)
+            if os.path.isfile(fn) and os.access(fn, os.X_OK):
+                return fn
+    return None
+
+def build_one(job):
+    """
+    Process pool worker: hash one BSP and build it unless the hash matches
+    its last successful build. Returns the result record and the file
+    digests for the cache.
+    """
+    bsp, name, log, scons, args, rtt_digest, config, cached, digests, out = job
+
+    fresh = {}
+    source = tree_digest(bsp, digests, fresh, [out])
+    key = hashlib.sha1((source + rtt_digest + config).encode('utf-8')).hexdigest()
+    result = {'bsp': name, 'path': bsp, 'log': log, 'key': key, 'source': source, 'config': config}
+
+    if _is_cached(bsp, key, cached):
+        result.update(status='cached', returncode=0, duration=cached.get('duration', 0.0),
+                      targets=cached['targets'])
+        return result, fresh
+
+    start = time.time()
+    with open(log, 'w') as f:
+        f.write('$ ' + ' '.join(scons + args) + '\n')
+        f.flush()
+        try:
+            ret = subprocess.call(scons + args, cwd=bsp, stdout=f, stderr=subprocess.STDOUT)
+        except OSError as e:
+            f.write('Error: cannot run scons: ' + str(e) + '\n')
+            ret = -1
+    result.update(status='pass' if ret == 0 else 'fail', returncode=ret, duration=time.time() - start,
+                  targets=_targets(bsp))
+    return result, fresh
+
+def _load_json(fn, default):
+    try:
+        with open(fn, 'r') as f:
+            return json.load(f)
+    except (IOError, OSError, ValueError):
+        return default
+
+def _write_json(fn, data):
+    tmp = fn + '.tmp'
+    with open(tmp, 'w') as f:
+        json.dump(data, f, indent=1, sort_keys=True)
+    if os.path.exists(fn):
+        os.remove(fn)
+    os.rename(tmp, fn)
+
+def _log_tail(log, lines=50):
+    try:
+        with open(log, 'r') as f:
+            return ''.join(f.readlines()[-lines:])
+    except (IOError, OSError):
+        return ''
+
+def write_junit(fn, results, duration):
+    import xml.etree.ElementTree as etree
+    from xml.etree.ElementTree import SubElement
+    from utils import xml_indent
+
+    suite = etree.Element('testsuite', {
+        'name': 'bsp',
+        'tests': str(len(results)),
+        'failures': str(len([r for r in results if r['status'] == 'fail'])),
+        'skipped': str(len([r for r in results if r['status'] == 'cached'])),
+        'time': '%.3f' % duration,
+    })
+    for r in results:
+        case = SubElement(suite, 'testcase', {'classname': 'bsp', 'name': r['bsp'], 'time': '%.3f' % r['duration']})
+        if r['status'] == 'fail':
+            failure = SubElement(case, 'failure', {'message': 'scons returned %d, see %s' % (r['returncode'], r['log'])})
+            failure.text = _log_tail(r['log'])
+        elif r['status'] == 'cached':
+            SubElement(case, 'skipped', {'message': 'unchanged since its last successful build'})
+
+    xml_indent(suite)
+    etree.ElementTree(suite).write(fn, encoding='utf-8')
+
+def build(bsps, roots, out=None, parallel=None, jobs=None, args=None, use_cache=True, rtt_root=None, scons=None):
+    """
+    Build bsps (directories) and return the result records, in bsps order.
+    Writes logs, cache.json, summary.json and junit.xml below out (default:
+    rt-thread-fleet next to rtt_root).
+    """
+    import multiprocessing
+
+    cpus = multiprocessing.cpu_count()
+    jobs = jobs or cpus
+    parallel = max(1, min(parallel or max(1, cpus // 4), len(bsps) or 1))
+    args = list(args or [])
+    clean = '-c' in args or '--clean' in args
+    rtt_root = os.path.abspath(rtt_root or os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+    # out is left out of every hash, its logs and summaries change each run
+    out = os.path.abspath(out or os.path.join(os.path.dirname(rtt_root), 'rt-thread-fleet'))
+
+    logs = os.path.join(out, 'logs')
+    if not os.path.isdir(logs):
+        os.makedirs(logs)
+
+    cache_fn = os.path.join(out, 'cache.json')
+    cache = _load_json(cache_fn, {})
+    results_cache = cache.get('results', {})
+    old_digests = cache.get('digests', {})
+    digests = old_digests if use_cache else {}
+    fresh = {}
+
+    # RT-Thread is shared by every BSP, its own bsp/ tree are other BSPs
+    rtt_bsp = os.path.join(rtt_root, 'bsp')
+    rtt_digest = tree_digest(rtt_root, digests, fresh, [rtt_bsp, out])
+
+    if not scons:
+        scons = [_find_scons() or 'scons']
+    elif isinstance(scons, str):
+        scons = [scons]
+    build_args = ['-j%d' % max(1, jobs // parallel)] + args
+    # -j doesn't change what is built, a new --parallel/--jobs split keeps the cache
+    config = config_digest(args)
+
+    pending = []
+    for bsp in bsps:
+        name = bsp_name(bsp, roots)
+        log = os.path.abspath(os.path.join(logs, name.replace('/', '_') + '.log'))
+        cached = results_cache.get(bsp) if use_cache and not clean else None
+        bsp_digests = dict((k, v) for k, v in digests.items() if _under(k, bsp))
+        pending.append((bsp, name, log, scons, build_args, rtt_digest, config, cached, bsp_digests, out))
+
+    print('%d BSPs, %d at a time with -j%d' % (len(bsps), parallel, max(1, jobs // parallel)))
+
+    start = time.time()
+    results = {}
+    pool = multiprocessing.Pool(parallel)
+    try:
+        for done, (result, bsp_digests) in enumerate(pool.imap_unordered(build_one, pending), 1):
+            results[result['path']] = result
+            fresh.update(bsp_digests)
+            print('[%*d/%d] %-6s %s (%.1fs)' % (len(str(len(bsps))), done, len(bsps),
+                                              result['status'], result['bsp'], result['duration']))
+    finally:
+        pool.close()
+        pool.join()
+    duration = time.time() - start
+
+    results = [results[bsp] for bsp in bsps]
+
+    for r in results:
+        if r['status'] == 'pass' and not clean:
+            results_cache[r['path']] = {'key': r['key'], 'status': 'pass', 'duration': r['duration'],
+                                        'targets': r['targets']}
+        elif r['status'] != 'cached':
+            # failed, or cleaned: its outputs are gone
+            results_cache.pop(r['path'], None)
+    # keep the digests of the BSPs this run didn't build
+    hashed = tuple(bsp + os.sep for bsp in bsps)
+    for fn, digest in old_digests.items():
+        if fn in fresh or fn.startswith(hashed):
+            continue
+        if _under(fn, rtt_root) and not _under(fn, rtt_bsp):
+            continue
+        fresh[fn] = digest
+    _write_json(cache_fn, {'results': results_cache, 'digests': fresh})
+
+    _write_json(os.path.join(out, 'summary.json'), {
+        'duration': duration,
+        'args': build_args,
+        'parallel': parallel,
+        'results': results,
+    })
+    write_junit(os.path.join(out, 'junit.xml'), results, duration)
+
+    return results
+
+def main(argv=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Build all BSPs below the given directories concurrently')
+    parser.add_argument('roots', nargs='+', help='directories to look for BSPs (SConstruct) in')
+    parser.add_argument('--parallel', type=int, help='BSPs built at a time (default: cpus / 4)')
+    parser.add_argument('--jobs', type=int, help='total -j budget shared by the builds (default: cpus)')
+    parser.add_argument('--out', help='directory for logs, cache and summaries '
+                        '(default: rt-thread-fleet next to the RT-Thread root)')
+    parser.add_argument('--clean', action='store_true', help='run scons -c instead of building')
+    parser.add_argument('--no-cache', action='store_true', help='build BSPs even if unchanged')
+    parser.add_argument('--rtt-root', help='RT-Thread root hashed into every BSP (default: ..)')
+    parser.add_argument('--scons-arg', action='append', default=[], help='extra scons argument, repeatable')
+    parser.add_argument('--scons', help='scons command (default: scons from PATH)')
+    args = parser.parse_args(argv)
+
+    bsps = discover(args.roots)
+    if not bsps:
+        print('No BSP found in ' + ', '.join(args.roots))
+        return 0
+
+    scons_args = (['-c'] if args.clean else []) + args.scons_arg
+    results = build(bsps, args.roots, args.out, args.parallel, args.jobs, scons_args,
+                    not args.no_cache, args.rtt_root, args.scons and args.scons.split())
+
+    failed = [r['bsp'] for r in results if r['status'] == 'fail']
+    print('%d passed, %d unchanged, %d failed' % (len([r for r in results if r['status'] == 'pass']),
+                                                   len([r for r in results if r['status'] == 'cached']),
+                                                   len(failed)))
+    for name in failed:
+        print('  failed: ' + name)
+    return 1 if failed else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -28,7 +28,6 @@ import os
 import sys
 import string
 import utils
-import operator
 import rtconfig
 import platform
 
@@ -80,6 +79,368 @@ PatchedPreProcessor = SCons.cpp.PreProcessor
 PatchedPreProcessor.start_handling_includes = start_handling_includes
 PatchedPreProcessor.stop_handling_includes = stop_handling_includes
 
+# parsed config headers, kept across scons runs in the BSP root
+ConfigCacheName = '.rtconfig.cache'
+_ConfigCache = None
+
+def _FileDigest(fn):
+    import hashlib
+
+    try:
+        with open(fn, 'rb') as f:
+            return hashlib.sha1(f.read()).hexdigest()
+    except (IOError, OSError):
+        return None
+
+def _ToolchainIdentity():
+    return (tuple(sys.version_info[:2]), SCons.__version__, rtconfig.PLATFORM,
+            getattr(rtconfig, 'CROSS_TOOL', ''), getattr(rtconfig, 'CC', ''), rtconfig.EXEC_PATH)
+
+def _ConfigCachePath():
+    return os.path.join(Dir('#').abspath, ConfigCacheName)
+
+def _LoadConfigCache():
+    import pickle
+    global _ConfigCache
+
+    if _ConfigCache is None:
+        _ConfigCache = {}
+        try:
+            with open(_ConfigCachePath(), 'rb') as f:
+                cache = pickle.load(f)
+            if type(cache) == type({}):
+                _ConfigCache = cache
+        except Exception:
+            # missing, truncated or written by another python: start over
+            pass
+
+    return _ConfigCache
+
+def _SaveConfigCache():
+    import pickle
+
+    fn = _ConfigCachePath()
+    tmp = fn + '.tmp'
+    try:
+        with open(tmp, 'wb') as f:
+            pickle.dump(_ConfigCache, f, 2)
+        if os.path.exists(fn):
+            os.remove(fn)
+        os.rename(tmp, fn)
+    except (IOError, OSError) as e:
+        print('Warning: cannot write ' + fn + ': ' + str(e))
+
+def ParseConfigHeader(filename):
+    """
+    Return the macro namespace of a config header (rtconfig.h, cconfig.h,
+    rtdef.h) as PatchedPreProcessor would build it.
+
+    The namespace is cached in .rtconfig.cache together with the sha1 of the
+    header and of every header it included, and the toolchain it was parsed
+    for. It is reused as long as all of them are unchanged, so a no-op
+    rebuild doesn't preprocess the config headers at all.
+    """
+    import pickle
+
+    cache = _LoadConfigCache()
+    key = os.path.abspath(filename)
+    identity = _ToolchainIdentity()
+
+    entry = cache.get(key)
+    if entry and entry[0] == identity:
+        for dep, digest in entry[1]:
+            if _FileDigest(dep) != digest:
+                break
+        else:
+            # unpickle every time, callers (AddDepend) modify the namespace
+            return pickle.loads(entry[2])
+
+    prep = PatchedPreProcessor()
+    f = open(filename, 'r')
+    contents = f.read()
+    f.close()
+    prep.process_contents(contents)
+    options = prep.cpp_namespace
+
+    deps = [key] + [os.path.abspath(str(fn)) for fn in prep.result if fn]
+    try:
+        blob = pickle.dumps(options, 2)
+    except Exception:
+        # a macro value that cannot be stored, parse it every time
+        return options
+
+    cache[key] = (identity, [(dep, _FileDigest(dep)) for dep in deps], blob)
+    _SaveConfigCache()
+
+    return options
+
+# project graph of the last full SConscript evaluation, kept in the BSP root
+ProjectSnapshotName = '.rtproject.json'
+ProjectSnapshotVersion = 1
+ProjectSnapshotSources = ['.c', '.cpp', '.cxx', '.cc', '.s', '.asm', '.h', '.hpp', '.a', '.lib']
+ProjectSnapshotEnv = ['CPPPATH', 'CPPDEFINES', 'CFLAGS', 'CCFLAGS', 'CXXFLAGS', 'ASFLAGS', 'LINKFLAGS', 'LIBS', 'LIBPATH']
+
+_SnapshotKey = None       # PrepareBuilding arguments, None disables the snapshot
+_SnapshotObjects = None   # objects restored from the snapshot
+_BuildObjects = None      # objects DoBuilding received, before local groups
+_SConscriptNodes = set()  # SConscripts on the stack of any DefineGroup
+_TargetLists = {}         # utils.TargetGetList() results, by extensions
+
+def _SnapshotEncode(value):
+    import collections
+    try:
+        from collections import UserList
+    except ImportError:
+        from UserList import UserList
+
+    if isinstance(value, SCons.Util.CLVar):
+        # CLVar + str still works where the generators concatenate flags
+        return {'clvar': [_SnapshotEncode(v) for v in value]}
+    if isinstance(value, tuple):
+        return {'tuple': [_SnapshotEncode(v) for v in value]}
+    if isinstance(value, dict):
+        return {'dict': [[k, _SnapshotEncode(v)] for k, v in value.items()]}
+    if isinstance(value, (list, collections.deque, UserList)):
+        return [_SnapshotEncode(v) for v in value]
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return value
+    # nodes and other objects end up as their path/string
+    return str(value)
+
+def _SnapshotDecode(value):
+    if isinstance(value, dict):
+        if 'clvar' in value:
+            return SCons.Util.CLVar([_SnapshotDecode(v) for v in value['clvar']])
+        if 'tuple' in value:
+            return tuple(_SnapshotDecode(v) for v in value['tuple'])
+        return dict((k, _SnapshotDecode(v)) for k, v in value['dict'])
+    if isinstance(value, list):
+        return [_SnapshotDecode(v) for v in value]
+    return value
+
+def _DirListing(path):
+    # what Glob() and the SConscript lookups of a directory can see, so
+    # generated project files don't count as a change
+    import hashlib
+
+    try:
+        names = os.listdir(path)
+    except OSError:
+        return None
+    seen = []
+    for name in names:
+        if os.path.splitext(name)[1].lower() in ProjectSnapshotSources or name == 'SConscript':
+            seen.append(name)
+        elif os.path.isfile(os.path.join(path, name, 'SConscript')):
+            seen.append(name + '/SConscript')
+    seen.sort()
+    return hashlib.sha1('\n'.join(seen).encode('utf-8')).hexdigest()
+
+def _RecordSConscripts():
+    stack = sys.modules['SCons.Script.SConscript'].call_stack
+    for frame in stack:
+        if frame.sconscript is not None:
+            _SConscriptNodes.add(frame.sconscript)
+
+def _SnapshotPath(bsp_root=None):
+    return os.path.join(bsp_root or Dir('#').abspath, ProjectSnapshotName)
+
+def _ReadSnapshotFile(fn):
+    import json
+
+    try:
+        with open(fn, 'r') as f:
+            data = json.load(f)
+        if data.get('version') == ProjectSnapshotVersion:
+            return data
+    except Exception:
+        pass
+    return {'version': ProjectSnapshotVersion, 'snapshots': {}}
+
+def _Stamp(fn):
+    try:
+        st = os.stat(fn)
+        return [st.st_size, st.st_mtime]
+    except OSError:
+        return [None, None]
+
+def _ListStamps(lists):
+    paths = set()
+    for group in Projects:
+        for node in group['src']:
+            paths.add(node.srcnode().abspath)
+    for l in lists.values():
+        paths.update(l)
+    return [[fn] + _Stamp(fn) for fn in sorted(paths)]
+
+def _ValidLists(snapshot):
+    # header lists stay valid while no source or listed file was touched
+    lists = snapshot.get('lists')
+    if not lists:
+        return {}
+    for fn, size, mtime in lists['stamps']:
+        if _Stamp(fn) != [size, mtime]:
+            return {}
+    return lists['lists']
+
+def _ProjectGraph():
+    files = set([os.path.abspath('rtconfig.h'), os.path.abspath('rtconfig.py'), os.path.abspath('cconfig.h'),
+                 os.path.splitext(os.path.abspath(__file__))[0] + '.py'])
+    entry = _LoadConfigCache().get(os.path.abspath('rtconfig.h'))
+    if entry:
+        files.update([dep for dep, digest in entry[1]])
+    dirs = set()
+    for node in _SConscriptNodes:
+        fn = node.srcnode().abspath
+        files.add(fn)
+        dirs.add(os.path.dirname(fn))
+
+    # explicit VariantDir links the source nodes were looked up through
+    links = {}
+    def add_links(node):
+        d = node.dir
+        while d is not None and d.dir is not d:
+            if d.srcdir:
+                links[d.abspath] = (d.srcdir.abspath, d.duplicate)
+            d = d.dir
+
+    groups = []
+    for group in Projects:
+        item = {}
+        for k, v in group.items():
+            if k != 'src':
+                item[k] = _SnapshotEncode(v)
+        item['src'] = []
+        for node in group['src']:
+            add_links(node)
+            dirs.add(os.path.dirname(node.srcnode().abspath))
+            item['src'].append(node.abspath)
+        groups.append(item)
+
+    objects = []
+    for obj in _BuildObjects:
+        # the project of a --unity build is the one of its sources
+        for node in _UnityMembers.get(obj.abspath, [obj]):
+            add_links(node)
+            objects.append([node.abspath, [s.abspath for s in node.sources]])
+
+    return {
+        'prepare': _SnapshotKey,
+        'files': sorted([fn, _FileDigest(fn)] for fn in files),
+        'dirs': sorted([d, _DirListing(d)] for d in dirs),
+        'links': sorted([k, v[0], v[1]] for k, v in links.items()),
+        'groups': groups,
+        'objects': objects,
+        'env': dict((k, _SnapshotEncode(Env[k])) for k in ProjectSnapshotEnv if k in Env),
+        'options': dict((k, v) for k, v in BuildOptions.items() if isinstance(v, (int, str))),
+    }
+
+def SaveProjectSnapshot():
+    """
+    Write the groups, objects and Env settings of this evaluation to
+    .rtproject.json, with the sha1 of every file and the listing of every
+    directory it depended on. One snapshot per toolchain identity, as
+    --target switches the toolchain and rtconfig.py flags with it.
+
+    The file lists generators got from utils.TargetGetList() are kept as
+    well, they are what scanning every source for headers produced.
+    """
+    import json
+
+    if _SnapshotKey is None or _BuildObjects is None:
+        return
+
+    fn = _SnapshotPath()
+    key = repr(_ToolchainIdentity())
+    data = _ReadSnapshotFile(fn)
+    old = data['snapshots'].get(key)
+
+    if _SnapshotObjects is None:
+        snapshot = json.loads(json.dumps(_ProjectGraph()))
+        if old and all(old.get(k) == v for k, v in snapshot.items()):
+            for k, v in _ValidLists(old).items():
+                _TargetLists.setdefault(k, v)
+    elif old:
+        snapshot = dict(old)
+    else:
+        return
+
+    snapshot['lists'] = {}
+    if _TargetLists:
+        snapshot['lists'] = json.loads(json.dumps({'lists': _TargetLists, 'stamps': _ListStamps(_TargetLists)}))
+    if snapshot == old:
+        return
+    data['snapshots'][key] = snapshot
+
+    tmp = fn + '.tmp'
+    try:
+        with open(tmp, 'w') as f:
+            json.dump(data, f, indent=1, sort_keys=True)
+        if os.path.exists(fn):
+            os.remove(fn)
+        os.rename(tmp, fn)
+    except (IOError, OSError) as e:
+        print('Warning: cannot write ' + fn + ': ' + str(e))
+
+def LoadProjectSnapshot(bsp_root=None, key=None):
+    """
+    Return the project snapshot of a BSP as plain data (groups with
+    absolute source paths, objects, env, options, lists), or None if there is
+    none for the toolchain or any file it depends on changed since. Without
+    a key, the toolchain of the current rtconfig is used.
+    """
+    if key is None:
+        key = repr(_ToolchainIdentity())
+
+    snapshot = _ReadSnapshotFile(_SnapshotPath(bsp_root))['snapshots'].get(key)
+    if not snapshot:
+        return None
+
+    for fn, digest in snapshot['files']:
+        if _FileDigest(fn) != digest:
+            return None
+    for d, listing in snapshot['dirs']:
+        if _DirListing(d) != listing:
+            return None
+
+    for group in snapshot['groups']:
+        for k in group:
+            if k != 'src':
+                group[k] = _SnapshotDecode(group[k])
+    for k in snapshot['env']:
+        snapshot['env'][k] = _SnapshotDecode(snapshot['env'][k])
+    snapshot['lists'] = _ValidLists(snapshot)
+
+    return snapshot
+
+def _RestoreProjectSnapshot(snapshot):
+    global _SnapshotObjects
+
+    for variant_dir, src_dir, duplicate in snapshot['links']:
+        Env.VariantDir(variant_dir, src_dir, duplicate)
+
+    groups = []
+    for group in snapshot['groups']:
+        group['src'] = File(group['src'])
+        groups.append(group)
+    Projects[:] = groups
+    _ReindexGroups()
+
+    libsuffix = Env.subst('$LIBSUFFIX')
+    objects = []
+    for path, sources in snapshot['objects']:
+        if not sources:
+            objects.append(File(path))
+        elif libsuffix and path.endswith(libsuffix):
+            objects.extend(Env.Library(path, File(sources)))
+        else:
+            objects.extend(Env.Object(path, File(sources)))
+    _SnapshotObjects = objects
+
+    Env.Replace(**snapshot['env'])
+    BuildOptions.update(snapshot['options'])
+    _TargetLists.update(snapshot['lists'])
+
 class Win32Spawn:
     def spawn(self, sh, escape, cmd, args, env):
         # deal with the cmd build-in commands which cannot be used in
@@ -125,26 +486,17 @@ class Win32Spawn:
 def GenCconfigFile(env, BuildOptions):
 
     if rtconfig.PLATFORM in ['gcc']:
-        contents = ''
         if not os.path.isfile('cconfig.h'):
             import gcc
             gcc.GenerateGCCConfig(rtconfig)
 
         # try again
         if os.path.isfile('cconfig.h'):
-            f = open('cconfig.h', 'r')
-            if f:
-                contents = f.read()
-                f.close()
-
-                prep = PatchedPreProcessor()
-                prep.process_contents(contents)
-                options = prep.cpp_namespace
-
-                BuildOptions.update(options)
+            options = ParseConfigHeader('cconfig.h')
+            BuildOptions.update(options)
 
-                # add HAVE_CCONFIG_H definition
-                env.AppendUnique(CPPDEFINES = ['HAVE_CCONFIG_H'])
+            # add HAVE_CCONFIG_H definition
+            env.AppendUnique(CPPDEFINES = ['HAVE_CCONFIG_H'])
 
 def PrepareBuilding(env, root_directory, has_libcpu=False, remove_components = []):
 
@@ -152,6 +504,8 @@ def PrepareBuilding(env, root_directory, has_libcpu=False, remove_components = [
     global Projects
     global Env
     global Rtt_Root
+    global _SnapshotKey
+    global _UnitySize
 
     AddOptions()
 
@@ -197,14 +551,29 @@ def PrepareBuilding(env, root_directory, has_libcpu=False, remove_components = [
             sys.exit(1)
 
         SetOption('no_exec', 1)
-        try:
-            rtconfig.CROSS_TOOL, rtconfig.PLATFORM = tgt_dict[tgt_name]
-            # replace the 'RTT_CC' to 'CROSS_TOOL'
-            os.environ['RTT_CC'] = rtconfig.CROSS_TOOL
-            utils.ReloadModule(rtconfig)
-        except KeyError:
-            print('Unknow target: '+ tgt_name+'. Avaible targets: ' +', '.join(tgt_dict.keys()))
-            sys.exit(1)
+        targets = GetTargets()
+        for tgt_name in targets:
+            if tgt_name not in tgt_dict:
+                print('Unknow target: '+ tgt_name+'. Avaible targets: ' +', '.join(tgt_dict.keys()))
+                sys.exit(1)
+
+        # one evaluation serves all targets of the first target's toolchain,
+        # the others are generated by another scons run per toolchain
+        tgt_name = targets[0]
+        _TargetNames[:] = [t for t in targets if tgt_dict[t] == tgt_dict[tgt_name]]
+        for t in targets:
+            if tgt_dict[t] != tgt_dict[tgt_name]:
+                for other in _OtherTargets:
+                    if tgt_dict[other[0]] == tgt_dict[t]:
+                        other.append(t)
+                        break
+                else:
+                    _OtherTargets.append([t])
+
+        rtconfig.CROSS_TOOL, rtconfig.PLATFORM = tgt_dict[tgt_name]
+        # replace the 'RTT_CC' to 'CROSS_TOOL'
+        os.environ['RTT_CC'] = rtconfig.CROSS_TOOL
+        utils.ReloadModule(rtconfig)
 
     # auto change the 'RTT_EXEC_PATH' when 'rtconfig.EXEC_PATH' get failed
     if not os.path.exists(rtconfig.EXEC_PATH):
@@ -257,12 +626,7 @@ def PrepareBuilding(env, root_directory, has_libcpu=False, remove_components = [
     Env.Append(BUILDERS = {'BuildLib': bld})
 
     # parse rtconfig.h to get used component
-    PreProcessor = PatchedPreProcessor()
-    f = open('rtconfig.h', 'r')
-    contents = f.read()
-    f.close()
-    PreProcessor.process_contents(contents)
-    BuildOptions = PreProcessor.cpp_namespace
+    BuildOptions = ParseConfigHeader('rtconfig.h')
 
     if GetOption('clang-analyzer'):
         # perform what scan-build does
@@ -334,11 +698,30 @@ def PrepareBuilding(env, root_directory, has_libcpu=False, remove_components = [
             LINKCOMSTR = 'LINK $TARGET'
         )
 
+    # opt-in object cache, shared by all BSPs
+    objcache_dir = GetOption('objcache') or os.environ.get('RTT_OBJCACHE')
+    if objcache_dir and not tgt_name and not GetOption('clang-analyzer'):
+        from objcache import EnableObjectCache
+        Env['OBJCACHE_STATS'] = EnableObjectCache(env, objcache_dir, rtconfig.PLATFORM)
+
+    # opt-in unity build, DefineGroup bundles the sources of each group
+    if GetOption('unity') and not tgt_name and not GetOption('buildlib') and not GetOption('clang-analyzer'):
+        _UnitySize = max(GetOption('unity-size'), 2)
+
     # fix the linker for C++
     if GetDepend('RT_USING_CPLUSPLUS'):
         if env['LINK'].find('gcc') != -1:
             env['LINK'] = env['LINK'].replace('gcc', 'g++')
 
+    # --target only needs the project graph, reuse the last evaluation
+    _SnapshotKey = [bool(has_libcpu), sorted(remove_components)]
+    if tgt_name and not GetOption('no-snapshot'):
+        snapshot = LoadProjectSnapshot()
+        if snapshot and snapshot['prepare'] == _SnapshotKey:
+            print('Reuse project snapshot ' + ProjectSnapshotName)
+            _RestoreProjectSnapshot(snapshot)
+            return []
+
     # we need to seperate the variant_dir for BSPs and the kernels. BSPs could
     # have their own components etc. If they point to the same folder, SCons
     # would find the wrong source code to compile.
@@ -382,12 +765,7 @@ def PrepareModuleBuilding(env, root_directory, bsp_directory):
     Rtt_Root = root_directory
 
     # parse bsp rtconfig.h to get used component
-    PreProcessor = PatchedPreProcessor()
-    f = open(bsp_directory + '/rtconfig.h', 'r')
-    contents = f.read()
-    f.close()
-    PreProcessor.process_contents(contents)
-    BuildOptions = PreProcessor.cpp_namespace
+    BuildOptions = ParseConfigHeader(bsp_directory + '/rtconfig.h')
 
     AddOption('--buildlib',
                       dest = 'buildlib',
@@ -556,17 +934,99 @@ def _PretreatListParameters(target_list):
 
     return True # permit to add this list to the parameter
 
+# --unity: C/C++ extensions and the extension of their unity source
+UnityExtensions = {'.c': '.c', '.cpp': '.cpp', '.cxx': '.cpp', '.cc': '.cpp'}
+UnityLocalFlags = ['LOCAL_CFLAGS', 'LOCAL_CXXFLAGS', 'LOCAL_CCFLAGS', 'LOCAL_CPPPATH', 'LOCAL_CPPDEFINES', 'LOCAL_ASFLAGS']
+
+# kept out of the group directories, where Glob('*.c') would find them
+UnityDir = 'build/.unity'
+
+_UnitySize = 0        # most files in one unity source, 0 without --unity
+_UnityCount = {}      # unity sources made for each group name, in lower case
+_UnityMembers = {}    # unity source path -> the source nodes it includes
+
+def _WriteUnitySource(target, source, env):
+    with open(target[0].abspath, 'w') as f:
+        f.write(source[0].value)
+
+def _UnityInclude(node, folder):
+    path = node.srcnode().abspath
+    try:
+        path = os.path.relpath(path, folder)
+    except ValueError:
+        # another drive on Windows
+        pass
+    return path.replace('\\', '/')
+
+def UnitySources(group, exist_group = None):
+    """
+    Return the sources to compile for group. With --unity, its C and C++
+    files are bundled into generated sources of at most --unity-size files
+    each, which #include them. A group opts out with UNITY = False, or
+    leaves files out with UNITY_EXCLUDE = ['name.c', 'glob*.c'], e.g. ones
+    whose static names or macros clash with another file of the group.
+    Groups with LOCAL_* flags, which DoBuilding compiles file by file, keep
+    their sources as they are.
+    """
+    import fnmatch
+    import re
+
+    src = group['src']
+    if not _UnitySize or type(src) != type([]) or not group.get('UNITY', True):
+        return src
+    for g in [group, exist_group]:
+        if g and [k for k in UnityLocalFlags if k in g]:
+            return src
+
+    excludes = group.get('UNITY_EXCLUDE', [])
+    bundles = {}
+    objs = []
+    for node in src:
+        ext = os.path.splitext(node.name)[1]
+        if ext not in UnityExtensions or node.has_builder() or \
+                [p for p in excludes if fnmatch.fnmatch(node.name, p)]:
+            objs.append(node)
+        else:
+            bundles.setdefault(UnityExtensions[ext], []).append(node)
+
+    name = re.sub(r'\W', '_', group['name'])
+    for ext in sorted(bundles):
+        files = sorted(bundles[ext], key = lambda n: n.srcnode().abspath)
+        count = (len(files) + _UnitySize - 1) // _UnitySize
+        for i in range(count):
+            chunk = files[i * len(files) // count : (i + 1) * len(files) // count]
+            if len(chunk) < 2:
+                objs += chunk
+                continue
+
+            index = _UnityCount.get(name.lower(), 0)
+            _UnityCount[name.lower()] = index + 1
+            target = File('#%s/%s_%d%s' % (UnityDir, name, index, ext))
+            text = '/* unity source of group %s, generated by scons --unity */\n' % group['name']
+            for node in chunk:
+                text += '#include "%s"\n' % _UnityInclude(node, target.dir.abspath)
+
+            unity = Env.Command(target, Value(text), Action(_WriteUnitySource, 'UNITY $TARGET'))[0]
+            _UnityMembers[unity.abspath] = chunk
+            objs.append(unity)
+
+    return objs
+
 def DefineGroup(name, src, depend, **parameters):
     global Env
+    if _SnapshotObjects is not None:
+        # restored from the project snapshot already
+        return []
+
+    _RecordSConscripts()
     if not GetDepend(depend):
         return []
 
     # find exist group and get path of group
-    group_path = ''
-    for g in Projects:
-        if g['name'] == name:
-            group_path = g['path']
-    if group_path == '':
+    exist_group = FindGroup(name)
+    if exist_group:
+        group_path = exist_group['path']
+    else:
         group_path = GetCurrentDir()
 
     group = parameters
@@ -653,28 +1113,50 @@ def DefineGroup(name, src, depend, **parameters):
         objs = Env.Library(name, group['src'])
     else:
         # only add source
-        objs = group['src']
+        objs = UnitySources(group, exist_group)
 
     # merge group
-    for g in Projects:
-        if g['name'] == name:
-            # merge to this group
-            MergeGroup(g, group)
-            return objs
-
-    def PriorityInsertGroup(groups, group):
-        length = len(groups)
-        for i in range(0, length):
-            if operator.gt(groups[i]['name'].lower(), group['name'].lower()):
-                groups.insert(i, group)
-                return
-        groups.append(group)
+    if exist_group:
+        # merge to this group
+        MergeGroup(exist_group, group)
+        return objs
 
     # add a new group
-    PriorityInsertGroup(Projects, group)
+    PriorityInsertGroup(group)
 
     return objs
 
+# name -> group, and the lower-cased group names in Projects order
+_GroupIndex = {}
+_GroupKeys = []
+
+def _ReindexGroups():
+    global _GroupKeys
+
+    _GroupIndex.clear()
+    for g in Projects:
+        _GroupIndex[g['name']] = g
+    _GroupKeys = [g['name'].lower() for g in Projects]
+
+def FindGroup(name):
+    # Projects is only expected to grow through DefineGroup
+    if len(_GroupKeys) != len(Projects):
+        _ReindexGroups()
+    return _GroupIndex.get(name)
+
+def PriorityInsertGroup(group):
+    import bisect
+
+    if len(_GroupKeys) != len(Projects):
+        _ReindexGroups()
+
+    # sorted by name ignoring case, a new group goes after equal names
+    key = group['name'].lower()
+    i = bisect.bisect_right(_GroupKeys, key)
+    _GroupKeys.insert(i, key)
+    Projects.insert(i, group)
+    _GroupIndex[group['name']] = group
+
 def GetCurrentDir():
     conscript = File('SConscript')
     fn = conscript.rfile()
@@ -706,16 +1188,40 @@ def GroupLibFullName(name, env):
     return env['LIBPREFIX'] + GroupLibName(name, env) + env['LIBSUFFIX']
 
 def BuildLibInstallAction(target, source, env):
-    lib_name = GetOption('buildlib')
-    for Group in Projects:
-        if Group['name'] == lib_name:
-            lib_name = GroupLibFullName(Group['name'], env)
-            dst_name = os.path.join(Group['path'], lib_name)
-            print('Copy '+lib_name+' => ' + dst_name)
-            do_copy_file(lib_name, dst_name)
-            break
+    Group = FindGroup(GetOption('buildlib'))
+    if Group:
+        lib_name = GroupLibFullName(Group['name'], env)
+        dst_name = os.path.join(Group['path'], lib_name)
+        print('Copy '+lib_name+' => ' + dst_name)
+        do_copy_file(lib_name, dst_name)
+
+def RemoveLocalObjects(objects, groups):
+    """
+    Return objects without the sources (or objects built from them) of
+    groups with local flags, which DoBuilding compiles again with those
+    flags. One pass over objects against a set of source paths.
+    """
+    local_sources = set()
+    for group in groups:
+        if 'LOCAL_CFLAGS' in group or 'LOCAL_CXXFLAGS' in group or 'LOCAL_CCFLAGS' in group or 'LOCAL_CPPPATH' in group or 'LOCAL_CPPDEFINES' in group:
+            for source in group['src']:
+                local_sources.add(source.abspath)
+
+    if not local_sources:
+        return objects
+
+    def is_local(obj):
+        if obj.abspath in local_sources:
+            return True
+        if obj.abspath in _UnityMembers:
+            # a later DefineGroup added local flags to the group
+            return _UnityMembers[obj.abspath][0].abspath in local_sources
+        return len(obj.sources) > 0 and obj.sources[0].abspath in local_sources
+
+    return [obj for obj in objects if not is_local(obj)]
 
 def DoBuilding(target, objects):
+    global _BuildObjects
 
     # merge all objects into one list
     def one_list(l):
@@ -745,7 +1251,11 @@ def DoBuilding(target, objects):
 
         return False
 
-    objects = one_list(objects)
+    if _SnapshotObjects is not None:
+        objects = list(_SnapshotObjects)
+    else:
+        objects = one_list(objects)
+    _BuildObjects = objects
 
     program = None
     # check whether special buildlib option
@@ -753,26 +1263,19 @@ def DoBuilding(target, objects):
     if lib_name:
         objects = [] # remove all of objects
         # build library with special component
-        for Group in Projects:
-            if Group['name'] == lib_name:
-                lib_name = GroupLibName(Group['name'], Env)
-                if not local_group(Group, objects):
-                    objects = Env.Object(Group['src'])
-
-                program = Env.Library(lib_name, objects)
+        Group = FindGroup(lib_name)
+        if Group:
+            lib_name = GroupLibName(Group['name'], Env)
+            if not local_group(Group, objects):
+                objects = Env.Object(Group['src'])
 
-                # add library copy action
-                Env.BuildLib(lib_name, program)
+            program = Env.Library(lib_name, objects)
 
-                break
+            # add library copy action
+            Env.BuildLib(lib_name, program)
     else:
         # remove source files with local flags setting
-        for group in Projects:
-            if 'LOCAL_CFLAGS' in group or 'LOCAL_CXXFLAGS' in group or 'LOCAL_CCFLAGS' in group or 'LOCAL_CPPPATH' in group or 'LOCAL_CPPDEFINES' in group:
-                for source in group['src']:
-                    for obj in objects:
-                        if source.abspath == obj.abspath or (len(obj.sources) > 0 and source.abspath == obj.sources[0].abspath):
-                            objects.remove(obj)
+        objects = RemoveLocalObjects(objects, Projects)
 
         # re-add the source files to the objects
         for group in Projects:
@@ -782,9 +1285,12 @@ def DoBuilding(target, objects):
 
     EndBuilding(target, program)
 
-def GenTargetProject(program = None):
+def GenTargetProject(program = None, target = None):
 
-    if GetOption('target') == 'mdk':
+    if target is None:
+        target = GetTargets()[0]
+
+    if target == 'mdk':
         from keil import MDKProject
         from keil import MDK4Project
         from keil import MDK5Project
@@ -803,71 +1309,173 @@ def GenTargetProject(program = None):
                 else:
                     print ('No template project file found.')
 
-    if GetOption('target') == 'mdk4':
+    if target == 'mdk4':
         from keil import MDK4Project
         MDK4Project('project.uvproj', Projects)
 
-    if GetOption('target') == 'mdk5':
+    if target == 'mdk5':
         from keil import MDK5Project
         MDK5Project('project.uvprojx', Projects)
 
-    if GetOption('target') == 'iar':
+    if target == 'iar':
         from iar import IARProject
         IARProject('project.ewp', Projects)
 
-    if GetOption('target') == 'vs':
+    if target == 'vs':
         from vs import VSProject
         VSProject('project.vcproj', Projects, program)
 
-    if GetOption('target') == 'vs2012':
+    if target == 'vs2012':
         from vs2012 import VS2012Project
         VS2012Project('project.vcxproj', Projects, program)
 
-    if GetOption('target') == 'cb':
+    if target == 'cb':
         from codeblocks import CBProject
         CBProject('project.cbp', Projects, program)
 
-    if GetOption('target') == 'ua':
+    if target == 'ua':
         from ua import PrepareUA
         PrepareUA(Projects, Rtt_Root, str(Dir('#')))
 
-    if GetOption('target') == 'vsc':
+    if target == 'vsc':
         from vsc import GenerateVSCode
         GenerateVSCode(Env)
 
-    if GetOption('target') == 'cdk':
+    if target == 'cdk':
         from cdk import CDKProject
         CDKProject('project.cdkproj', Projects)
 
-    if GetOption('target') == 'ses':
+    if target == 'ses':
         from ses import SESProject
         SESProject(Env)
 
-    if GetOption('target') == 'makefile':
+    if target == 'makefile':
         from makefile import TargetMakefile
         TargetMakefile(Env)
 
-    if GetOption('target') == 'eclipse':
+    if target == 'eclipse':
         from eclipse import TargetEclipse
         TargetEclipse(Env, GetOption('reset-project-config'), GetOption('project-name'))
 
-    if GetOption('target') == 'codelite':
+    if target == 'codelite':
         from codelite import TargetCodelite
         TargetCodelite(Projects, program)
 
-    if GetOption('target') == 'cmake' or GetOption('target') == 'cmake-armclang':
+    if target == 'cmake' or target == 'cmake-armclang':
         from cmake import CMakeProject
         CMakeProject(Env,Projects)
-    if GetOption('target') == 'xmake':
+    if target == 'xmake':
         from xmake import XMakeProject
         XMakeProject(Env, Projects)
 
+# generators that only read Projects/Env and write their own files
+ConcurrentTargets = ['mdk4', 'mdk5', 'iar', 'vsc', 'eclipse', 'cmake', 'cmake-armclang']
+# generators using utils.ProjectInfo(), which walks the build graph
+ProjectInfoTargets = ['vsc', 'cdk', 'ses', 'makefile', 'eclipse', 'cmake', 'cmake-armclang', 'xmake']
+
+_TargetNames = []   # --target values generated by this run
+_OtherTargets = []  # --target values of other toolchains, one list each
+
+def GetTargets():
+    # --target=mdk5,iar,cmake
+    targets = []
+    for name in (GetOption('target') or '').split(','):
+        name = name.strip()
+        if name and name not in targets:
+            targets.append(name)
+    return targets
+
+def GenTargetProjects(program, targets):
+    """
+    Generate the project files of all targets from this evaluation and print
+    how long each generator took. The ones in ConcurrentTargets run on a
+    thread pool, the others (walking the build graph themselves) in order.
+    """
+    import time
+
+    try:
+        from concurrent.futures import ThreadPoolExecutor
+    except ImportError:
+        ThreadPoolExecutor = None
+
+    def generate(target):
+        start = time.time()
+        GenTargetProject(program, target)
+        return time.time() - start
+
+    concurrent = [t for t in targets if t in ConcurrentTargets]
+    if not ThreadPoolExecutor or len(concurrent) < 2:
+        concurrent = []
+
+    timing = {}
+    if concurrent:
+        # scan the headers once, before the generators share the result
+        if [t for t in concurrent if t in ProjectInfoTargets]:
+            start = time.time()
+            utils.TargetGetList(Env, ['h'])
+            print('%-16s %.2fs' % ('(headers)', time.time() - start))
+
+        with ThreadPoolExecutor(max_workers=len(concurrent)) as pool:
+            for target, elapsed in zip(concurrent, pool.map(generate, concurrent)):
+                timing[target] = elapsed
+
+    for target in targets:
+        if target not in timing:
+            timing[target] = generate(target)
+
+    if len(targets) > 1:
+        for target in targets:
+            print('%-16s %.2fs' % (target, timing[target]))
+
+# options GenOtherTargets does not pass on: the directory and targets it sets
+# itself, and what the first run already did after generating (--dist*) or
+# only matters for building
+OtherTargetsDropValue = ['--target', '-C', '--directory', '--dist-link', '--buildlib', '--useconfig',
+                         '--objcache', '--unity-size', '-j', '--jobs']
+OtherTargetsDropFlag = ['--dist', '--dist-strip', '--dist-ide', '--cleanlib', '--cscope', '--clang-analyzer',
+                        '--stackanalysis', '--genconfig', '--menuconfig', '--pyconfig', '--pyconfig-silent',
+                        '--unity', '-c', '--clean', '--remove']
+
+def _OtherTargetsArgs(argv):
+    args = []
+    skip = False
+    for arg in argv:
+        name = arg.split('=', 1)[0]
+        if skip:
+            skip = False
+        elif arg in OtherTargetsDropValue:
+            skip = True
+        elif name in OtherTargetsDropValue or name in OtherTargetsDropFlag:
+            pass
+        elif [o for o in ['-C', '-j'] if arg.startswith(o)]:
+            # -Cdir, -j8
+            pass
+        else:
+            args.append(arg)
+    return args
+
+def GenOtherTargets(targets):
+    # run scons again for the --target values of another toolchain
+    import subprocess
+    import time
+
+    args = _OtherTargetsArgs(sys.argv[1:])
+
+    start = time.time()
+    cmd = [sys.executable, sys.argv[0], '--target=' + ','.join(targets)] + args
+    ret = subprocess.call(cmd, cwd=Dir('#').abspath)
+    print('%-16s %.2fs' % (','.join(targets), time.time() - start))
+    if ret != 0:
+        print('Error: generating ' + ','.join(targets) + ' failed')
+        sys.exit(ret)
+
 def EndBuilding(target, program = None):
 
     need_exit = False
 
     Env['target']  = program
     Env['project'] = Projects
+    Env['target_lists'] = _TargetLists
 
     if hasattr(rtconfig, 'BSP_LIBRARY_TYPE'):
         Env['bsp_lib_type'] = rtconfig.BSP_LIBRARY_TYPE
@@ -878,12 +1486,26 @@ def EndBuilding(target, program = None):
     Env.AddPostAction(target, rtconfig.POST_ACTION)
     # Add addition clean files
     Clean(target, 'cconfig.h')
+    Clean(target, ConfigCacheName)
+    Clean(target, ProjectSnapshotName)
     Clean(target, 'rtua.py')
     Clean(target, 'rtua.pyc')
     Clean(target, '.sconsign.dblite')
 
     if GetOption('target'):
-        GenTargetProject(program)
+        GenTargetProjects(program, _TargetNames)
+
+    if not GetOption('buildlib'):
+        SaveProjectSnapshot()
+
+    for targets in _OtherTargets:
+        GenOtherTargets(targets)
+
+    # the compiles run after the SConscripts, report when scons is done
+    if Env.get('OBJCACHE_STATS'):
+        import atexit
+        from objcache import ObjectCacheReport
+        atexit.register(ObjectCacheReport, Env['OBJCACHE_STATS'])
 
     BSP_ROOT = Dir('#').abspath
     if GetOption('make-dist') and program != None:
@@ -891,7 +1513,7 @@ def EndBuilding(target, program = None):
         MkDist(program, BSP_ROOT, Rtt_Root, Env)
     if GetOption('make-dist-strip') and program != None:
         from mkdist import MkDist_Strip
-        MkDist_Strip(program, BSP_ROOT, Rtt_Root, Env)
+        MkDist_Strip(program, BSP_ROOT, Rtt_Root, Env, GetOption('dist-link'))
         need_exit = True
     if GetOption('make-dist-ide') and program != None:
         from mkdist import MkDist
@@ -970,12 +1592,7 @@ def GetVersion():
     rtdef = os.path.join(Rtt_Root, 'include', 'rtdef.h')
 
     # parse rtdef.h to get RT-Thread version
-    prepcessor = PatchedPreProcessor()
-    f = open(rtdef, 'r')
-    contents = f.read()
-    f.close()
-    prepcessor.process_contents(contents)
-    def_ns = prepcessor.cpp_namespace
+    def_ns = ParseConfigHeader(rtdef)
 
     version = int([ch for ch in def_ns['RT_VERSION'] if ch in '0123456789.'])
     subversion = int([ch for ch in def_ns['RT_SUBVERSION'] if ch in '0123456789.'])
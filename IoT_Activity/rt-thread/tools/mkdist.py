@@ -53,25 +53,230 @@ def do_copy_folder(src_dir, dst_dir, ignore=None):
 
     shutil.copytree(src_dir, dst_dir, ignore = ignore)
 
+def _replace_file(tmp, dst):
+    if hasattr(os, 'replace'):
+        os.replace(tmp, dst)
+    else:
+        if os.path.exists(dst):
+            os.remove(dst)
+        os.rename(tmp, dst)
+
+def _rewrite_file(fn, lines):
+    # write a new file instead of truncating this one, it may be a hard link
+    tmp = fn + '.tmp'
+    with open(tmp, 'w') as f:
+        for line in lines:
+            f.write(line)
+    shutil.copymode(fn, tmp)
+    _replace_file(tmp, fn)
+
+class DistCopier:
+    """
+    Incremental copy of a distribution tree.
+
+    Files are queued with add_file()/add_folder() and copied by copy() on a
+    pool of threads. A destination with the size and mtime of its source is
+    left alone, unless it is a hard link to the source and this run must not
+    hard link it; otherwise the file is cloned (reflink, copy-on-write) or hard
+    linked where that is allowed and possible, else copied with
+    shutil.copy2. finish() removes the files the previous run copied that
+    are no longer part of the tree and writes the manifest, <dist_dir>.json,
+    with the source, size, mtime and sha1 of every file.
+
+    link: 'copy', 'reflink' (default) or 'hardlink'. Hard links are only
+    made for files added with linkable=True, i.e. files nothing writes to
+    in the dist tree afterwards.
+    """
+
+    def __init__(self, dist_dir, link='reflink', jobs=8):
+        import json
+
+        self.dist_dir = dist_dir
+        self.link = link or 'reflink'
+        self.jobs = jobs
+        self.manifest_path = dist_dir + '.json'
+        self.pending = []
+        self.queued = set()
+        self.files = {}
+        self.stats = {'copy': 0, 'reflink': 0, 'hardlink': 0, 'unchanged': 0, 'removed': 0}
+        self._can_reflink = self.link in ('reflink', 'hardlink')
+        self._can_hardlink = self.link == 'hardlink'
+
+        self.previous = {}
+        try:
+            with open(self.manifest_path, 'r') as f:
+                self.previous = json.load(f).get('files', {})
+        except (IOError, OSError, ValueError):
+            # no manifest: an older dist tree could hold anything, start clean
+            if os.path.exists(dist_dir):
+                shutil.rmtree(dist_dir)
+
+    def add_file(self, src, dst, linkable=False):
+        # like do_copy_file, a missing source is skipped
+        if os.path.isfile(src) and dst not in self.queued:
+            self.queued.add(dst)
+            self.pending.append((src, dst, linkable))
+
+    def add_folder(self, src_dir, dst_dir, ignore=None, linkable=False):
+        # like shutil.copytree, ignore(dir, names) returns the names to skip
+        for parent, dirnames, filenames in os.walk(src_dir):
+            if ignore:
+                ignored = ignore(parent, dirnames + filenames)
+                dirnames[:] = [d for d in dirnames if d not in ignored]
+                filenames = [f for f in filenames if f not in ignored]
+            dirnames.sort()
+
+            rel = os.path.relpath(parent, src_dir)
+            for filename in sorted(filenames):
+                self.add_file(os.path.join(parent, filename), os.path.normpath(os.path.join(dst_dir, rel, filename)), linkable)
+
+    def _reflink(self, src, dst):
+        import fcntl
+
+        FICLONE = 0x40049409
+        with open(src, 'rb') as s:
+            with open(dst, 'wb') as d:
+                fcntl.ioctl(d.fileno(), FICLONE, s.fileno())
+        shutil.copystat(src, dst)
+
+    def _unchanged(self, st, dst_st, linkable):
+        if dst_st is None or dst_st.st_size != st.st_size or int(dst_st.st_mtime) != int(st.st_mtime):
+            return False
+        # a hard link from an earlier --dist-link=hardlink run writes through
+        # into the source, keep it only if this file may be hard linked now
+        if st.st_ino and st.st_ino == dst_st.st_ino and st.st_dev == dst_st.st_dev:
+            return linkable and self.link == 'hardlink'
+        return True
+
+    def _copy_one(self, item):
+        import hashlib
+
+        src, dst, linkable = item
+        st = os.stat(src)
+        rel = os.path.relpath(dst, self.dist_dir).replace(os.sep, '/')
+        entry = {'src': src, 'size': st.st_size, 'mtime': int(st.st_mtime)}
+
+        try:
+            dst_st = os.stat(dst)
+        except OSError:
+            dst_st = None
+
+        if self._unchanged(st, dst_st, linkable):
+            how = 'unchanged'
+        else:
+            path = os.path.dirname(dst)
+            if not os.path.isdir(path):
+                try:
+                    os.makedirs(path)
+                except OSError:
+                    # created by another worker meanwhile
+                    pass
+            if dst_st:
+                # never write into the old file, it may be a link to a source
+                os.remove(dst)
+
+            how = None
+            if linkable and self._can_hardlink:
+                try:
+                    os.link(src, dst)
+                    how = 'hardlink'
+                except (OSError, AttributeError):
+                    self._can_hardlink = False
+            if how is None and self._can_reflink:
+                try:
+                    self._reflink(src, dst)
+                    how = 'reflink'
+                except (IOError, OSError, ImportError):
+                    self._can_reflink = False
+                    if os.path.exists(dst):
+                        os.remove(dst)
+            if how is None:
+                shutil.copy2(src, dst)
+                how = 'copy'
+
+        old = self.previous.get(rel)
+        if how == 'unchanged' and old and old.get('size') == entry['size'] and old.get('mtime') == entry['mtime']:
+            entry['sha1'] = old.get('sha1')
+        else:
+            sha1 = hashlib.sha1()
+            with open(src, 'rb') as f:
+                for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                    sha1.update(chunk)
+            entry['sha1'] = sha1.hexdigest()
+
+        return rel, entry, how
+
+    def copy(self):
+        """Copy what has been queued so far"""
+        pending, self.pending = self.pending, []
+
+        # unchanged files with a known sha1 only need two stat() calls,
+        # not worth a trip through the pool
+        todo = []
+        for item in pending:
+            rel = os.path.relpath(item[1], self.dist_dir).replace(os.sep, '/')
+            old = self.previous.get(rel)
+            if old and old.get('sha1'):
+                try:
+                    st = os.stat(item[0])
+                    dst_st = os.stat(item[1])
+                except OSError:
+                    st = dst_st = None
+                if st and int(st.st_mtime) == old.get('mtime') and st.st_size == old.get('size') and \
+                    self._unchanged(st, dst_st, item[2]):
+                    self.files[rel] = {'src': item[0], 'size': st.st_size, 'mtime': int(st.st_mtime), 'sha1': old['sha1']}
+                    self.stats['unchanged'] += 1
+                    continue
+            todo.append(item)
+        pending = todo
+
+        try:
+            from concurrent.futures import ThreadPoolExecutor
+        except ImportError:
+            ThreadPoolExecutor = None
+
+        if ThreadPoolExecutor and self.jobs > 1 and len(pending) > 1:
+            with ThreadPoolExecutor(max_workers=self.jobs) as pool:
+                results = list(pool.map(self._copy_one, pending))
+        else:
+            results = [self._copy_one(item) for item in pending]
+
+        for rel, entry, how in results:
+            self.files[rel] = entry
+            self.stats[how] += 1
+
+    def finish(self):
+        import json
+
+        self.copy()
+
+        # files of the previous run that are no longer part of the dist
+        for rel in self.previous:
+            if rel not in self.files:
+                fn = os.path.join(self.dist_dir, rel.replace('/', os.sep))
+                if os.path.isfile(fn):
+                    os.remove(fn)
+                    self.stats['removed'] += 1
+                    path = os.path.dirname(fn)
+                    while path != self.dist_dir and os.path.isdir(path) and not os.listdir(path):
+                        os.rmdir(path)
+                        path = os.path.dirname(path)
+
+        tmp = self.manifest_path + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump({'dist_dir': self.dist_dir, 'files': self.files}, f, indent=1, sort_keys=True)
+        _replace_file(tmp, self.manifest_path)
+
+        print('=> %d files: %d copied, %d reflinked, %d hard linked, %d unchanged, %d removed' % (len(self.files),
+            self.stats['copy'], self.stats['reflink'], self.stats['hardlink'], self.stats['unchanged'], self.stats['removed']))
+
 source_ext = ['c', 'h', 's', 'S', 'cpp', 'xpm']
 source_list = []
 
 def walk_children(child):
-    global source_list
-    global source_ext
-
-    # print child
-    full_path = child.rfile().abspath
-    file_type  = full_path.rsplit('.',1)[1]
-    #print file_type
-    if file_type in source_ext:
-        if full_path not in source_list:
-            source_list.append(full_path)
+    from utils import WalkChildren
 
-    children = child.all_children()
-    if children != []:
-        for item in children:
-            walk_children(item)
+    WalkChildren(child, source_ext, source_list)
 
 def walk_kconfig(RTT_ROOT, source_list):
     for parent, dirnames, filenames in os.walk(RTT_ROOT):
@@ -89,21 +294,25 @@ def walk_kconfig(RTT_ROOT, source_list):
             pathfile = os.path.join(parent, 'KConfig')
             source_list.append(pathfile)
 
-def bsp_copy_files(bsp_root, dist_dir):
+def bsp_copy_files(bsp_root, dist_dir, copier=None):
     # copy BSP files
-    do_copy_folder(os.path.join(bsp_root), dist_dir,
-        ignore_patterns('build', 'dist', '*.pyc', '*.old', '*.map', 'rtthread.bin', '.sconsign.dblite', '*.elf', '*.axf', 'cconfig.h'))
+    ignore = ignore_patterns('build', 'dist', 'dist-strip', '*.pyc', '*.old', '*.map', 'rtthread.bin', '.sconsign.dblite', '.rtconfig.cache', '.rtproject.json', '*.elf', '*.axf', 'cconfig.h')
+    if copier:
+        copier.add_folder(os.path.join(bsp_root), dist_dir, ignore)
+    else:
+        do_copy_folder(os.path.join(bsp_root), dist_dir, ignore)
 
 def bsp_update_sconstruct(dist_dir):
     with open(os.path.join(dist_dir, 'SConstruct'), 'r') as f:
         data = f.readlines()
-    with open(os.path.join(dist_dir, 'SConstruct'), 'w') as f:
-        for line in data:
-            if line.find('RTT_ROOT') != -1:
-                if line.find('sys.path') != -1:
-                    f.write('# set RTT_ROOT\n')
-                    f.write('if not os.getenv("RTT_ROOT"): \n    RTT_ROOT="rt-thread"\n\n')
-            f.write(line)
+    lines = []
+    for line in data:
+        if line.find('RTT_ROOT') != -1:
+            if line.find('sys.path') != -1:
+                lines.append('# set RTT_ROOT\n')
+                lines.append('if not os.getenv("RTT_ROOT"): \n    RTT_ROOT="rt-thread"\n\n')
+        lines.append(line)
+    _rewrite_file(os.path.join(dist_dir, 'SConstruct'), lines)
 
 def bsp_update_kconfig_testcases(dist_dir):
     # delete testcases in rt-thread/Kconfig
@@ -112,10 +321,8 @@ def bsp_update_kconfig_testcases(dist_dir):
 
     with open(os.path.join(dist_dir, 'rt-thread/Kconfig'), 'r') as f:
         data = f.readlines()
-    with open(os.path.join(dist_dir, 'rt-thread/Kconfig'), 'w') as f:
-        for line in data:
-            if line.find('examples/utest/testcases/Kconfig') == -1:
-                f.write(line)
+    lines = [line for line in data if line.find('examples/utest/testcases/Kconfig') == -1]
+    _rewrite_file(os.path.join(dist_dir, 'rt-thread/Kconfig'), lines)
 
 def bsp_update_kconfig(dist_dir):
     # change RTT_ROOT in Kconfig
@@ -124,16 +331,17 @@ def bsp_update_kconfig(dist_dir):
 
     with open(os.path.join(dist_dir, 'Kconfig'), 'r') as f:
         data = f.readlines()
-    with open(os.path.join(dist_dir, 'Kconfig'), 'w') as f:
-        found = 0
-        for line in data:
-            if line.find('RTT_ROOT') != -1:
-                found = 1
-            if line.find('default') != -1 and found:
-                position = line.find('default')
-                line = line[0:position] + 'default "rt-thread"\n'
-                found = 0
-            f.write(line)
+    lines = []
+    found = 0
+    for line in data:
+        if line.find('RTT_ROOT') != -1:
+            found = 1
+        if line.find('default') != -1 and found:
+            position = line.find('default')
+            line = line[0:position] + 'default "rt-thread"\n'
+            found = 0
+        lines.append(line)
+    _rewrite_file(os.path.join(dist_dir, 'Kconfig'), lines)
 
 def bsp_update_kconfig_library(dist_dir):
     # change RTT_ROOT in Kconfig
@@ -142,16 +350,17 @@ def bsp_update_kconfig_library(dist_dir):
 
     with open(os.path.join(dist_dir, 'Kconfig'), 'r') as f:
         data = f.readlines()
-    with open(os.path.join(dist_dir, 'Kconfig'), 'w') as f:
-        found = 0
-        for line in data:
-            if line.find('RTT_ROOT') != -1:
-                found = 1
-            if line.find('../libraries') != -1 and found:
-                position = line.find('../libraries')
-                line = line[0:position] + 'libraries/Kconfig"\n'
-                found = 0
-            f.write(line)
+    lines = []
+    found = 0
+    for line in data:
+        if line.find('RTT_ROOT') != -1:
+            found = 1
+        if line.find('../libraries') != -1 and found:
+            position = line.find('../libraries')
+            line = line[0:position] + 'libraries/Kconfig"\n'
+            found = 0
+        lines.append(line)
+    _rewrite_file(os.path.join(dist_dir, 'Kconfig'), lines)
 
     # change board/kconfig path
     if not os.path.isfile(os.path.join(dist_dir, 'board/Kconfig')):
@@ -159,12 +368,13 @@ def bsp_update_kconfig_library(dist_dir):
 
     with open(os.path.join(dist_dir, 'board/Kconfig'), 'r') as f:
         data = f.readlines()
-    with open(os.path.join(dist_dir, 'board/Kconfig'), 'w') as f:
-        for line in data:
-            if line.find('../libraries/HAL_Drivers/Kconfig') != -1:
-                position = line.find('../libraries/HAL_Drivers/Kconfig')
-                line = line[0:position] + 'libraries/HAL_Drivers/Kconfig"\n'
-            f.write(line)
+    lines = []
+    for line in data:
+        if line.find('../libraries/HAL_Drivers/Kconfig') != -1:
+            position = line.find('../libraries/HAL_Drivers/Kconfig')
+            line = line[0:position] + 'libraries/HAL_Drivers/Kconfig"\n'
+        lines.append(line)
+    _rewrite_file(os.path.join(dist_dir, 'board/Kconfig'), lines)
 
 def bs_update_ide_project(bsp_root, rtt_root, rttide = None):
     import subprocess
@@ -195,18 +405,23 @@ def zip_dist(dist_dir, dist_name):
     import zipfile
 
     zip_filename = os.path.join(dist_dir)
-    zip = zipfile.ZipFile(zip_filename + '.zip', 'w')
+    tmp_filename = zip_filename + '.zip.tmp'
+    zip = zipfile.ZipFile(tmp_filename, 'w')
     pre_len = len(os.path.dirname(dist_dir))
 
+    # files are streamed into the archive in chunks, in a stable order
     for parent, dirnames, filenames in os.walk(dist_dir):
-        for filename in filenames:
+        dirnames.sort()
+        for filename in sorted(filenames):
             pathfile = os.path.join(parent, filename)
             arcname = pathfile[pre_len:].strip(os.path.sep)
             zip.write(pathfile, arcname)
 
     zip.close()
+    # a failed run leaves the previous package alone
+    _replace_file(tmp_filename, zip_filename + '.zip')
 
-def MkDist_Strip(program, BSP_ROOT, RTT_ROOT, Env):
+def MkDist_Strip(program, BSP_ROOT, RTT_ROOT, Env, link = None):
     global source_list
 
     print('make distribution and strip useless files....')
@@ -215,17 +430,23 @@ def MkDist_Strip(program, BSP_ROOT, RTT_ROOT, Env):
     dist_dir  = os.path.join(BSP_ROOT, 'dist-strip', dist_name)
     target_path = os.path.join(dist_dir, 'rt-thread')
 
+    # an existing dist tree is updated in place, see DistCopier
+    copier = DistCopier(dist_dir, link)
+
     print('=> %s' % os.path.basename(BSP_ROOT))
-    bsp_copy_files(BSP_ROOT, dist_dir)
+    bsp_copy_files(BSP_ROOT, dist_dir, copier)
 
     # copy stm32 bsp libiary files
     if os.path.basename(os.path.dirname(BSP_ROOT)) == 'stm32':
         print("=> copy stm32 bsp library")
         library_path = os.path.join(os.path.dirname(BSP_ROOT), 'libraries')
         library_dir  = os.path.join(dist_dir, 'libraries')
-        bsp_copy_files(os.path.join(library_path, 'HAL_Drivers'), os.path.join(library_dir, 'HAL_Drivers'))
-        bsp_copy_files(os.path.join(library_path, Env['bsp_lib_type']), os.path.join(library_dir, Env['bsp_lib_type']))
-        shutil.copyfile(os.path.join(library_path, 'Kconfig'), os.path.join(library_dir, 'Kconfig'))
+        bsp_copy_files(os.path.join(library_path, 'HAL_Drivers'), os.path.join(library_dir, 'HAL_Drivers'), copier)
+        bsp_copy_files(os.path.join(library_path, Env['bsp_lib_type']), os.path.join(library_dir, Env['bsp_lib_type']), copier)
+        copier.add_file(os.path.join(library_path, 'Kconfig'), os.path.join(library_dir, 'Kconfig'))
+
+    # the BSP files have to be in place for dist_handle
+    copier.copy()
 
     # do bsp special dist handle
     if 'dist_handle' in Env:
@@ -283,42 +504,45 @@ def MkDist_Strip(program, BSP_ROOT, RTT_ROOT, Env):
     # add all of Kconfig files
     walk_kconfig(RTT_ROOT, source_list)
 
-    # copy all files to target directory
+    # copy all files to target directory, nothing writes to them afterwards
+    # except for Kconfig, which bsp_update_kconfig_testcases replaces
     source_list.sort()
+    print('=> %d source, SConscript and Kconfig files' % len(source_list))
     for src in source_list:
         dst = src.replace(RTT_ROOT, '')
         if dst[0] == os.sep or dst[0] == '/':
             dst = dst[1:]
 
-        print('=> %s' % dst)
         dst = os.path.join(target_path, dst)
-        do_copy_file(src, dst)
+        copier.add_file(src, dst, linkable = True)
 
     # copy tools directory
     print('=> tools')
-    do_copy_folder(os.path.join(RTT_ROOT, 'tools'), os.path.join(target_path, 'tools'), ignore_patterns('*.pyc'))
-    do_copy_file(os.path.join(RTT_ROOT, 'Kconfig'), os.path.join(target_path, 'Kconfig'))
-    do_copy_file(os.path.join(RTT_ROOT, 'AUTHORS'), os.path.join(target_path, 'AUTHORS'))
-    do_copy_file(os.path.join(RTT_ROOT, 'COPYING'), os.path.join(target_path, 'COPYING'))
-    do_copy_file(os.path.join(RTT_ROOT, 'README.md'), os.path.join(target_path, 'README.md'))
-    do_copy_file(os.path.join(RTT_ROOT, 'README_zh.md'), os.path.join(target_path, 'README_zh.md'))
+    copier.add_folder(os.path.join(RTT_ROOT, 'tools'), os.path.join(target_path, 'tools'), ignore_patterns('*.pyc'), linkable = True)
+    copier.add_file(os.path.join(RTT_ROOT, 'Kconfig'), os.path.join(target_path, 'Kconfig'), linkable = True)
+    copier.add_file(os.path.join(RTT_ROOT, 'AUTHORS'), os.path.join(target_path, 'AUTHORS'), linkable = True)
+    copier.add_file(os.path.join(RTT_ROOT, 'COPYING'), os.path.join(target_path, 'COPYING'), linkable = True)
+    copier.add_file(os.path.join(RTT_ROOT, 'README.md'), os.path.join(target_path, 'README.md'), linkable = True)
+    copier.add_file(os.path.join(RTT_ROOT, 'README_zh.md'), os.path.join(target_path, 'README_zh.md'), linkable = True)
 
     print('=> %s' % os.path.join('components', 'libc', 'compilers'))
-    do_copy_folder(os.path.join(RTT_ROOT, 'components', 'libc', 'compilers'), os.path.join(target_path, 'components', 'libc', 'compilers'))
+    copier.add_folder(os.path.join(RTT_ROOT, 'components', 'libc', 'compilers'), os.path.join(target_path, 'components', 'libc', 'compilers'), linkable = True)
 
     if sources_include_sal:
         print('=> %s' % os.path.join('components', 'net', 'sal_socket'))
-        do_copy_folder(os.path.join(RTT_ROOT, 'components', 'net', 'sal_socket'), os.path.join(target_path, 'components', 'net', 'sal_socket'))
+        copier.add_folder(os.path.join(RTT_ROOT, 'components', 'net', 'sal_socket'), os.path.join(target_path, 'components', 'net', 'sal_socket'), linkable = True)
 
     # copy all libcpu/ARCH directory
     import rtconfig
     print('=> %s' % (os.path.join('libcpu', rtconfig.ARCH, rtconfig.CPU)))
-    do_copy_folder(os.path.join(RTT_ROOT, 'libcpu', rtconfig.ARCH, rtconfig.CPU), os.path.join(target_path, 'libcpu', rtconfig.ARCH, rtconfig.CPU))
+    copier.add_folder(os.path.join(RTT_ROOT, 'libcpu', rtconfig.ARCH, rtconfig.CPU), os.path.join(target_path, 'libcpu', rtconfig.ARCH, rtconfig.CPU), linkable = True)
     if os.path.exists(os.path.join(RTT_ROOT, 'libcpu', rtconfig.ARCH, 'common')):
         print('=> %s' % (os.path.join('libcpu', rtconfig.ARCH, 'common')))
-        do_copy_folder(os.path.join(RTT_ROOT, 'libcpu', rtconfig.ARCH, 'common'), os.path.join(target_path, 'libcpu', rtconfig.ARCH, 'common'))
-    do_copy_file(os.path.join(RTT_ROOT, 'libcpu', 'Kconfig'), os.path.join(target_path, 'libcpu', 'Kconfig'))
-    do_copy_file(os.path.join(RTT_ROOT, 'libcpu', 'SConscript'), os.path.join(target_path, 'libcpu', 'SConscript'))
+        copier.add_folder(os.path.join(RTT_ROOT, 'libcpu', rtconfig.ARCH, 'common'), os.path.join(target_path, 'libcpu', rtconfig.ARCH, 'common'), linkable = True)
+    copier.add_file(os.path.join(RTT_ROOT, 'libcpu', 'Kconfig'), os.path.join(target_path, 'libcpu', 'Kconfig'), linkable = True)
+    copier.add_file(os.path.join(RTT_ROOT, 'libcpu', 'SConscript'), os.path.join(target_path, 'libcpu', 'SConscript'), linkable = True)
+
+    copier.finish()
 
     print('Update configuration files...')
     # change RTT_ROOT in SConstruct
@@ -0,0 +1,284 @@
+#
+# File      : objcache.py
+# This file is part of RT-Thread RTOS
+# COPYRIGHT (C) 2006 - 2023, RT-Thread Development Team
+#
+#  This program is free software; you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation; either version 2 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License along
+#  with this program; if not, write to the Free Software Foundation, Inc.,
+#  51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+# Change Logs:
+# Date           Author       Notes
+#
+
+"""
+Content-addressed cache of compiled objects, shared by all BSPs.
+
+Enabled with `scons --objcache=DIR` or RTT_OBJCACHE=DIR for gcc toolchains.
+CCCOM/CXXCOM then run the compiler through this script:
+
+    python objcache.py DIR arm-none-eabi-gcc -o x.o -c ... x.c
+
+which preprocesses the source and looks the object up under the sha1 of
+
+    - the preprocessed source (without line markers unless building -g),
+    - the flags, leaving out -I/-D/-U/-include whose effect already is in
+      the preprocessed source,
+    - the compiler (real path, size, mtime),
+    - the source file name, which gcc writes into the object's symbol table.
+
+so the same kernel file built with the same flags hits in every BSP and
+variant dir. Objects with debug information also depend on the paths of
+their sources, then the line markers (and the working directory for
+relative sources) are part of the key. Compiler warnings are stored with
+the object and printed again on a hit. Commands that aren't a plain
+single source `-c -o` compile, or that write dependency files, are run
+as they are.
+"""
+
+import hashlib
+import os
+import re
+import shutil
+import subprocess
+import sys
+
+ObjectCacheVersion = '2'
+
+SOURCE_EXTS = ['.c', '.cc', '.cpp', '.cxx', '.c++', '.m', '.s', '.S', '.sx']
+# options whose effect ends up in the preprocessed source
+PREPROCESSOR_ARG = ['-I', '-D', '-U', '-include', '-imacros', '-isystem', '-iquote', '-idirafter']
+# other options taking the next argument
+OPTION_ARG = ['-o', '-x', '-MF', '-MT', '-MQ', '-Xassembler', '-Xpreprocessor', '--param', '-aux-info']
+
+LINE_MARKER = re.compile(br'^# *[0-9]+ "(.*)"')
+
+def _which(cmd):
+    if os.path.dirname(cmd):
+        return os.path.abspath(cmd)
+    for path in os.environ.get('PATH', '').split(os.pathsep):
+        for name in [cmd, cmd + '.exe']:
+            fn = os.path.join(path, name)
+            if os.path.isfile(fn):
+                return fn
+    return cmd
+
+def _parse(args):
+    """
+    Return (flags, source, output) of a compile command, or None if it is
+    not one the cache can handle.
+    """
+    flags = []
+    sources = []
+    output = None
+    compile_only = False
+
+    i = 0
+    while i < len(args):
+        arg = args[i]
+        if arg == '-c':
+            compile_only = True
+        elif arg == '-o':
+            output = args[i + 1] if i + 1 < len(args) else None
+            i += 1
+        elif arg.startswith('-o'):
+            output = arg[2:]
+        elif arg.startswith('-M') or arg in ['-E', '-S', '-save-temps'] or arg.startswith('@'):
+            # dependency files, other outputs, response files
+            return None
+        elif arg in PREPROCESSOR_ARG:
+            i += 1
+        elif [p for p in PREPROCESSOR_ARG if arg.startswith(p)]:
+            pass
+        elif arg in OPTION_ARG:
+            if i + 1 < len(args):
+                flags += [arg, args[i + 1]]
+            i += 1
+        elif arg.startswith('-'):
+            flags.append(arg)
+        elif os.path.splitext(arg)[1] in SOURCE_EXTS:
+            sources.append(arg)
+        else:
+            flags.append(arg)
+        i += 1
+
+    if not compile_only or not output or len(sources) != 1:
+        return None
+    return flags, sources[0], output
+
+def _debug(flags):
+    return len([f for f in flags if f.startswith('-g') and f != '-g0']) > 0
+
+def _key(cc, flags, source, preprocessed):
+    h = hashlib.sha1()
+    h.update(ObjectCacheVersion.encode('utf-8'))
+
+    compiler = _which(cc)
+    try:
+        st = os.stat(compiler)
+        h.update(('%s\0%d\0%d\0' % (os.path.realpath(compiler), st.st_size, int(st.st_mtime))).encode('utf-8'))
+    except OSError:
+        h.update(cc.encode('utf-8'))
+
+    # the object's STT_FILE symbol names the source file
+    h.update('\0'.join(flags + [os.path.basename(source)]).encode('utf-8'))
+
+    debug = _debug(flags)
+    if debug and not os.path.isabs(source):
+        # the debug information names the source relative to here
+        h.update(os.getcwd().encode('utf-8'))
+
+    for line in preprocessed.splitlines(True):
+        marker = LINE_MARKER.match(line)
+        if marker:
+            if not debug:
+                continue
+            path = marker.group(1).decode('utf-8', 'replace')
+            if not path.startswith('<'):
+                line = ('# "%s"\n' % os.path.abspath(path)).encode('utf-8')
+        h.update(line)
+
+    return h.hexdigest()
+
+def _count(what):
+    stats = os.environ.get('RTT_OBJCACHE_STATS')
+    if stats:
+        try:
+            with open(stats, 'a') as f:
+                f.write(what + '\n')
+        except (IOError, OSError):
+            pass
+
+def _replace(tmp, dst):
+    if hasattr(os, 'replace'):
+        os.replace(tmp, dst)
+    else:
+        if os.path.exists(dst):
+            os.remove(dst)
+        os.rename(tmp, dst)
+
+def run(cache_dir, argv):
+    """Compile argv (compiler and its arguments) through the cache, return the exit code."""
+    cc = argv[0]
+    args = argv[1:]
+
+    parsed = _parse(args)
+    if parsed is None:
+        _count('skip')
+        return subprocess.call(argv)
+    flags, source, output = parsed
+
+    # preprocess: the same command with -E to stdout
+    cpp = [cc]
+    skip = False
+    for arg in args:
+        if skip:
+            skip = False
+        elif arg == '-o':
+            skip = True
+        elif arg == '-c':
+            cpp.append('-E')
+        elif not arg.startswith('-o'):
+            cpp.append(arg)
+    proc = subprocess.Popen(cpp, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    preprocessed, _ = proc.communicate()
+    if proc.returncode != 0:
+        # let the compiler report the error
+        _count('skip')
+        return subprocess.call(argv)
+
+    key = _key(cc, flags, source, preprocessed)
+    folder = os.path.join(cache_dir, key[:2])
+    obj = os.path.join(folder, key + '.o')
+    log = os.path.join(folder, key + '.stderr')
+
+    if os.path.isfile(obj):
+        shutil.copyfile(obj, output)
+        if os.path.isfile(log):
+            with open(log, 'r') as f:
+                sys.stderr.write(f.read())
+        _count('hit')
+        return 0
+
+    proc = subprocess.Popen(argv, stderr=subprocess.PIPE)
+    _, err = proc.communicate()
+    err = err.decode('utf-8', 'replace')
+    sys.stderr.write(err)
+    _count('miss')
+    if proc.returncode != 0 or not os.path.isfile(output):
+        return proc.returncode or 1
+
+    # warnings first, a hit needs both once the object is there
+    try:
+        if not os.path.isdir(folder):
+            os.makedirs(folder)
+        if err:
+            tmp = '%s.%d.tmp' % (log, os.getpid())
+            with open(tmp, 'w') as f:
+                f.write(err)
+            _replace(tmp, log)
+        tmp = '%s.%d.tmp' % (obj, os.getpid())
+        shutil.copyfile(output, tmp)
+        _replace(tmp, obj)
+    except (IOError, OSError):
+        # another build stored it first, or the cache is not writable
+        pass
+    return 0
+
+def EnableObjectCache(env, cache_dir, platform):
+    """
+    Route CCCOM/CXXCOM of env through the object cache in cache_dir and
+    return the statistics file the compiles count into, or None if the
+    toolchain is not supported.
+    """
+    if platform not in ['gcc']:
+        print('Warning: --objcache supports gcc toolchains only, not ' + platform)
+        return None
+
+    cache_dir = os.path.abspath(os.path.expanduser(cache_dir))
+    if not os.path.isdir(cache_dir):
+        os.makedirs(cache_dir)
+
+    # $( $) keeps the wrapper out of the build signature
+    env['OBJCACHE'] = '"%s" "%s" "%s"' % (sys.executable, os.path.splitext(os.path.abspath(__file__))[0] + '.py', cache_dir)
+    for com in ['CCCOM', 'CXXCOM']:
+        if com in env:
+            env[com] = '$( $OBJCACHE $) ' + env[com]
+
+    stats = os.path.join(env.Dir('#').abspath, '.objcache.stats')
+    with open(stats, 'w'):
+        pass
+    env['ENV']['RTT_OBJCACHE_STATS'] = stats
+    return stats
+
+def ObjectCacheReport(stats):
+    """Print and remove what the compiles of this run counted into stats."""
+    try:
+        with open(stats, 'r') as f:
+            counts = f.read().split()
+        os.remove(stats)
+    except (IOError, OSError):
+        return
+
+    hits = counts.count('hit')
+    misses = counts.count('miss')
+    if hits + misses + counts.count('skip') == 0:
+        return
+    rate = 100.0 * hits / (hits + misses) if hits + misses else 0.0
+    print('Object cache: %d hits, %d misses (%.1f%% hit rate), %d not cacheable' % (hits, misses, rate, counts.count('skip')))
+
+if __name__ == '__main__':
+    if len(sys.argv) < 3:
+        print('usage: %s CACHE_DIR COMPILER ARGS...' % os.path.basename(sys.argv[0]))
+        sys.exit(2)
+    sys.exit(run(sys.argv[1], sys.argv[2:]))
@@ -43,6 +43,12 @@ def AddOptions():
                       action = 'store_true',
                       default = False,
                       help = 'make distribution for RT-Thread Studio IDE')
+    AddOption('--dist-link',
+                      dest = 'dist-link',
+                      type = 'choice',
+                      choices = ['copy', 'reflink', 'hardlink'],
+                      default = 'reflink',
+                      help = 'how --dist-strip puts RT-Thread files into the dist tree: copy, reflink (default, falls back to copy) or hardlink')
     AddOption('--project-path',
                       dest = 'project-path',
                       type = 'string',
@@ -84,7 +90,26 @@ def AddOptions():
     AddOption('--target',
                       dest = 'target',
                       type = 'string',
-                      help = 'set target project: mdk/mdk4/mdk5/iar/vs/vsc/ua/cdk/ses/makefile/eclipse/codelite/cmake')
+                      help = 'set target project, or several separated by commas: mdk/mdk4/mdk5/iar/vs/vsc/ua/cdk/ses/makefile/eclipse/codelite/cmake')
+    AddOption('--no-snapshot',
+                      dest = 'no-snapshot',
+                      action = 'store_true',
+                      default = False,
+                      help = 'evaluate all SConscripts for --target instead of reusing the project snapshot')
+    AddOption('--objcache',
+                      dest = 'objcache',
+                      type = 'string',
+                      help = 'cache compiled objects in this directory, shared by all BSPs (or set RTT_OBJCACHE)')
+    AddOption('--unity',
+                      dest = 'unity',
+                      action = 'store_true',
+                      default = False,
+                      help = 'compile the C/C++ files of each group as generated unity (jumbo) sources')
+    AddOption('--unity-size',
+                      dest = 'unity-size',
+                      type = 'int',
+                      default = 8,
+                      help = 'most source files in one unity source, default 8')
     AddOption('--stackanalysis',
                 dest = 'stackanalysis',
                 action = 'store_true',
@@ -109,25 +109,50 @@ def xml_indent(elem, level=0):
 source_ext = ["c", "h", "s", "S", "cpp", "xpm"]
 source_list = []
 
-def walk_children(child):
-    global source_list
-    global source_ext
-
-    # print child
-    full_path = child.rfile().abspath
-    file_type_list  = full_path.rsplit('.',1)
-    #print file_type
-    if (len(file_type_list) > 1):
-        file_type = full_path.rsplit('.',1)[1]
+# state of the last WalkChildren() result list, so that walking the items of
+# one target one after another visits a shared node only once
+_walk_result = None
+_walk_ext = None
+_walk_nodes = set()
+_walk_paths = set()
+
+def WalkChildren(child, ext, result):
+    """
+    Append to result the paths of child and of every node it depends on
+    whose extension is in ext, each path once.
 
-        if file_type in source_ext:
-            if full_path not in source_list:
-                source_list.append(full_path)
+    The dependency graph is walked iteratively and every node only once, also
+    over consecutive calls with the same result list and ext.
+    """
+    global _walk_result, _walk_ext, _walk_nodes, _walk_paths
+
+    if _walk_result is not result or _walk_ext != ext:
+        _walk_result = result
+        _walk_ext = list(ext)
+        _walk_nodes = set()
+        _walk_paths = set(result)
+
+    stack = [child]
+    while stack:
+        node = stack.pop()
+        if node in _walk_nodes:
+            continue
+        _walk_nodes.add(node)
+
+        full_path = node.rfile().abspath
+        file_type_list = full_path.rsplit('.', 1)
+        if len(file_type_list) > 1 and file_type_list[1] in ext:
+            if full_path not in _walk_paths:
+                _walk_paths.add(full_path)
+                result.append(full_path)
+
+        # reversed, so children are visited in the order of the recursive walk
+        children = node.all_children()
+        if children:
+            stack.extend(reversed(children))
 
-    children = child.all_children()
-    if children != []:
-        for item in children:
-            walk_children(item)
+def walk_children(child):
+    WalkChildren(child, source_ext, source_list)
 
 def PrefixPath(prefix, path):
     path = os.path.abspath(path)
@@ -162,12 +187,23 @@ def TargetGetList(env, postfix):
 
     target = env['target']
 
+    # lists kept in the project snapshot, walking means scanning every source
+    lists = env.get('target_lists')
+    key = ' '.join(postfix)
+    if lists is not None and key in lists:
+        source_ext = postfix
+        source_list[:] = lists[key]
+        return list(source_list)
+
     source_ext = postfix
     for item in target:
         walk_children(item)
 
     source_list.sort()
 
+    if lists is not None:
+        lists[key] = list(source_list)
+
     return source_list
 
 def ProjectInfo(env):
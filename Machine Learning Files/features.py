@@ -0,0 +1,64 @@
+"""
+Vectorized window features shared by inference, training, rescoring and the
+server-side feature store.
+
+extract_features_batch() returns, per window, the same 30 values as the
+original per-window loop: for each of the 6 axes (ax, ay, az, gx, gy, gz)
+mean, std, min, max and median, in that order.
+"""
+
+import numpy as np
+
+AXES = ['ax', 'ay', 'az', 'gx', 'gy', 'gz']
+STATS = ['mean', 'std', 'min', 'max', 'median']
+FEATURE_NAMES = [f'{axis}_{stat}' for axis in AXES for stat in STATS]
+N_FEATURES = len(FEATURE_NAMES)
+
+# Statistics used by the STM32 threshold rules / server backup classifier
+MAGNITUDE_NAMES = ['mag_mean', 'mag_var', 'mag_max']
+
+
+def extract_features_batch(windows):
+    """(n_windows, window_size, 6) -> (n_windows, 30)"""
+    windows = np.asarray(windows, dtype=np.float64)
+    stats = np.stack([
+        windows.mean(axis=1),
+        windows.std(axis=1),
+        windows.min(axis=1),
+        windows.max(axis=1),
+        np.median(windows, axis=1)
+    ], axis=2)                      # (n, 6 axes, 5 stats)
+    return stats.reshape(len(windows), N_FEATURES)
+
+
+def sliding_windows(samples, window_size, step=1):
+    """Zero-copy (n_windows, window_size, 6) view over an (n_samples, 6) array"""
+    samples = np.asarray(samples)
+    if len(samples) < window_size:
+        return np.empty((0, window_size, samples.shape[1]), dtype=samples.dtype)
+    view = np.lib.stride_tricks.sliding_window_view(samples, window_size, axis=0)
+    # sliding_window_view puts the window axis last: (n, 6, window) -> (n, window, 6)
+    return view[::step].transpose(0, 2, 1)
+
+
+def magnitude_stats_batch(windows):
+    """(n_windows, window_size, >=3) -> (n_windows, 3): mean, variance, max of |a|"""
+    accel = np.asarray(windows, dtype=np.float64)[:, :, :3]
+    magnitudes = np.sqrt((accel * accel).sum(axis=2))
+    return np.stack([magnitudes.mean(axis=1), magnitudes.var(axis=1), magnitudes.max(axis=1)], axis=1)
+
+
+def normalize_features(raw_features, mean, std, eps=1e-8):
+    """Map features of raw windows to features of scaler-normalized windows.
+
+    Normalization is per-axis affine, so mean/min/max/median transform as
+    (f - mean) / (std + eps) and std as f / (std + eps). Stored raw features
+    therefore stay valid when scaler_params.json changes.
+    """
+    raw_features = np.asarray(raw_features, dtype=np.float64)
+    mean = np.asarray(mean, dtype=np.float64)
+    scale = np.asarray(std, dtype=np.float64) + eps
+
+    shift = np.repeat(mean, len(STATS))
+    shift[1::len(STATS)] = 0.0        # std is shift-invariant
+    return (raw_features - shift) / np.repeat(scale, len(STATS))
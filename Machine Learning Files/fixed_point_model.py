@@ -0,0 +1,419 @@
+"""
+Fixed-point export of the lightweight model for the STM32.
+
+The random forest and scaler are turned into integer tables the firmware can
+evaluate on raw ICM20608 samples (int16 LSB, as in activity_frame.h):
+
+  - features are the same 30 window statistics, computed with integer math
+    on raw samples: mean and median are rounded down (floor), std is the
+    integer square root of the integer variance. Rounding down keeps
+    raw_f <= floor(threshold) equal to the float comparison except within
+    one LSB of the threshold
+  - the scaler and the LSB scale are folded into each split threshold, so a
+    split on normalized feature f becomes raw_f <= int16 threshold; splits
+    whose threshold falls outside int16 are constant and pruned away
+  - leaves hold P(running) as 0..255; the forest votes by summing them
+
+Nodes are stored in preorder, so the left child of node i is i + 1 and only
+the right child index is kept.
+
+FixedPointForest.predict() is the reference evaluator: it runs exactly the
+integer math of the generated header, so parity with the float model can be
+checked here before flashing.
+
+    python fixed_point_model.py                         # writes activity_model.h
+    python fixed_point_model.py --check --db activity_recognition.db
+"""
+
+import argparse
+import json
+import os
+import pickle
+import sqlite3
+
+import numpy as np
+
+from features import FEATURE_NAMES, STATS, extract_features_batch
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+HEADER_PATH = os.path.join(HERE, os.pardir, 'IoT_Activity', 'RT-Thread Codes', 'activity_model.h')
+
+# ICM20608 scales, as in wire_protocol.py
+ACCEL_LSB_PER_G = 16384.0
+GYRO_LSB_PER_DPS = 131.0
+LSB_SCALE = np.array([ACCEL_LSB_PER_G] * 3 + [GYRO_LSB_PER_DPS] * 3)
+
+INT16_MIN, INT16_MAX = -32768, 32767
+LEAF = 0xFF
+PROB_ONE = 255
+STD_INDEX = STATS.index('std')
+
+
+def integer_features(raw_windows):
+    """(n, W, 6) int16 raw samples -> (n, 30) int features, the firmware's math"""
+    raw = np.asarray(raw_windows, dtype=np.int64)
+    n, window, _ = raw.shape
+
+    total = raw.sum(axis=1)
+    mean = total // window
+    variance = (window * (raw * raw).sum(axis=1) - total * total) // (window * window)
+    std = np.floor(np.sqrt(variance.astype(np.float64))).astype(np.int64)  # exact below 2**52
+    ordered = np.sort(raw, axis=1)
+    if window % 2:
+        median = ordered[:, window // 2]
+    else:
+        median = (ordered[:, window // 2 - 1] + ordered[:, window // 2]) // 2
+
+    stats = np.stack([mean, std, ordered[:, 0], ordered[:, -1], median], axis=2)  # STATS order
+    return stats.reshape(n, len(FEATURE_NAMES))
+
+
+def raw_thresholds(mean, std, eps=1e-8):
+    """Per feature (scale, shift) so that normalized t maps to raw t * scale + shift"""
+    axis_scale = (np.asarray(std, dtype=np.float64) + eps) * LSB_SCALE
+    axis_shift = np.asarray(mean, dtype=np.float64) * LSB_SCALE
+    scale = np.repeat(axis_scale, len(STATS))
+    shift = np.repeat(axis_shift, len(STATS))
+    shift[STD_INDEX::len(STATS)] = 0.0        # std is shift-invariant
+    return scale, shift
+
+
+class FixedPointForest:
+    """Integer node tables for a binary random forest (1 = running)"""
+
+    def __init__(self, feature, threshold, right, roots, window_size, pruned=0):
+        self.feature = np.asarray(feature, dtype=np.uint8)
+        self.threshold = np.asarray(threshold, dtype=np.int16)
+        self.right = np.asarray(right, dtype=np.uint16)
+        self.roots = np.asarray(roots, dtype=np.uint32)
+        self.window_size = window_size
+        self.pruned = pruned
+
+    @classmethod
+    def from_model(cls, model, mean, std, window_size):
+        scale, shift = raw_thresholds(mean, std)
+        running = list(model.classes_).index(1)
+        feature, threshold, right, roots = [], [], [], []
+        pruned = 0
+
+        def constant_split(tree, node):
+            """Child always taken when the int16 threshold saturates, else None"""
+            j = tree.feature[node]
+            limit = np.floor(tree.threshold[node] * scale[j] + shift[j])
+            if limit >= INT16_MAX:
+                return tree.children_left[node]
+            if limit < INT16_MIN:
+                return tree.children_right[node]
+            return None
+
+        def emit(tree, node, root):
+            nonlocal pruned
+            while tree.children_left[node] != -1:
+                child = constant_split(tree, node)
+                if child is None:
+                    break
+                node, pruned = child, pruned + 1
+
+            index = len(feature)
+            if tree.children_left[node] == -1:
+                counts = tree.value[node][0]
+                feature.append(LEAF)
+                threshold.append(int(round(counts[running] / counts.sum() * PROB_ONE)))
+                right.append(0)
+                return
+
+            j = tree.feature[node]
+            feature.append(int(j))
+            threshold.append(int(np.floor(tree.threshold[node] * scale[j] + shift[j])))
+            right.append(0)
+            emit(tree, tree.children_left[node], root)
+            right[index] = len(feature) - root
+            emit(tree, tree.children_right[node], root)
+
+        for estimator in model.estimators_:
+            roots.append(len(feature))
+            emit(estimator.tree_, 0, roots[-1])
+
+        # model_right is relative to the tree root; model_roots widens in render_header
+        if max(np.diff(roots + [len(feature)])) > 0xFFFF:
+            raise ValueError('Tree too large for uint16 child indices')
+        return cls(feature, threshold, right, roots, window_size, pruned)
+
+    @property
+    def n_trees(self):
+        return len(self.roots)
+
+    def votes(self, int_features):
+        """Sum of leaf P(running) * 255 over trees, per row"""
+        int_features = np.asarray(int_features, dtype=np.int64)
+        rows = np.arange(len(int_features))
+        total = np.zeros(len(int_features), dtype=np.int64)
+        for root in self.roots:
+            node = np.full(len(int_features), root, dtype=np.int64)
+            active = self.feature[node] != LEAF
+            while active.any():
+                current = node[active]
+                go_left = int_features[rows[active], self.feature[current]] <= self.threshold[current]
+                node[active] = np.where(go_left, current + 1, root + self.right[current])
+                active = self.feature[node] != LEAF
+            total += self.threshold[node]
+        return total
+
+    def predict(self, raw_windows):
+        """-> (is_running bool array, confidence 0..255 int array), as the firmware computes them"""
+        votes = self.votes(integer_features(raw_windows))
+        full = PROB_ONE * self.n_trees
+        running = 2 * votes > full
+        confidence = np.where(running, votes, full - votes) // self.n_trees
+        return running, confidence
+
+
+def to_raw(physical):
+    """g / dps samples -> int16 LSB as read from the ICM20608"""
+    return np.clip(np.round(np.asarray(physical) * LSB_SCALE), INT16_MIN, INT16_MAX).astype(np.int16)
+
+
+def float_predict(model, mean, std, raw_windows):
+    """Float model on the same raw samples (converted back to g / dps)"""
+    physical = np.asarray(raw_windows, dtype=np.float64) / LSB_SCALE
+    normalized = (physical - mean) / (std + 1e-8)
+    probabilities = model.predict_proba(extract_features_batch(normalized))
+    return model.classes_[probabilities.argmax(axis=1)] == 1, probabilities.max(axis=1)
+
+
+def _c_array(ctype, name, values, per_line=16):
+    lines = []
+    for i in range(0, len(values), per_line):
+        lines.append('    ' + ', '.join(str(int(v)) for v in values[i:i + per_line]) + ',')
+    return f'static const {ctype} {name}[{len(values)}] =\n{{\n' + '\n'.join(lines) + '\n};\n'
+
+
+def render_header(forest, source=''):
+    # Roots index the concatenated node tables of all trees
+    roots_type = 'rt_uint16_t' if len(forest.feature) <= 0xFFFF else 'rt_uint32_t'
+    feature_comment = '\n'.join(f' *   {i:2d}  {name}' for i, name in enumerate(FEATURE_NAMES))
+    return f'''#ifndef ACTIVITY_MODEL_H__
+#define ACTIVITY_MODEL_H__
+
+#include <rtthread.h>
+#include "activity_frame.h"
+
+/*
+ * GENERATED by Machine Learning Files/fixed_point_model.py - do not edit.
+ * Source: {source}
+ *
+ * Fixed-point random forest on raw ICM20608 samples. The scaler and LSB
+ * scales are folded into the int16 thresholds; leaves are P(running) * 255.
+ * Nodes are in preorder per tree: left child = i + 1, right child =
+ * root + model_right[i]. Features, per axis ax ay az gx gy gz:
+ * mean, std, min, max, median (integer, see activity_model_features).
+ *
+{feature_comment}
+ */
+
+#define ACTIVITY_MODEL_WINDOW       {forest.window_size}
+#define ACTIVITY_MODEL_N_FEATURES   {len(FEATURE_NAMES)}
+#define ACTIVITY_MODEL_N_TREES      {forest.n_trees}
+#define ACTIVITY_MODEL_N_NODES      {len(forest.feature)}
+#define ACTIVITY_MODEL_LEAF         {LEAF}
+#define ACTIVITY_MODEL_PROB_ONE     {PROB_ONE}
+
+{_c_array(roots_type, 'model_roots', forest.roots)}
+{_c_array('rt_uint8_t', 'model_feature', forest.feature)}
+{_c_array('rt_int16_t', 'model_threshold', forest.threshold, 12)}
+{_c_array('rt_uint16_t', 'model_right', forest.right)}
+rt_inline rt_uint32_t model_isqrt(rt_uint64_t v)
+{{
+    rt_uint64_t bit = (rt_uint64_t)1 << 62;
+    rt_uint64_t res = 0;
+
+    while (bit > v) bit >>= 2;
+    while (bit != 0)
+    {{
+        if (v >= res + bit)
+        {{
+            v -= res + bit;
+            res = (res >> 1) + bit;
+        }}
+        else
+        {{
+            res >>= 1;
+        }}
+        bit >>= 2;
+    }}
+    return (rt_uint32_t)res;
+}}
+
+/* Rounds toward minus infinity, unlike C '/' (b > 0) */
+rt_inline rt_int32_t model_floor_div(rt_int32_t a, rt_int32_t b)
+{{
+    rt_int32_t q = a / b;
+
+    if ((a % b) != 0 && a < 0)
+        q--;
+    return q;
+}}
+
+/* out[axis * 5 + stat] for stat = mean, std, min, max, median */
+rt_inline void activity_model_features(const struct frame_sample *samples, rt_int16_t *out)
+{{
+    rt_int16_t sorted[ACTIVITY_MODEL_WINDOW];
+    int axis, i, j;
+
+    for (axis = 0; axis < 6; axis++)
+    {{
+        rt_int32_t sum = 0;
+        rt_int64_t sum_sq = 0;
+        rt_int64_t variance;
+
+        for (i = 0; i < ACTIVITY_MODEL_WINDOW; i++)
+        {{
+            rt_int16_t v = ((const rt_int16_t *)&samples[i])[axis];
+
+            sum += v;
+            sum_sq += (rt_int32_t)v * v;
+
+            /* insertion sort for min / max / median */
+            for (j = i; j > 0 && sorted[j - 1] > v; j--)
+                sorted[j] = sorted[j - 1];
+            sorted[j] = v;
+        }}
+
+        variance = ((rt_int64_t)ACTIVITY_MODEL_WINDOW * sum_sq - (rt_int64_t)sum * sum)
+                   / ((rt_int64_t)ACTIVITY_MODEL_WINDOW * ACTIVITY_MODEL_WINDOW);
+
+        out[axis * 5 + 0] = (rt_int16_t)model_floor_div(sum, ACTIVITY_MODEL_WINDOW);
+        out[axis * 5 + 1] = (rt_int16_t)model_isqrt((rt_uint64_t)variance);
+        out[axis * 5 + 2] = sorted[0];
+        out[axis * 5 + 3] = sorted[ACTIVITY_MODEL_WINDOW - 1];
+#if ACTIVITY_MODEL_WINDOW % 2
+        out[axis * 5 + 4] = sorted[ACTIVITY_MODEL_WINDOW / 2];
+#else
+        out[axis * 5 + 4] = (rt_int16_t)model_floor_div((rt_int32_t)sorted[ACTIVITY_MODEL_WINDOW / 2 - 1]
+                                                        + sorted[ACTIVITY_MODEL_WINDOW / 2], 2);
+#endif
+    }}
+}}
+
+/*
+ * Classify one full window of raw samples.
+ * Returns FRAME_ACT_RUNNING or FRAME_ACT_WALKING; *confidence is 0..255.
+ */
+rt_inline rt_uint8_t activity_model_predict(const struct frame_sample *samples, rt_uint8_t *confidence)
+{{
+    rt_int16_t features[ACTIVITY_MODEL_N_FEATURES];
+    rt_uint32_t votes = 0;
+    rt_uint32_t full = (rt_uint32_t)ACTIVITY_MODEL_PROB_ONE * ACTIVITY_MODEL_N_TREES;
+    rt_bool_t running;
+    int t;
+
+    activity_model_features(samples, features);
+
+    for (t = 0; t < ACTIVITY_MODEL_N_TREES; t++)
+    {{
+        rt_uint32_t root = model_roots[t];
+        rt_uint32_t i = root;
+
+        while (model_feature[i] != ACTIVITY_MODEL_LEAF)
+        {{
+            if (features[model_feature[i]] <= model_threshold[i])
+                i = i + 1;
+            else
+                i = root + model_right[i];
+        }}
+        votes += (rt_uint32_t)model_threshold[i];
+    }}
+
+    running = 2 * votes > full;
+    if (confidence != RT_NULL)
+        *confidence = (rt_uint8_t)((running ? votes : full - votes) / ACTIVITY_MODEL_N_TREES);
+
+    return running ? FRAME_ACT_RUNNING : FRAME_ACT_WALKING;
+}}
+
+#endif /* ACTIVITY_MODEL_H__ */
+'''
+
+
+def load_artifacts(model_path, scaler_path):
+    with open(model_path, 'rb') as f:
+        model = pickle.load(f)
+    with open(scaler_path, 'r') as f:
+        scaler = json.load(f)
+    return model, np.array(scaler['mean']), np.array(scaler['std']), scaler['window_size']
+
+
+def db_windows(db_path, window_size, limit):
+    """Raw int16 windows from stored sensor_data (tumbling, per device)"""
+    conn = sqlite3.connect(db_path)
+    rows = conn.execute('''
+        SELECT device_id, ax, ay, az, COALESCE(gx, 0), COALESCE(gy, 0), COALESCE(gz, 0)
+        FROM sensor_data ORDER BY id
+    ''').fetchall()
+    conn.close()
+
+    per_device = {}
+    for row in rows:
+        per_device.setdefault(row[0], []).append(row[1:])
+    windows = []
+    for samples in per_device.values():
+        n = len(samples) // window_size * window_size
+        if n:
+            windows.append(to_raw(np.array(samples[:n])).reshape(-1, window_size, 6))
+    if not windows:
+        raise SystemExit(f'No device has {window_size} stored samples')
+    return np.concatenate(windows)[:limit]
+
+
+def synthetic_windows(mean, std, window_size, n, seed=0):
+    """Windows around the scaler's distribution with varying spread"""
+    rng = np.random.default_rng(seed)
+    spread = rng.uniform(0.1, 2.0, size=(n, 1, 1))
+    offset = rng.normal(size=(n, 1, 6)) * 0.5
+    physical = mean + (offset + spread * rng.normal(size=(n, window_size, 6))) * std
+    return to_raw(physical)
+
+
+def parity(model, mean, std, forest, raw_windows):
+    float_running, float_conf = float_predict(model, mean, std, raw_windows)
+    fixed_running, fixed_conf = forest.predict(raw_windows)
+    return {
+        'windows': int(len(raw_windows)),
+        'label_agreement': round(float((float_running == fixed_running).mean()), 4),
+        'max_confidence_error': round(float(np.abs(fixed_conf / PROB_ONE - float_conf).max()), 4),
+        'running_rate_float': round(float(float_running.mean()), 4),
+        'running_rate_fixed': round(float(fixed_running.mean()), 4)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Export the model as a fixed-point C header')
+    parser.add_argument('--model', default=os.path.join(HERE, 'lightweight_model.pkl'))
+    parser.add_argument('--scaler', default=os.path.join(HERE, 'scaler_params.json'))
+    parser.add_argument('--output', default=HEADER_PATH)
+    parser.add_argument('--check', action='store_true', help='compare fixed-point and float predictions')
+    parser.add_argument('--db', help='windows for --check from sensor_data (default: synthetic)')
+    parser.add_argument('--windows', type=int, default=5000)
+    args = parser.parse_args()
+
+    model, mean, std, window_size = load_artifacts(args.model, args.scaler)
+    forest = FixedPointForest.from_model(model, mean, std, window_size)
+
+    if args.check:
+        if args.db:
+            raw = db_windows(args.db, window_size, args.windows)
+        else:
+            raw = synthetic_windows(mean, std, window_size, args.windows)
+        print(json.dumps(parity(model, mean, std, forest, raw), indent=2))
+        return
+
+    source = os.path.relpath(os.path.abspath(args.model), os.path.join(HERE, os.pardir))
+    with open(args.output, 'w') as f:
+        f.write(render_header(forest, source))
+    size = len(forest.feature) * 5 + forest.n_trees * 2
+    print(f"✓ Wrote {args.output}: {forest.n_trees} trees, {len(forest.feature)} nodes "
+          f"({forest.pruned} constant splits pruned), ~{size} bytes of tables")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,7 +1,7 @@
 from flask import Flask, request, jsonify, render_template_string
 import json
 import os
-from inference_lightweight import add_and_predict
+from inference_lightweight import add_and_predict, registry, shadow_scorer
 
 app = Flask(__name__)
 log_path = 'sensor_log.txt'
@@ -34,6 +34,17 @@ def receive_data():
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/model', methods=['GET'])
+def model_status():
+    try:
+        return jsonify({
+            'status': 'success',
+            'registry': registry.status(),
+            'shadow': shadow_scorer.stats()
+        }), 200
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
 @app.route('/')
 def view_data():
     data_list = []
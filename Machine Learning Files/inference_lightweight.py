@@ -1,85 +1,68 @@
 """
 Lightweight inference using scikit-learn (no TensorFlow needed!)
+
+The serving model comes from model_registry (models/LIVE, else the bundled
+lightweight_model.pkl) and is hot-swapped when the files change.
 """
 
+import time
 import numpy as np
-import pickle
-import json
-
-# Load model and scaler
-with open('lightweight_model.pkl', 'rb') as f:
-    model = pickle.load(f)
+from features import extract_features_batch
+from model_registry import ModelRegistry, ShadowScorer
 
-with open('scaler_params.json', 'r') as f:
-    scaler_params = json.load(f)
+registry = ModelRegistry()
+shadow_scorer = ShadowScorer(registry)
 
-WINDOW_SIZE = scaler_params['window_size']
-N_FEATURES = scaler_params['n_features']
-MEAN = np.array(scaler_params['mean'])
-STD = np.array(scaler_params['std'])
+# Shape of the model loaded at startup
+WINDOW_SIZE = registry.live().window_size
+N_FEATURES = registry.live().n_features
 
 sensor_buffer = []
 
-def preprocess_data(data_point):
+def preprocess_data(data_point, current=None):
+    current = current or registry.live()
     data_array = np.array(data_point)
-    normalized = (data_array - MEAN) / (STD + 1e-8)
+    normalized = (data_array - current.mean) / (current.std + 1e-8)
     return normalized
 
 def extract_features(window):
-    """Extract statistical features from a window"""
-    window_array = np.array(window)
-    features = []
-    
-    for axis in range(6):
-        axis_data = window_array[:, axis]
-        features.extend([
-            np.mean(axis_data),
-            np.std(axis_data),
-            np.min(axis_data),
-            np.max(axis_data),
-            np.median(axis_data)
-        ])
-    
-    return features
+    """Extract statistical features from a window (see features.py)"""
+    return extract_features_batch(np.asarray(window)[np.newaxis])[0].tolist()
 
 def predict_activity(sensor_data):
-    if len(sensor_data) < WINDOW_SIZE:
+    current = registry.live()
+    if len(sensor_data) < current.window_size:
         return {
-            'error': f'Need {WINDOW_SIZE} samples, got {len(sensor_data)}',
+            'error': f'Need {current.window_size} samples, got {len(sensor_data)}',
             'activity': None,
             'confidence': None
         }
     
-    window = sensor_data[-WINDOW_SIZE:]
-    normalized = [preprocess_data(point) for point in window]
-    features = extract_features(normalized)
-    
-    # Predict
-    prediction = model.predict([features])[0]
-    probabilities = model.predict_proba([features])[0]
+    window = np.asarray(sensor_data[-current.window_size:], dtype=np.float64)
+    start = time.perf_counter()
+    result = current.predict(window)
+    elapsed_ms = (time.perf_counter() - start) * 1000
     
-    activity = "running" if prediction == 1 else "walking"
-    confidence = float(max(probabilities))
+    # Candidate model sees the same window on its own thread
+    if registry.shadow() is not None:
+        shadow_scorer.submit(window, current.version, result, elapsed_ms)
     
-    return {
-        'activity': activity,
-        'confidence': confidence,
-        'probability': float(probabilities[1])
-    }
+    return result
 
 def add_and_predict(data_point):
     global sensor_buffer
     
     sensor_buffer.append(data_point)
     
-    if len(sensor_buffer) > WINDOW_SIZE:
-        sensor_buffer = sensor_buffer[-WINDOW_SIZE:]
+    window_size = registry.live().window_size
+    if len(sensor_buffer) > window_size:
+        sensor_buffer = sensor_buffer[-window_size:]
     
-    if len(sensor_buffer) == WINDOW_SIZE:
+    if len(sensor_buffer) == window_size:
         return predict_activity(sensor_buffer)
     else:
         return {
             'status': 'collecting',
-            'samples_needed': WINDOW_SIZE - len(sensor_buffer),
+            'samples_needed': window_size - len(sensor_buffer),
             'activity': None
         }
@@ -0,0 +1,325 @@
+"""
+Model registry with hot-swap and shadow scoring.
+
+Layout (train.py writes the version directories):
+
+    models/
+        <version>/lightweight_model.pkl, scaler_params.json, manifest.json
+        LIVE        name of the version serving predictions
+        SHADOW      optional candidate scored alongside, never returned
+
+Pointer files are replaced atomically (write + os.replace), and a changed
+pointer or model file is picked up on the next prediction without a restart:
+the new model is loaded completely before it replaces the old one, and a
+failed load keeps the old one serving. With no LIVE pointer, or a LIVE
+version that fails to load before any model was loaded, the bundled
+lightweight_model.pkl / scaler_params.json next to this file are used.
+
+The shadow model runs on a background thread from a bounded queue, so it
+never delays or changes a response; agreement and latency of both models are
+kept in ShadowScorer.stats().
+
+    python model_registry.py --list
+    python model_registry.py --promote 312b0fc071e3
+    python model_registry.py --shadow 312b0fc071e3
+    python model_registry.py --no-shadow
+"""
+
+import argparse
+import json
+import os
+import pickle
+import queue
+import threading
+import time
+from collections import deque
+
+import numpy as np
+
+from features import extract_features_batch
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+MODELS_DIR = os.path.join(HERE, 'models')
+BUNDLED = 'bundled'
+CHECK_INTERVAL = 1.0  # seconds between stat() checks for changed files
+
+MODEL_FILE = 'lightweight_model.pkl'
+SCALER_FILE = 'scaler_params.json'
+
+
+class LoadedModel:
+    """One model version with its scaler"""
+
+    def __init__(self, version, directory):
+        with open(os.path.join(directory, MODEL_FILE), 'rb') as f:
+            self.model = pickle.load(f)
+        with open(os.path.join(directory, SCALER_FILE), 'r') as f:
+            scaler_params = json.load(f)
+
+        self.version = version
+        self.directory = directory
+        self.window_size = scaler_params['window_size']
+        self.n_features = scaler_params['n_features']
+        self.mean = np.array(scaler_params['mean'])
+        self.std = np.array(scaler_params['std'])
+
+    def features(self, window):
+        normalized = (np.asarray(window, dtype=np.float64) - self.mean) / (self.std + 1e-8)
+        return extract_features_batch(normalized[np.newaxis])
+
+    def predict(self, window):
+        probabilities = self.model.predict_proba(self.features(window))[0]
+        prediction = self.model.classes_[probabilities.argmax()]
+        return {
+            'activity': "running" if prediction == 1 else "walking",
+            'confidence': float(max(probabilities)),
+            'probability': float(probabilities[1])
+        }
+
+
+def _write_pointer(path, version):
+    tmp = f'{path}.tmp'
+    with open(tmp, 'w') as f:
+        f.write(version + '\n')
+    os.replace(tmp, path)
+
+
+def _read_pointer(path):
+    try:
+        with open(path, 'r') as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def _stat_key(path):
+    try:
+        st = os.stat(path)
+        return st.st_mtime_ns, st.st_size
+    except FileNotFoundError:
+        return None
+
+
+class ModelRegistry:
+    def __init__(self, root=MODELS_DIR, bundled_dir=HERE, check_interval=CHECK_INTERVAL):
+        self.root = root
+        self.bundled_dir = bundled_dir
+        self.check_interval = check_interval
+        self.reloads = 0
+        self.reload_errors = 0
+        self._lock = threading.Lock()
+        self._slots = {}    # 'LIVE' / 'SHADOW' -> (signature, LoadedModel or None)
+        self._failed = {}   # slot -> signature that failed to load, not retried until it changes
+        self._checked = {}
+
+    def _resolve(self, slot):
+        version = _read_pointer(os.path.join(self.root, slot))
+        if version is None:
+            return (BUNDLED, self.bundled_dir) if slot == 'LIVE' else (None, None)
+        return version, os.path.join(self.root, version)
+
+    def _signature(self, slot, version, directory):
+        if version is None:
+            return (slot, None)
+        return (version, _stat_key(os.path.join(directory, MODEL_FILE)),
+                _stat_key(os.path.join(directory, SCALER_FILE)))
+
+    def _get(self, slot):
+        now = time.monotonic()
+        current = self._slots.get(slot)
+        if current is not None and now - self._checked.get(slot, 0) < self.check_interval:
+            return current[1]
+
+        with self._lock:
+            current = self._slots.get(slot)
+            self._checked[slot] = now
+            version, directory = self._resolve(slot)
+            signature = self._signature(slot, version, directory)
+            if current is not None and signature in (current[0], self._failed.get(slot)):
+                return current[1]
+
+            try:
+                loaded = LoadedModel(version, directory) if version is not None else None
+            except Exception as e:
+                self.reload_errors += 1
+                self._failed[slot] = signature
+                print(f"⚠ Could not load {slot} model {version}: {e}")
+                if current is None and slot == 'LIVE' and version != BUNDLED:
+                    # Nothing serving yet: fall back to the bundled model until the pointer or files change
+                    loaded = LoadedModel(BUNDLED, self.bundled_dir)
+                    self._slots[slot] = (self._signature(slot, BUNDLED, self.bundled_dir), loaded)
+                    print(f"⚠ {slot} model -> {BUNDLED} until {version} loads")
+                    return loaded
+                if current is None and slot == 'LIVE':
+                    raise
+                return current[1] if current else None
+
+            # Single reference swap: in-flight predictions finish on the old model
+            self._slots[slot] = (signature, loaded)
+            if current is not None:
+                self.reloads += 1
+                print(f"✓ {slot} model -> {version}")
+            return loaded
+
+    def live(self):
+        return self._get('LIVE')
+
+    def shadow(self):
+        return self._get('SHADOW')
+
+    def versions(self):
+        if not os.path.isdir(self.root):
+            return []
+        return sorted(name for name in os.listdir(self.root)
+                      if os.path.isfile(os.path.join(self.root, name, 'manifest.json')))
+
+    def manifest(self, version):
+        with open(os.path.join(self.root, version, 'manifest.json'), 'r') as f:
+            return json.load(f)
+
+    def _point(self, slot, version):
+        if version not in self.versions():
+            raise ValueError(f'Unknown model version: {version}')
+        os.makedirs(self.root, exist_ok=True)
+        _write_pointer(os.path.join(self.root, slot), version)
+        self._checked.pop(slot, None)
+
+    def promote(self, version):
+        self._point('LIVE', version)
+
+    def set_shadow(self, version):
+        if version is None:
+            try:
+                os.remove(os.path.join(self.root, 'SHADOW'))
+            except FileNotFoundError:
+                pass
+            self._checked.pop('SHADOW', None)
+        else:
+            self._point('SHADOW', version)
+
+    def status(self):
+        live = self.live()
+        shadow = self.shadow()
+        return {
+            'live': live.version,
+            'shadow': shadow.version if shadow else None,
+            'versions': self.versions(),
+            'reloads': self.reloads,
+            'reload_errors': self.reload_errors
+        }
+
+
+def _percentiles(values):
+    if not values:
+        return {'p50_ms': None, 'p99_ms': None}
+    data = np.array(values)
+    return {'p50_ms': round(float(np.percentile(data, 50)), 3),
+            'p99_ms': round(float(np.percentile(data, 99)), 3)}
+
+
+class ShadowScorer:
+    """Scores windows with the shadow model off the request path"""
+
+    def __init__(self, registry, maxsize=1000, keep=5000):
+        self.registry = registry
+        self._queue = queue.Queue(maxsize=maxsize)
+        self._lock = threading.Lock()
+        self._live_ms = deque(maxlen=keep)
+        self._shadow_ms = deque(maxlen=keep)
+        self._pairs = {}    # (live version, shadow version) -> [scored, agreed]
+        self.dropped = 0
+        self.errors = 0
+        self._thread = None
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, daemon=True, name="ShadowScorer")
+            self._thread.start()
+
+    def submit(self, window, live_version, live_result, live_ms):
+        """Queue a scored window for the shadow model; never blocks"""
+        self.start()
+        try:
+            self._queue.put_nowait((np.array(window, dtype=np.float64), live_version, live_result, live_ms))
+            return True
+        except queue.Full:
+            with self._lock:
+                self.dropped += 1
+            return False
+
+    def _run(self):
+        while True:
+            window, live_version, live_result, live_ms = self._queue.get()
+            try:
+                candidate = self.registry.shadow()
+                if candidate is None:
+                    continue
+                start = time.perf_counter()
+                result = candidate.predict(window[-candidate.window_size:])
+                shadow_ms = (time.perf_counter() - start) * 1000
+
+                with self._lock:
+                    counts = self._pairs.setdefault((live_version, candidate.version), [0, 0])
+                    counts[0] += 1
+                    counts[1] += int(result['activity'] == live_result['activity'])
+                    self._live_ms.append(live_ms)
+                    self._shadow_ms.append(shadow_ms)
+            except Exception as e:
+                with self._lock:
+                    self.errors += 1
+                print(f"⚠ Shadow scoring error: {e}")
+            finally:
+                self._queue.task_done()
+
+    def drain(self):
+        self._queue.join()
+
+    def stats(self):
+        with self._lock:
+            pairs = [{
+                'live': live, 'shadow': shadow, 'scored': scored, 'agreed': agreed,
+                'agreement': round(agreed / scored, 4) if scored else None
+            } for (live, shadow), (scored, agreed) in self._pairs.items()]
+            return {
+                'pairs': pairs,
+                'live_latency': _percentiles(self._live_ms),
+                'shadow_latency': _percentiles(self._shadow_ms),
+                'queue_size': self._queue.qsize(),
+                'dropped': self.dropped,
+                'errors': self.errors
+            }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Manage model versions')
+    parser.add_argument('--root', default=MODELS_DIR)
+    action = parser.add_mutually_exclusive_group(required=True)
+    action.add_argument('--list', action='store_true')
+    action.add_argument('--promote', metavar='VERSION', help='serve VERSION')
+    action.add_argument('--shadow', metavar='VERSION', help='score VERSION in shadow mode')
+    action.add_argument('--no-shadow', action='store_true')
+    args = parser.parse_args()
+
+    registry = ModelRegistry(args.root)
+    if args.promote:
+        registry.promote(args.promote)
+        print(f"✓ LIVE -> {args.promote}")
+    elif args.shadow:
+        registry.set_shadow(args.shadow)
+        print(f"✓ SHADOW -> {args.shadow}")
+    elif args.no_shadow:
+        registry.set_shadow(None)
+        print("✓ Shadow scoring off")
+    else:
+        live = _read_pointer(os.path.join(args.root, 'LIVE')) or BUNDLED
+        shadow = _read_pointer(os.path.join(args.root, 'SHADOW'))
+        for version in registry.versions():
+            manifest = registry.manifest(version)
+            marks = ''.join([' [live]' if version == live else '', ' [shadow]' if version == shadow else ''])
+            print(f"{version}{marks}  windows={manifest.get('n_windows')}  cv={manifest.get('cv', {}).get('accuracy_mean')}")
+        if live == BUNDLED:
+            print(f"{BUNDLED} [live]")
+
+
+if __name__ == '__main__':
+    main()
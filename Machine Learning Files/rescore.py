@@ -0,0 +1,227 @@
+"""
+Offline re-scoring of stored sensor history with the current model.
+
+Streams sensor_data in id order (fetchmany), builds sliding windows per device
+as zero-copy NumPy views, scores each fetched batch in one predict_proba call
+and writes predictions with source='rescore' through executemany.
+
+Progress is checkpointed in the rescore_checkpoints table in the same
+transaction as the predictions, so an interrupted run resumes exactly where
+it stopped. Checkpoints are per device, so devices can be split into any
+number of --shards processes from one run to the next.
+
+Needs the schema from PythonAnywhere Codes/migrations.py (version 5+).
+
+    python rescore.py --db activity_recognition.db --shards 4
+    python rescore.py --db activity_recognition.db --restart    # start over
+"""
+
+import argparse
+import json
+import os
+import pickle
+import sqlite3
+import time
+from multiprocessing import Pool
+
+import numpy as np
+
+from features import extract_features_batch, sliding_windows
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+FETCH_SIZE = 20000
+SOURCE = 'rescore'
+
+CHECKPOINT_TABLE = '''
+    CREATE TABLE IF NOT EXISTS rescore_checkpoints (
+        device_id TEXT PRIMARY KEY,
+        last_id INTEGER NOT NULL,
+        state TEXT NOT NULL,
+        updated DATETIME DEFAULT CURRENT_TIMESTAMP
+    )
+'''
+
+
+def load_artifacts(model_path, scaler_path):
+    with open(model_path, 'rb') as f:
+        model = pickle.load(f)
+    with open(scaler_path, 'r') as f:
+        scaler = json.load(f)
+    return model, np.array(scaler['mean']), np.array(scaler['std']), scaler['window_size']
+
+
+def connect(db_path):
+    conn = sqlite3.connect(db_path, timeout=60.0)
+    conn.execute('PRAGMA journal_mode=WAL')
+    return conn
+
+
+def check_schema(conn):
+    columns = {col[1] for col in conn.execute('PRAGMA table_info(predictions)')}
+    if 'window_end_id' not in columns:
+        raise SystemExit('predictions.window_end_id missing - run PythonAnywhere Codes/migrations.py first')
+    conn.execute(CHECKPOINT_TABLE)
+    conn.commit()
+
+
+def load_checkpoints(conn, devices):
+    """device -> (last_id, stream state); devices never rescored start at 0"""
+    placeholders = ', '.join('?' * len(devices))
+    rows = conn.execute(f'SELECT device_id, last_id, state FROM rescore_checkpoints WHERE device_id IN ({placeholders})',
+                        list(devices)).fetchall()
+    found = {device: (last_id, json.loads(state)) for device, last_id, state in rows}
+    return {device: found.get(device, (0, {})) for device in devices}
+
+
+class DeviceStream:
+    """Carries the last window_size-1 samples of a device across fetched batches"""
+
+    def __init__(self, state=None):
+        state = state or {}
+        self.n_seen = state.get('n_seen', 0)
+        self.tail_ids = state.get('tail_ids', [])
+        self.tail_ts = state.get('tail_ts', [])
+        self.tail = state.get('tail', [])
+
+    def to_state(self):
+        return {'n_seen': self.n_seen, 'tail_ids': self.tail_ids, 'tail_ts': self.tail_ts, 'tail': self.tail}
+
+    def extend(self, ids, timestamps, samples, window_size, step):
+        """Append samples; return (windows view, end ids, end timestamps) due for scoring"""
+        all_ids = self.tail_ids + ids
+        all_ts = self.tail_ts + timestamps
+        all_samples = np.vstack([np.array(self.tail, dtype=np.float64).reshape(-1, 6), samples])
+
+        base = self.n_seen - len(self.tail)   # global index of all_samples[0]
+        self.n_seen += len(ids)
+
+        keep = window_size - 1
+        self.tail_ids = all_ids[-keep:] if keep else []
+        self.tail_ts = all_ts[-keep:] if keep else []
+        self.tail = all_samples[-keep:].tolist() if keep else []
+
+        windows = sliding_windows(all_samples, window_size)
+        first = (-base) % step
+        windows = windows[first::step]
+        ends = range(first + window_size - 1, len(all_samples), step)
+        return windows, [all_ids[e] for e in ends], [all_ts[e] for e in ends]
+
+
+def score_shard(db_path, shard, devices, model_path, scaler_path, step, fetch_size):
+    model, mean, std, window_size = load_artifacts(model_path, scaler_path)
+    if hasattr(model, 'n_jobs'):
+        model.n_jobs = 1          # parallelism comes from the shards
+    conn = connect(db_path)
+    checkpoints = load_checkpoints(conn, devices)
+    last_ids = {device: last_id for device, (last_id, _) in checkpoints.items()}
+    streams = {device: DeviceStream(state) for device, (_, state) in checkpoints.items()}
+
+    # Separate reader: an open SELECT on the writing connection would pin its
+    # snapshot and fail to upgrade once another shard has committed
+    reader = connect(db_path)
+    placeholders = ', '.join('?' * len(devices))
+    read = reader.cursor()
+    read.execute(f'''
+        SELECT id, device_id, timestamp, ax, ay, az, COALESCE(gx, 0), COALESCE(gy, 0), COALESCE(gz, 0)
+        FROM sensor_data
+        WHERE id > ? AND device_id IN ({placeholders})
+        ORDER BY id
+    ''', [min(last_ids.values())] + list(devices))
+
+    written = 0
+    started = time.perf_counter()
+    while True:
+        batch = read.fetchmany(fetch_size)
+        if not batch:
+            break
+
+        by_device = {}
+        for row in batch:
+            if row[0] > last_ids[row[1]]:
+                by_device.setdefault(row[1], []).append(row)
+
+        feature_blocks = []
+        meta = []
+        for device, rows in by_device.items():
+            samples = (np.array([row[3:] for row in rows], dtype=np.float64) - mean) / (std + 1e-8)
+            windows, end_ids, end_ts = streams[device].extend(
+                [row[0] for row in rows], [row[2] for row in rows], samples, window_size, step)
+            if len(windows):
+                feature_blocks.append(extract_features_batch(windows))
+                meta.extend((device, end_id, ts) for end_id, ts in zip(end_ids, end_ts))
+
+        output = []
+        if feature_blocks:
+            probabilities = model.predict_proba(np.vstack(feature_blocks))
+            # Same argmax as model.predict, so ties resolve like the live path
+            predicted = model.classes_[probabilities.argmax(axis=1)]
+            labels = np.where(predicted == 1, 'Running', 'Walking')
+            confidences = probabilities.max(axis=1)
+            output = [(str(label), float(conf), SOURCE, ts, device, end_id)
+                      for (device, end_id, ts), label, conf in zip(meta, labels, confidences)]
+
+        progress = []
+        for device, rows in by_device.items():
+            last_ids[device] = rows[-1][0]
+            progress.append((device, last_ids[device], json.dumps(streams[device].to_state())))
+
+        # Predictions and checkpoint commit together
+        write = conn.cursor()
+        write.executemany('''
+            INSERT INTO predictions (activity, confidence, source, timestamp, device_id, window_end_id)
+            VALUES (?, ?, ?, ?, ?, ?)
+        ''', output)
+        write.executemany('''
+            INSERT OR REPLACE INTO rescore_checkpoints (device_id, last_id, state, updated)
+            VALUES (?, ?, ?, CURRENT_TIMESTAMP)
+        ''', progress)
+        conn.commit()
+        written += len(output)
+
+    reader.close()
+    conn.close()
+    return {'shard': shard, 'devices': len(devices), 'predictions': written,
+            'last_id': max(last_ids.values()), 'seconds': round(time.perf_counter() - started, 2)}
+
+
+def _score_shard(job):
+    return score_shard(*job)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Re-run the model over stored sensor_data')
+    parser.add_argument('--db', required=True)
+    parser.add_argument('--model', default=os.path.join(HERE, 'lightweight_model.pkl'))
+    parser.add_argument('--scaler', default=os.path.join(HERE, 'scaler_params.json'))
+    parser.add_argument('--step', type=int, default=1, help='samples between scored windows (1 = every sample, like live)')
+    parser.add_argument('--shards', type=int, default=1, help='worker processes, devices are split between them')
+    parser.add_argument('--fetch-size', type=int, default=FETCH_SIZE)
+    parser.add_argument('--restart', action='store_true', help="drop checkpoints and earlier source='rescore' rows")
+    args = parser.parse_args()
+
+    conn = connect(args.db)
+    check_schema(conn)
+    if args.restart:
+        conn.execute('DELETE FROM rescore_checkpoints')
+        conn.execute('DELETE FROM predictions WHERE source = ?', (SOURCE,))
+        conn.commit()
+    devices = [row[0] for row in conn.execute('SELECT DISTINCT device_id FROM sensor_data ORDER BY device_id')]
+    conn.close()
+
+    n_shards = max(1, min(args.shards, len(devices)))
+    jobs = [(args.db, f'{k}/{n_shards}', devices[k::n_shards], args.model, args.scaler, args.step, args.fetch_size)
+            for k in range(n_shards)]
+
+    if n_shards == 1:
+        results = [_score_shard(jobs[0])] if devices else []
+    else:
+        with Pool(n_shards) as pool:
+            results = pool.map(_score_shard, jobs)
+
+    for result in results:
+        print(json.dumps(result))
+    print(f"✓ Rescored {sum(r['predictions'] for r in results)} windows")
+
+
+if __name__ == '__main__':
+    main()
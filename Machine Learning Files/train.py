@@ -0,0 +1,284 @@
+"""
+Rebuild lightweight_model.pkl and scaler_params.json from recorded data.
+
+Labeled samples come from either
+  - the SQLite store: each sensor_data row takes the activity of the latest
+    source='device' prediction at or before its timestamp, or
+  - NDJSON files: one object per line with ax, ay, az (gx, gy, gz optional),
+    activity and device_id - /api/upload payloads or structured log lines.
+
+Only walking / running samples are used (the model is binary, 1 = running).
+Windows never span two labels or two devices. Features go through the same
+path as inference: scaler normalization, then features.extract_features_batch.
+
+Every run writes models/<version>/ with the model, the scaler and a
+manifest.json (features, window size, cross-validation metrics, training data
+hash, inference latency). The version is derived from the data hash and the
+parameters, so the same data and options always give the same version and
+the same model. --install also copies the artifacts to where
+inference_lightweight.py loads them.
+
+    python train.py --db activity_recognition.db --install
+    python train.py --ndjson session1.ndjson session2.ndjson --folds 5
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import pickle
+import shutil
+import sqlite3
+import time
+
+import numpy as np
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.metrics import accuracy_score, f1_score
+from sklearn.model_selection import StratifiedGroupKFold
+
+from features import FEATURE_NAMES, extract_features_batch, sliding_windows
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+MODELS_DIR = os.path.join(HERE, 'models')
+
+WINDOW_SIZE = 50  # Matches STM32
+STEP = 25
+LABELS = {'walking': 0, 'running': 1}
+SENSOR_NAMES = ['acceleration_x', 'acceleration_y', 'acceleration_z', 'gyro_x', 'gyro_y', 'gyro_z']
+
+# Hyperparameters of the shipped model
+MODEL_PARAMS = {'n_estimators': 50, 'max_depth': 10, 'random_state': 42, 'n_jobs': -1}
+
+
+def load_sqlite(db_path):
+    """device -> (samples (n, 6), labels (n,)) in id order"""
+    conn = sqlite3.connect(db_path)
+    predictions = conn.execute('''
+        SELECT timestamp, LOWER(activity) FROM predictions
+        WHERE source = 'device' AND timestamp IS NOT NULL
+        ORDER BY timestamp
+    ''').fetchall()
+    rows = conn.execute('''
+        SELECT device_id, timestamp, ax, ay, az, COALESCE(gx, 0), COALESCE(gy, 0), COALESCE(gz, 0)
+        FROM sensor_data
+        ORDER BY id
+    ''').fetchall()
+    conn.close()
+
+    if not predictions:
+        return {}
+    label_times = np.array([p[0] for p in predictions])
+    label_names = [p[1] for p in predictions]
+
+    # Timestamps are ISO strings, so lexical order is time order
+    positions = np.searchsorted(label_times, np.array([r[1] for r in rows]), side='right') - 1
+    per_device = {}
+    for row, pos in zip(rows, positions):
+        per_device.setdefault(row[0] or 'default', []).append((row[2:], label_names[pos] if pos >= 0 else None))
+    return {device: _as_arrays(items) for device, items in per_device.items()}
+
+
+def load_ndjson(paths):
+    per_device = {}
+    for path in paths:
+        with open(path, 'r') as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                entry = json.loads(line)
+                if 'ax' not in entry or 'activity' not in entry:
+                    continue
+                sample = tuple(float(entry.get(axis) or 0.0) for axis in ('ax', 'ay', 'az', 'gx', 'gy', 'gz'))
+                label = str(entry['activity']).lower()
+                per_device.setdefault(str(entry.get('device_id', 'default')), []).append((sample, label))
+    return {device: _as_arrays(items) for device, items in per_device.items()}
+
+
+def _as_arrays(items):
+    samples = np.array([s for s, _ in items], dtype=np.float64).reshape(-1, 6)
+    labels = np.array([LABELS.get(label, -1) for _, label in items], dtype=np.int64)
+    return samples, labels
+
+
+def data_hash(data):
+    digest = hashlib.sha256()
+    for device in sorted(data):
+        samples, labels = data[device]
+        digest.update(device.encode())
+        digest.update(np.ascontiguousarray(samples).tobytes())
+        digest.update(labels.tobytes())
+    return digest.hexdigest()
+
+
+def labeled_runs(labels):
+    """(start, end) of each run of one usable label"""
+    if len(labels) == 0:
+        return []
+    boundaries = np.flatnonzero(np.diff(labels)) + 1
+    starts = np.concatenate([[0], boundaries])
+    ends = np.concatenate([boundaries, [len(labels)]])
+    return [(s, e) for s, e in zip(starts, ends) if labels[s] >= 0]
+
+
+def build_dataset(data, mean, std, window_size, step):
+    """Normalized-window features, labels and CV groups (one group per labeled run)"""
+    features, targets, groups = [], [], []
+    for device in sorted(data):
+        samples, labels = data[device]
+        normalized = (samples - mean) / (std + 1e-8)
+        for start, end in labeled_runs(labels):
+            windows = sliding_windows(normalized[start:end], window_size, step)
+            if len(windows) == 0:
+                continue
+            features.append(extract_features_batch(windows))
+            targets.append(np.full(len(windows), labels[start]))
+            groups.append(np.full(len(windows), len(groups)))
+    if not features:
+        raise SystemExit(f'No labeled walking/running run of {window_size}+ samples found')
+    return np.vstack(features), np.concatenate(targets), np.concatenate(groups)
+
+
+def fit_scaler(data):
+    usable = [samples[labels >= 0] for samples, labels in data.values()]
+    if not sum(len(samples) for samples in usable):
+        raise SystemExit('No labeled walking/running samples found')
+    samples = np.vstack(usable)
+    return samples.mean(axis=0), samples.std(axis=0)
+
+
+def cross_validate(X, y, groups, folds, seed):
+    """Grouped folds so overlapping windows of one run never straddle train/test"""
+    n_splits = min(folds, len(np.unique(groups)))
+    if n_splits < 2:
+        return {'folds': 0}
+
+    accuracy, f1 = [], []
+    splitter = StratifiedGroupKFold(n_splits=n_splits, shuffle=True, random_state=seed)
+    for train_idx, test_idx in splitter.split(X, y, groups):
+        model = RandomForestClassifier(**MODEL_PARAMS).fit(X[train_idx], y[train_idx])
+        predicted = model.predict(X[test_idx])
+        accuracy.append(accuracy_score(y[test_idx], predicted))
+        f1.append(f1_score(y[test_idx], predicted, average='macro', zero_division=0))
+
+    return {
+        'folds': n_splits,
+        'accuracy_mean': round(float(np.mean(accuracy)), 4),
+        'accuracy_std': round(float(np.std(accuracy)), 4),
+        'f1_macro_mean': round(float(np.mean(f1)), 4),
+        'f1_macro_std': round(float(np.std(f1)), 4)
+    }
+
+
+def measure_latency(model, X, repeats=200):
+    """Single-window latency (the live path) and batched per-window cost, in ms"""
+    model.n_jobs = 1
+    single = []
+    for i in range(repeats):
+        row = X[i % len(X)][np.newaxis]
+        start = time.perf_counter()
+        model.predict_proba(row)
+        single.append((time.perf_counter() - start) * 1000)
+
+    start = time.perf_counter()
+    model.predict_proba(X)
+    batch = (time.perf_counter() - start) * 1000 / len(X)
+    model.n_jobs = MODEL_PARAMS['n_jobs']
+
+    single = np.array(single)
+    return {
+        'single_p50_ms': round(float(np.percentile(single, 50)), 3),
+        'single_p99_ms': round(float(np.percentile(single, 99)), 3),
+        'batch_per_window_ms': round(batch, 4),
+        'batch_size': len(X)
+    }
+
+
+def train(data, window_size=WINDOW_SIZE, step=STEP, folds=5, source=None):
+    """Train on `data` and return (model, scaler_params, manifest)"""
+    mean, std = fit_scaler(data)
+    X, y, groups = build_dataset(data, mean, std, window_size, step)
+
+    metrics = cross_validate(X, y, groups, folds, MODEL_PARAMS['random_state'])
+    model = RandomForestClassifier(**MODEL_PARAMS).fit(X, y)
+
+    scaler_params = {
+        'mean': mean.tolist(),
+        'std': std.tolist(),
+        'window_size': window_size,
+        'n_features': len(SENSOR_NAMES),
+        'feature_names': SENSOR_NAMES
+    }
+
+    digest = data_hash(data)
+    params = {'window_size': window_size, 'step': step, 'folds': folds, 'model': MODEL_PARAMS}
+    version = hashlib.sha256((digest + json.dumps(params, sort_keys=True)).encode()).hexdigest()[:12]
+
+    manifest = {
+        'version': version,
+        'source': source,
+        'training_data_sha256': digest,
+        'window_size': window_size,
+        'step': step,
+        'sensor_names': SENSOR_NAMES,
+        'features': FEATURE_NAMES,
+        'classes': {name: code for name, code in LABELS.items()},
+        'n_windows': int(len(y)),
+        'class_counts': {name: int((y == code).sum()) for name, code in LABELS.items()},
+        'model': 'RandomForestClassifier',
+        'model_params': MODEL_PARAMS,
+        'cv': metrics,
+        'latency': measure_latency(model, X)
+    }
+    return model, scaler_params, manifest
+
+
+def save(model, scaler_params, manifest, models_dir=MODELS_DIR):
+    out_dir = os.path.join(models_dir, manifest['version'])
+    os.makedirs(out_dir, exist_ok=True)
+    with open(os.path.join(out_dir, 'lightweight_model.pkl'), 'wb') as f:
+        pickle.dump(model, f)
+    with open(os.path.join(out_dir, 'scaler_params.json'), 'w') as f:
+        json.dump(scaler_params, f, indent=2)
+    with open(os.path.join(out_dir, 'manifest.json'), 'w') as f:
+        json.dump(manifest, f, indent=2)
+    return out_dir
+
+
+def install(out_dir, target_dir=HERE):
+    for name in ('lightweight_model.pkl', 'scaler_params.json'):
+        shutil.copyfile(os.path.join(out_dir, name), os.path.join(target_dir, name))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Train the lightweight activity model')
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument('--db', help='SQLite store (labels from device predictions)')
+    source.add_argument('--ndjson', nargs='+', help='NDJSON sample files')
+    parser.add_argument('--window', type=int, default=WINDOW_SIZE)
+    parser.add_argument('--step', type=int, default=STEP, help='samples between training windows')
+    parser.add_argument('--folds', type=int, default=5)
+    parser.add_argument('--models-dir', default=MODELS_DIR)
+    parser.add_argument('--install', action='store_true', help='copy the artifacts next to inference_lightweight.py')
+    args = parser.parse_args()
+
+    if args.db:
+        data, source_name = load_sqlite(args.db), os.path.basename(args.db)
+    else:
+        data, source_name = load_ndjson(args.ndjson), [os.path.basename(p) for p in args.ndjson]
+
+    model, scaler_params, manifest = train(data, args.window, args.step, args.folds, source_name)
+    out_dir = save(model, scaler_params, manifest, args.models_dir)
+
+    print(f"✓ Model {manifest['version']}: {manifest['n_windows']} windows {manifest['class_counts']}")
+    print(f"  CV: {manifest['cv']}")
+    print(f"  Latency: {manifest['latency']}")
+    print(f"  Saved to {out_dir}")
+
+    if args.install:
+        install(out_dir)
+        print(f"✓ Installed to {HERE}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,200 @@
+"""
+ASGI front end for ingestion and realtime polling.
+
+Same storage layer and ingest pipeline as flask_app_complete.py, but one event
+loop serves every open board connection instead of one OS thread each. Handlers
+only parse and enqueue; the write-behind writer owns all database writes.
+
+Run with any ASGI server, e.g.:
+    uvicorn asgi_app:app --host 0.0.0.0 --port 8000
+"""
+
+import asyncio
+import json
+import time
+from datetime import datetime, timezone
+
+from feature_store import WindowAccumulator
+from ingest import SequenceTracker, parse_json_sample, frames_to_rows
+from metrics import REGISTRY, CONTENT_TYPE, http_request_seconds
+from segments import SegmentTracker
+from storage import get_db_connection, init_db, fetch_latest_prediction
+from wire_protocol import iter_frames, FrameError
+from write_behind import WriteBehindWriter
+
+sequence_tracker = SequenceTracker()
+writer = WriteBehindWriter(tracker=sequence_tracker, accumulator=WindowAccumulator(), segments=SegmentTracker())
+
+REGISTRY.gauge('write_behind_queue_size', 'Batches waiting for the write-behind writer',
+               lambda: writer.stats()['queue_size'])
+REGISTRY.gauge('write_behind_rows_dropped', 'Rows dropped because the queue was full',
+               lambda: writer.rows_dropped)
+
+
+async def read_body(receive):
+    chunks = []
+    more = True
+    while more:
+        message = await receive()
+        chunks.append(message.get('body', b''))
+        more = message.get('more_body', False)
+    return b''.join(chunks)
+
+
+async def send_body(send, status, body, content_type=b'application/json'):
+    await send({
+        'type': 'http.response.start',
+        'status': status,
+        'headers': [(b'content-type', content_type),
+                    (b'content-length', str(len(body)).encode('ascii'))]
+    })
+    await send({'type': 'http.response.body', 'body': body})
+
+
+async def send_json(send, status, payload):
+    await send_body(send, status, json.dumps(payload).encode('utf-8'))
+
+
+def _read_latest_prediction():
+    conn = get_db_connection()
+    try:
+        return fetch_latest_prediction(conn.cursor())
+    finally:
+        conn.close()
+
+
+# Handlers
+async def upload_sensor_data(body):
+    try:
+        data = json.loads(body)
+    except ValueError:
+        return 400, {'status': 'error', 'message': 'Invalid JSON format'}
+
+    if not isinstance(data, dict) or 'ax' not in data:
+        return 400, {'status': 'error', 'message': 'Invalid data format'}
+
+    try:
+        sensor_row, prediction_row = parse_json_sample(data, datetime.now(timezone.utc))
+    except (KeyError, TypeError, ValueError):
+        return 400, {'status': 'error', 'message': 'Invalid data format'}
+    device_id, seq = sensor_row[4], sensor_row[5]
+
+    if seq is not None and not sequence_tracker.accept(device_id, seq):
+        return 200, {'status': 'duplicate', 'message': 'Already received', 'seq': seq}
+
+    # All or nothing - the writer hands the seq back if it cannot queue it
+    if not writer.submit({device_id: [sensor_row]}, [prediction_row]):
+        return 503, {'status': 'error', 'message': 'Ingest queue full'}
+
+    return 200, {
+        'status': 'success',
+        'message': 'Data received',
+        'activity_detected': prediction_row[0],
+        'magnitude': round(sensor_row[3], 3)
+    }
+
+
+async def upload_sensor_frames(body):
+    if not body:
+        return 400, {'status': 'error', 'message': 'Empty body'}
+
+    try:
+        frames = list(iter_frames(body))
+    except FrameError as e:
+        return 400, {'status': 'error', 'message': str(e)}
+
+    sensor_rows, prediction_rows = frames_to_rows(frames, sequence_tracker, datetime.now(timezone.utc))
+
+    # One queue item for every device in the body, so a 503 leaves none queued
+    if not writer.submit(sensor_rows, prediction_rows):
+        return 503, {'status': 'error', 'message': 'Ingest queue full'}
+    queued = sum(len(rows) for rows in sensor_rows.values())
+
+    return 200, {
+        'status': 'success',
+        'frames': len(frames),
+        'samples': queued,
+        'duplicates': sum(h.count for h, _ in frames) - queued
+    }
+
+
+async def get_realtime_prediction(body):
+    latest = writer.latest_prediction
+    if latest is not None:
+        activity, confidence, source, timestamp = latest[:4]
+    else:
+        # Nothing ingested by this process yet - read from the database off the loop
+        row = await asyncio.get_running_loop().run_in_executor(None, _read_latest_prediction)
+        if row is None:
+            return 200, {
+                'status': 'no_data',
+                'activity': 'Waiting for data...',
+                'confidence': 0,
+                'source': 'none',
+                'timestamp': datetime.now(timezone.utc).isoformat()
+            }
+        activity, confidence, source, timestamp = row['activity'], row['confidence'], row['source'], row['timestamp']
+
+    return 200, {
+        'status': 'success',
+        'activity': activity,
+        'confidence': float(confidence) if confidence else 0,
+        'source': source,
+        'timestamp': timestamp
+    }
+
+
+async def ingest_stats(body):
+    return 200, {
+        'status': 'success',
+        'devices': sequence_tracker.stats(),
+        'writer': writer.stats()
+    }
+
+
+ROUTES = {
+    ('POST', '/api/upload'): upload_sensor_data,
+    ('POST', '/api/upload/binary'): upload_sensor_frames,
+    ('GET', '/api/realtime'): get_realtime_prediction,
+    ('GET', '/api/ingest/stats'): ingest_stats
+}
+
+
+async def lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            init_db(sequence_tracker)
+            writer.start()
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            writer.stop()
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+
+async def app(scope, receive, send):
+    if scope['type'] == 'lifespan':
+        await lifespan(receive, send)
+        return
+
+    if scope['type'] != 'http':
+        return
+
+    if scope['path'] == '/metrics':
+        await send_body(send, 200, REGISTRY.render().encode('utf-8'), CONTENT_TYPE.encode('ascii'))
+        return
+
+    handler = ROUTES.get((scope['method'], scope['path']))
+    if handler is None:
+        await send_json(send, 404, {'status': 'error', 'message': 'Not found'})
+        return
+
+    started = time.perf_counter()
+    body = await read_body(receive)
+    try:
+        status, payload = await handler(body)
+    except Exception as e:
+        status, payload = 500, {'status': 'error', 'message': str(e)}
+    await send_json(send, status, payload)
+    http_request_seconds.observe(time.perf_counter() - started, scope['method'], scope['path'], status)
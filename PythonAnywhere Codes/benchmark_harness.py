@@ -0,0 +1,168 @@
+"""
+Offline end-to-end benchmark for flask_app_complete.py.
+
+Starts the app in a subprocess against a throwaway database, drives it with
+N simulated boards and M dashboard pollers (load_generator.py), and writes a
+JSON report with ingest throughput, per-endpoint latency percentiles and
+database growth. Pass --baseline with an earlier report to print the deltas.
+
+    python benchmark_harness.py --devices 20 --rate 10 --pollers 5 --duration 30 --output bench.json
+    python benchmark_harness.py ... --baseline bench.json
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import socket
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+from load_generator import run_load
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+POLL_PATHS = ('/api/realtime', '/api/stats', '/api/history?hours=1&limit=100')
+SERVER_CMD = "import flask_app_complete as m; m.start_worker(); m.app.run(host='127.0.0.1', port={port}, threaded=True)"
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def wait_for_port(port, timeout=15.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            with socket.create_connection(('127.0.0.1', port), timeout=0.5):
+                return True
+        except OSError:
+            time.sleep(0.1)
+    return False
+
+
+def database_stats(db_path):
+    # Pages in use as of the latest commit, WAL included. The -wal file size is
+    # only its high-water mark, so the file sizes don't show how much the data grew.
+    files = sum(os.path.getsize(p) for p in (db_path, db_path + '-wal') if os.path.exists(p))
+    conn = sqlite3.connect(db_path)
+    try:
+        page_size = conn.execute('PRAGMA page_size').fetchone()[0]
+        pages = conn.execute('PRAGMA page_count').fetchone()[0] - conn.execute('PRAGMA freelist_count').fetchone()[0]
+        sensor_rows = conn.execute('SELECT COUNT(*) FROM sensor_data').fetchone()[0]
+        prediction_rows = conn.execute('SELECT COUNT(*) FROM predictions').fetchone()[0]
+    finally:
+        conn.close()
+    return {'bytes': pages * page_size, 'file_bytes': files,
+            'sensor_rows': sensor_rows, 'prediction_rows': prediction_rows}
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=HERE,
+                                       stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def run_benchmark(args):
+    workdir = tempfile.mkdtemp(prefix='activity_bench_')
+    db_path = os.path.join(workdir, 'activity_recognition.db')
+    port = args.port or free_port()
+
+    env = dict(os.environ, ACTIVITY_DB_PATH=db_path)
+    log = open(os.path.join(workdir, 'server.log'), 'w')
+    server = subprocess.Popen([sys.executable, '-c', SERVER_CMD.format(port=port)],
+                              cwd=HERE, env=env, stdout=log, stderr=subprocess.STDOUT)
+    try:
+        if not wait_for_port(port):
+            raise RuntimeError(f'Server did not start, see {log.name}')
+
+        before = database_stats(db_path)
+        load = asyncio.run(run_load('127.0.0.1', port, args.devices, args.duration, args.mode, args.rate,
+                                    args.frame_size, pollers=args.pollers, poll_paths=POLL_PATHS,
+                                    poll_interval=args.poll_interval))
+        after = database_stats(db_path)
+    finally:
+        server.terminate()
+        server.wait(timeout=10)
+        log.close()
+
+    elapsed = load['elapsed_s']
+    grown = after['bytes'] - before['bytes']
+    return {
+        'version': git_revision(),
+        'timestamp': datetime.now(timezone.utc).isoformat(),
+        'python': platform.python_version(),
+        'config': {
+            'devices': args.devices,
+            'rate_per_device': args.rate,
+            'mode': args.mode,
+            'frame_size': args.frame_size,
+            'pollers': args.pollers,
+            'poll_interval_s': args.poll_interval,
+            'duration_s': args.duration
+        },
+        'ingest': {
+            'samples': load['samples'],
+            'samples_per_s': round(load['samples'] / elapsed, 1),
+            'requests_per_s': load['requests_per_s'],
+            'errors': load['errors'],
+            'connections': load['connections']
+        },
+        'endpoints': load['endpoints'],
+        'database': {
+            'before': before,
+            'after': after,
+            'bytes_per_s': round(grown / elapsed, 1),
+            'bytes_per_sample': round(grown / max(1, after['sensor_rows'] - before['sensor_rows']), 1)
+        }
+    }
+
+
+def compare(report, baseline):
+    """Print p95 and throughput changes against an earlier report"""
+    def delta(new, old):
+        return f"{new:>10} ({(new - old) / old * 100:+.1f}%)" if old else f"{new:>10}"
+
+    print(f"Compared with {baseline.get('version')} ({baseline.get('timestamp')})")
+    print(f"  ingest samples/s {delta(report['ingest']['samples_per_s'], baseline['ingest']['samples_per_s'])}")
+    for path, stats in report['endpoints'].items():
+        old = baseline['endpoints'].get(path, {}).get('p95', 0)
+        print(f"  p95 {path:<40} {delta(stats['p95'], old)}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='End-to-end benchmark for flask_app_complete')
+    parser.add_argument('--devices', type=int, default=10)
+    parser.add_argument('--rate', type=float, default=10.0, help='uploads/s per device (0 = unthrottled)')
+    parser.add_argument('--mode', choices=['json', 'binary'], default='json')
+    parser.add_argument('--frame-size', type=int, default=50)
+    parser.add_argument('--pollers', type=int, default=3, help='dashboard tabs')
+    parser.add_argument('--poll-interval', type=float, default=2.0)
+    parser.add_argument('--duration', type=float, default=20.0)
+    parser.add_argument('--port', type=int, default=0)
+    parser.add_argument('--output', help='write the JSON report here')
+    parser.add_argument('--baseline', help='earlier JSON report to compare against')
+    args = parser.parse_args()
+
+    report = run_benchmark(args)
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text + "\n")
+    print(text)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            compare(report, json.load(f))
+
+
+if __name__ == '__main__':
+    main()
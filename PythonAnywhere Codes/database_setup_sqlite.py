@@ -1,51 +1,23 @@
 import sqlite3
 from datetime import datetime
+from migrations import migrate, current_version
 
 # Database file path
 DB_PATH = '/home/cathlynramo/iot/activity_recognition.db'
 
 def setup_database():
-    """Create database tables"""
+    """Create database tables (or upgrade an existing database)"""
+    # Same versioned migrations flask_app_complete runs at startup,
+    # so both paths end up with an identical schema
+    migrate(DB_PATH)
+
     conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    
-    # Create predictions table
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS predictions (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            activity TEXT NOT NULL,
-            confidence REAL,
-            timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
-        )
-    ''')
-    
-    # Create sensor_data table
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS sensor_data (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            ax REAL,
-            ay REAL,
-            az REAL,
-            timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
-        )
-    ''')
-    
-    # Create indexes for faster queries
-    cursor.execute('''
-        CREATE INDEX IF NOT EXISTS idx_predictions_timestamp 
-        ON predictions(timestamp DESC)
-    ''')
-    
-    cursor.execute('''
-        CREATE INDEX IF NOT EXISTS idx_sensor_timestamp 
-        ON sensor_data(timestamp DESC)
-    ''')
-    
-    conn.commit()
+    version = current_version(conn)
     conn.close()
-    
+
     print("✓ Database setup complete!")
     print(f"Database location: {DB_PATH}")
+    print(f"Schema version: {version}")
 
 if __name__ == '__main__':
     setup_database()
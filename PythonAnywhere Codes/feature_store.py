@@ -0,0 +1,156 @@
+"""
+Feature store: window features computed once at ingest.
+
+Every WINDOW_SIZE consecutive samples of a device become one window_features
+row holding the 30 features of inference_lightweight.extract_features (on
+raw, un-normalized samples - see features.normalize_features) plus the
+magnitude mean/variance/max the backup classifier uses. Windows are tumbling
+(non-overlapping) and flagged complete=0 when their sequence numbers have
+holes.
+
+Windows are accumulated per process; `python feature_store.py --db ... --rebuild`
+recomputes the table from sensor_data (e.g. after a multi-process deployment
+or for historical data).
+"""
+
+import argparse
+import os
+import sqlite3
+import sys
+import threading
+
+import numpy as np
+
+# Shared feature code lives with the ML files
+ML_DIR = os.environ.get('ACTIVITY_ML_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                                        os.pardir, 'Machine Learning Files'))
+if os.path.isdir(ML_DIR) and ML_DIR not in sys.path:
+    sys.path.append(ML_DIR)
+
+from features import FEATURE_NAMES, MAGNITUDE_NAMES, extract_features_batch, magnitude_stats_batch  # noqa: E402
+from ingest import window_is_contiguous  # noqa: E402
+
+WINDOW_SIZE = 50  # Matches STM32
+
+FEATURE_COLUMNS = ['device_id', 'first_seq', 'last_seq', 'start_ts', 'end_ts', 'n_samples', 'complete'] \
+    + FEATURE_NAMES + MAGNITUDE_NAMES
+
+_INSERT_SQL = 'INSERT OR IGNORE INTO window_features ({}) VALUES ({})'.format(
+    ', '.join(FEATURE_COLUMNS), ', '.join('?' * len(FEATURE_COLUMNS)))
+
+
+def sample_matrix(rows):
+    """Sensor row tuples -> (n, 6) array of ax, ay, az, gx, gy, gz (missing gyro = 0)"""
+    return np.array([(r[0], r[1], r[2], r[7] or 0.0, r[8] or 0.0, r[9] or 0.0) for r in rows], dtype=np.float64)
+
+
+def feature_rows(device_id, rows, window_size=WINDOW_SIZE):
+    """Feature rows for every full window in `rows` (a multiple of window_size long)"""
+    n_windows = len(rows) // window_size
+    if n_windows == 0:
+        return []
+
+    windows = sample_matrix(rows[:n_windows * window_size]).reshape(n_windows, window_size, 6)
+    features = extract_features_batch(windows)
+    magnitudes = magnitude_stats_batch(windows)
+
+    result = []
+    for i in range(n_windows):
+        chunk = rows[i * window_size:(i + 1) * window_size]
+        seqs = [r[5] for r in chunk]
+        result.append((device_id, seqs[0], seqs[-1], chunk[0][6], chunk[-1][6], window_size,
+                       int(window_is_contiguous(seqs)))
+                      + tuple(features[i].tolist()) + tuple(magnitudes[i].tolist()))
+    return result
+
+
+class WindowAccumulator:
+    """Collects stored sensor rows per device and emits feature rows per full window"""
+
+    def __init__(self, window_size=WINDOW_SIZE):
+        self.window_size = window_size
+        self._pending = {}
+        self._lock = threading.Lock()
+
+    def add(self, device_id, rows):
+        with self._lock:
+            pending = self._pending.setdefault(device_id, [])
+            pending.extend(rows)
+            n_ready = len(pending) // self.window_size * self.window_size
+            if n_ready == 0:
+                return []
+            ready = pending[:n_ready]
+            del pending[:n_ready]
+        return feature_rows(device_id, ready, self.window_size)
+
+    def snapshot(self, device_ids):
+        """Pending rows of device_ids, for restore() if the write they go with fails"""
+        with self._lock:
+            return {device_id: list(self._pending.get(device_id, [])) for device_id in device_ids}
+
+    def restore(self, snapshot):
+        with self._lock:
+            self._pending.update(snapshot)
+
+
+def insert_feature_rows(cursor, rows):
+    if not rows:
+        return 0
+    cursor.executemany(_INSERT_SQL, rows)
+    return cursor.rowcount
+
+
+def fetch_features(cursor, device_id=None, limit=100, names=FEATURE_NAMES):
+    """Latest window feature rows, newest first"""
+    columns = ', '.join(['device_id', 'first_seq', 'last_seq', 'start_ts', 'end_ts', 'complete'] + list(names))
+    if device_id is None:
+        cursor.execute(f'SELECT {columns} FROM window_features ORDER BY id DESC LIMIT ?', (limit,))
+    else:
+        cursor.execute(f'SELECT {columns} FROM window_features WHERE device_id = ? ORDER BY id DESC LIMIT ?',
+                       (device_id, limit))
+    return cursor.fetchall()
+
+
+def rebuild(db_path, window_size=WINDOW_SIZE, batch_size=5000):
+    """Recompute window_features from sensor_data, streaming rows in id order"""
+    conn = sqlite3.connect(db_path, timeout=10.0)
+    read = conn.cursor()
+    write = conn.cursor()
+
+    write.execute('DELETE FROM window_features')
+    accumulator = WindowAccumulator(window_size)
+    written = 0
+
+    read.execute('''
+        SELECT ax, ay, az, magnitude, device_id, seq, timestamp, gx, gy, gz
+        FROM sensor_data
+        ORDER BY id
+    ''')
+    while True:
+        batch = read.fetchmany(batch_size)
+        if not batch:
+            break
+        by_device = {}
+        for row in batch:
+            by_device.setdefault(row[4], []).append(row)
+        for device_id, rows in by_device.items():
+            written += insert_feature_rows(write, accumulator.add(device_id, rows))
+        conn.commit()
+
+    conn.commit()
+    conn.close()
+    return written
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Maintain the window_features table')
+    parser.add_argument('--db', required=True)
+    parser.add_argument('--rebuild', action='store_true', help='recompute every window from sensor_data')
+    args = parser.parse_args()
+
+    if args.rebuild:
+        print(f"✓ Rebuilt {rebuild(args.db)} feature windows")
+
+
+if __name__ == '__main__':
+    main()
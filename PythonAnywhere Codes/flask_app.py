@@ -1,45 +1,69 @@
 from flask import Flask, request, jsonify
 import json
 import os
+import logging
+from ingest import SequenceTracker
+from structured_log import get_logger
 
 app = Flask(__name__)
+log = get_logger('activity.data')
+sequence_tracker = SequenceTracker()
 
 @app.route('/api/data', methods=['POST'])
 def receive_data():
     try:
-        # 1. Log headers for debugging (Check this in your Server Log)
-        content_length = request.headers.get('Content-Length')
-        content_type = request.headers.get('Content-Type')
-        print(f"--- New Request ---")
-        print(f"Content-Length: {content_length}")
-        print(f"Content-Type: {content_type}")
-
-        # 2. Get the raw data string
+        # 1. Get the raw data string
         raw_data = request.get_data().decode('utf-8')
-        print(f"Raw data received: '{raw_data}'")
+
+        # 2. Log headers and body for debugging (sampled, ACTIVITY_LOG_LEVEL=DEBUG)
+        if log.isEnabledFor(logging.DEBUG):
+            log.debug('request', extra={'sampled': True, 'fields': {
+                'content_length': request.headers.get('Content-Length'),
+                'content_type': request.headers.get('Content-Type'),
+                'body': raw_data}})
 
         if not raw_data:
-            print("Error: Received an empty body")
+            log.warning('empty body')
             return "Body is empty", 400
 
         # 3. Parse the string into JSON
         try:
             data = json.loads(raw_data)
         except Exception as e:
-            print(f"JSON Parse Error: {str(e)}")
+            log.warning('invalid JSON', extra={'fields': {'error': str(e)}})
             return "Invalid JSON format", 400
 
+        # Retried uploads carry the same (device_id, seq) - acknowledge without writing
+        seq = None
+        if isinstance(data, dict) and data.get('seq') is not None:
+            device_id = str(data.get('device_id', 'default'))
+            try:
+                seq = int(data['seq'])
+            except (TypeError, ValueError):
+                return "Invalid data format", 400
+            if not sequence_tracker.accept(device_id, seq):
+                return "DUPLICATE", 200
+
         # 4. Save to file
         log_path = '/home/cathlynramo/sensor_log.txt'
-        with open(log_path, 'a') as f:
-            f.write(json.dumps(data) + "\n")
+        try:
+            with open(log_path, 'a') as f:
+                f.write(json.dumps(data) + "\n")
+        except Exception:
+            # Not stored - the retry must not be answered as a duplicate
+            if seq is not None:
+                sequence_tracker.forget(device_id, seq)
+            raise
 
-        print("Successfully saved data to sensor_log.txt")
         return "SUCCESS", 200
 
     except Exception as e:
-        print(f"Critical Server Error: {str(e)}")
+        log.exception('critical server error')
         return f"Server Error: {str(e)}", 500
 
+@app.route('/api/ingest/stats', methods=['GET'])
+def ingest_stats():
+    return jsonify({'status': 'success', 'devices': sequence_tracker.stats()})
+
 if __name__ == '__main__':
     app.run()
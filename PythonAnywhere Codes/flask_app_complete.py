@@ -1,15 +1,24 @@
 from flask import Flask, render_template, jsonify, request
-import sqlite3
 from datetime import datetime, timedelta, timezone
 import threading
 import queue
 import time
 import atexit
+import logging
+from wire_protocol import iter_frames, FrameError
+from ingest import SequenceTracker, window_is_contiguous, parse_json_sample, frames_to_rows, forget_rows
+from storage import DB_PATH, get_db_connection, init_db as init_storage, insert_sensor_rows, insert_predictions
+from metrics import REGISTRY, install_flask, loop_seconds
+from feature_store import WindowAccumulator, insert_feature_rows, fetch_features
+from segments import SegmentTracker, fetch_segments, activity_counts
+from response_cache import data_version, response_cache
+from structured_log import get_logger
 
 app = Flask(__name__)
+log = get_logger('activity.app')
+install_flask(app)
 
 # Configuration - MUST MATCH STM32
-DB_PATH = '/home/cathlynramo/iot/activity_recognition.db'
 PREDICTION_INTERVAL = 5
 WINDOW_SIZE = 50  # Matches STM32
 
@@ -17,80 +26,26 @@ WINDOW_SIZE = 50  # Matches STM32
 sensor_queue = queue.Queue(maxsize=1000)
 prediction_buffer = []
 db_lock = threading.Lock()
-
-# Activity mapping - matches STM32 output
-ACTIVITY_MAP = {
-    'walking': 'Walking',
-    'running': 'Running',
-    'idle': 'Idle',
-    'calibrating': 'Calibrating'
-}
+sequence_tracker = SequenceTracker()
+window_accumulator = WindowAccumulator(WINDOW_SIZE)
+segment_tracker = SegmentTracker()
+
+REGISTRY.gauge('sensor_queue_size', 'Items waiting in sensor_queue', sensor_queue.qsize)
+REGISTRY.gauge('prediction_buffer_size', 'Entries in prediction_buffer', lambda: len(prediction_buffer))
+REGISTRY.gauge('ingest_duplicates', 'Duplicate samples dropped (all devices)',
+               lambda: sum(d['duplicates'] for d in sequence_tracker.stats().values()))
+REGISTRY.gauge('ingest_missing', 'Samples lost in sequence gaps (all devices)',
+               lambda: sum(d['missing'] for d in sequence_tracker.stats().values()))
+REGISTRY.gauge('response_cache_hits', 'Dashboard responses served from cache', lambda: response_cache.hits)
+REGISTRY.gauge('response_cache_misses', 'Dashboard responses built from the database', lambda: response_cache.misses)
 
 # Thread management
 _worker_thread = None
 _thread_started = False
 _thread_lock = threading.Lock()
 
-# Database functions
-def get_db_connection():
-    conn = sqlite3.connect(DB_PATH, timeout=10.0)
-    conn.row_factory = sqlite3.Row
-    conn.execute("PRAGMA journal_mode=WAL")
-    return conn
-
 def init_db():
-    conn = get_db_connection()
-    cursor = conn.cursor()
-
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS sensor_data (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            ax REAL NOT NULL,
-            ay REAL NOT NULL,
-            az REAL NOT NULL,
-            magnitude REAL,
-            timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
-        )
-    ''')
-
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS predictions (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            activity TEXT NOT NULL,
-            confidence REAL,
-            source TEXT DEFAULT 'device',
-            timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
-        )
-    ''')
-
-    cursor.execute('CREATE INDEX IF NOT EXISTS idx_sensor_timestamp ON sensor_data(timestamp DESC)')
-    cursor.execute('CREATE INDEX IF NOT EXISTS idx_predictions_timestamp ON predictions(timestamp DESC)')
-
-    # Migrate existing database - add missing columns
-    try:
-        # Check if magnitude column exists
-        cursor.execute("PRAGMA table_info(sensor_data)")
-        columns = [col[1] for col in cursor.fetchall()]
-
-        if 'magnitude' not in columns:
-            print("⚠ Adding 'magnitude' column to sensor_data table...")
-            cursor.execute('ALTER TABLE sensor_data ADD COLUMN magnitude REAL')
-            print("✅ Column added successfully")
-
-        # Check if source column exists in predictions
-        cursor.execute("PRAGMA table_info(predictions)")
-        columns = [col[1] for col in cursor.fetchall()]
-
-        if 'source' not in columns:
-            print("⚠ Adding 'source' column to predictions table...")
-            cursor.execute("ALTER TABLE predictions ADD COLUMN source TEXT DEFAULT 'device'")
-            print("✅ Column added successfully")
-
-    except Exception as e:
-        print(f"⚠ Migration warning: {e}")
-
-    conn.commit()
-    conn.close()
+    init_storage(sequence_tracker)
 
 # Routes
 @app.route('/')
@@ -134,6 +89,7 @@ def get_realtime_prediction():
         return jsonify({'status': 'error', 'message': str(e)}), 500
 
 @app.route('/api/history', methods=['GET'])
+@response_cache.cached
 def get_history():
     try:
         hours = int(request.args.get('hours', 24))
@@ -145,34 +101,22 @@ def get_history():
             conn = get_db_connection()
             cursor = conn.cursor()
 
-            cursor.execute('''
-                SELECT activity, confidence, timestamp
-                FROM predictions
-                WHERE timestamp >= ?
-                ORDER BY timestamp DESC
-                LIMIT ?
-            ''', (start_time, limit))
-
-            rows = cursor.fetchall()
-
-            cursor.execute('''
-                SELECT activity, COUNT(*) as count
-                FROM predictions
-                WHERE timestamp >= ?
-                GROUP BY activity
-            ''', (start_time,))
-
-            stats_rows = cursor.fetchall()
+            # One row per activity run instead of one per prediction
+            rows = fetch_segments(cursor, start_time, request.args.get('device_id'), limit)
+            statistics = activity_counts(cursor, start_time)
             conn.close()
 
         history = [{
             'activity': row['activity'],
-            'confidence': float(row['confidence']) if row['confidence'] else 0,
-            'timestamp': row['timestamp']
+            'confidence': float(row['mean_confidence']) if row['mean_confidence'] else 0,
+            'timestamp': row['end_ts'],
+            'start': row['start_ts'],
+            'end': row['end_ts'],
+            'samples': row['n_samples'],
+            'device_id': row['device_id'],
+            'source': row['source']
         } for row in rows]
 
-        statistics = {row['activity']: row['count'] for row in stats_rows}
-
         return jsonify({
             'status': 'success',
             'total_records': len(history),
@@ -188,6 +132,7 @@ def database_view():
     return render_template('database.html')
 
 @app.route('/api/database/sensors', methods=['GET'])
+@response_cache.cached
 def get_sensor_data():
     """Get sensor data in table format"""
     try:
@@ -232,6 +177,7 @@ def get_sensor_data():
         return jsonify({'status': 'error', 'message': str(e)}), 500
 
 @app.route('/api/database/predictions', methods=['GET'])
+@response_cache.cached
 def get_prediction_data():
     """Get prediction data in table format"""
     try:
@@ -275,34 +221,23 @@ def get_prediction_data():
         return jsonify({'status': 'error', 'message': str(e)}), 500
 
 @app.route('/api/stats', methods=['GET'])
+@response_cache.cached
 def get_stats():
     try:
         with db_lock:
             conn = get_db_connection()
             cursor = conn.cursor()
 
-            cursor.execute('SELECT COUNT(*) as total FROM predictions')
-            total = cursor.fetchone()['total']
-
-            cursor.execute('''
-                SELECT
-                    SUM(CASE WHEN activity = 'Walking' THEN 1 ELSE 0 END) as walking,
-                    SUM(CASE WHEN activity = 'Running' THEN 1 ELSE 0 END) as running,
-                    SUM(CASE WHEN activity = 'Idle' THEN 1 ELSE 0 END) as idle,
-                    SUM(CASE WHEN activity = 'Calibrating' THEN 1 ELSE 0 END) as calibrating
-                FROM predictions
-            ''')
-
-            counts = cursor.fetchone()
+            counts = activity_counts(cursor)
             conn.close()
 
         return jsonify({
             'status': 'success',
-            'total_records': total,
-            'walking_count': counts['walking'] or 0,
-            'running_count': counts['running'] or 0,
-            'idle_count': counts['idle'] or 0,
-            'calibrating_count': counts['calibrating'] or 0
+            'total_records': sum(counts.values()),
+            'walking_count': counts.get('Walking', 0),
+            'running_count': counts.get('Running', 0),
+            'idle_count': counts.get('Idle', 0),
+            'calibrating_count': counts.get('Calibrating', 0)
         })
     except Exception as e:
         return jsonify({'status': 'error', 'message': str(e)}), 500
@@ -322,84 +257,170 @@ def debug():
         'queue_size': sensor_queue.qsize(),
         'buffer_size': len(prediction_buffer),
         'threads': thread_info,
-        'thread_count': len(all_threads)
+        'thread_count': len(all_threads),
+        'response_cache': response_cache.stats()
+    })
+
+@app.route('/api/features', methods=['GET'])
+def get_window_features():
+    """Precomputed window features (newest first)"""
+    try:
+        device_id = request.args.get('device_id')
+        limit = int(request.args.get('limit', 100))
+
+        with db_lock:
+            conn = get_db_connection()
+            rows = fetch_features(conn.cursor(), device_id, limit)
+            conn.close()
+
+        return jsonify({
+            'status': 'success',
+            'total_records': len(rows),
+            'records': [dict(row) for row in rows]
+        })
+    except Exception as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 500
+
+@app.route('/api/ingest/stats', methods=['GET'])
+def ingest_stats():
+    """Per-device duplicate and gap counters"""
+    return jsonify({
+        'status': 'success',
+        'devices': sequence_tracker.stats()
     })
 
 @app.route('/api/upload', methods=['POST'])
 def upload_sensor_data():
     """Receive sensor data with activity prediction from STM32"""
+    accepted = None
     try:
         data = request.get_json()
 
-        print(f"📥 Received data: {data}")
-
         if not data or 'ax' not in data:
-            print("❌ Invalid data format")
+            log.warning('invalid upload', extra={'fields': {'payload': data}})
             return jsonify({'status': 'error', 'message': 'Invalid data format'}), 400
 
-        # Extract data
-        ax = float(data['ax'])
-        ay = float(data['ay'])
-        az = float(data['az'])
+        try:
+            sensor_row, prediction_row = parse_json_sample(data, datetime.now(timezone.utc))
+        except (KeyError, TypeError, ValueError):
+            log.warning('invalid upload', extra={'fields': {'payload': data}})
+            return jsonify({'status': 'error', 'message': 'Invalid data format'}), 400
+        ax, ay, az, magnitude, device_id, seq = sensor_row[:6]
+        activity_label, confidence = prediction_row[0], prediction_row[1]
 
-        # Get activity from device
-        activity_from_device = data.get('activity', 'unknown').lower().strip()
+        # Optional sequence number - drop retries before touching the database
+        if seq is not None:
+            if not sequence_tracker.accept(device_id, seq):
+                return jsonify({'status': 'duplicate', 'message': 'Already received', 'seq': seq}), 200
+            # Handed back below if the sample does not get committed
+            accepted = seq
 
-        # Calculate magnitude
-        magnitude = (ax**2 + ay**2 + az**2)**0.5
+        # Store sensor data and prediction (even if calibrating, to show status)
+        with db_lock:
+            # Roll a failed write back explicitly - close() alone keeps the
+            # write lock while a cursor is still referenced
+            saved = window_accumulator.snapshot([device_id])
+            conn = get_db_connection()
+            try:
+                cursor = conn.cursor()
+
+                if insert_sensor_rows(cursor, [sensor_row]) == 0:
+                    sequence_tracker.record_db_duplicates(device_id, 1)
+                    return jsonify({'status': 'duplicate', 'message': 'Already received', 'seq': seq}), 200
+
+                insert_predictions(cursor, [prediction_row])
+                segment_tracker.record_rows(cursor, [prediction_row])
+                insert_feature_rows(cursor, window_accumulator.add(device_id, [sensor_row]))
+
+                conn.commit()
+                accepted = None
+            except Exception:
+                conn.rollback()
+                window_accumulator.restore(saved)
+                raise
+            finally:
+                conn.close()
+            data_version.bump()
+
+        if log.isEnabledFor(logging.DEBUG):
+            log.debug('stored sample', extra={'sampled': True, 'fields': {
+                'device_id': device_id, 'seq': seq, 'ax': ax, 'ay': ay, 'az': az,
+                'magnitude': magnitude, 'activity': activity_label, 'confidence': confidence}})
 
-        timestamp = datetime.now(timezone.utc).isoformat()
+        return jsonify({
+            'status': 'success',
+            'message': 'Data received',
+            'activity_detected': activity_label,
+            'magnitude': round(magnitude, 3)
+        }), 200
 
-        print(f"📊 Parsed - ax={ax}, ay={ay}, az={az}, mag={magnitude:.3f}, activity={activity_from_device}")
+    except Exception as e:
+        if accepted is not None:
+            sequence_tracker.forget(device_id, accepted)
+        segment_tracker.reset()
+        log.exception('upload failed')
+        return jsonify({'status': 'error', 'message': str(e)}), 500
 
-        # Store sensor data and prediction
-        with db_lock:
-            conn = get_db_connection()
-            cursor = conn.cursor()
+@app.route('/api/upload/binary', methods=['POST'])
+def upload_sensor_frames():
+    """Receive packed binary frames (see wire_protocol.py) from STM32"""
+    pending = {}
+    try:
+        body = request.get_data(cache=False)
 
-            # Insert sensor data
-            cursor.execute('''
-                INSERT INTO sensor_data (ax, ay, az, magnitude, timestamp)
-                VALUES (?, ?, ?, ?, ?)
-            ''', (ax, ay, az, magnitude, timestamp))
-
-            # Map activity to proper display format
-            activity_label = ACTIVITY_MAP.get(activity_from_device, activity_from_device.capitalize())
-
-            # Calculate confidence based on activity type (matching STM32 thresholds)
-            if activity_from_device == 'running':
-                confidence = 0.85
-            elif activity_from_device == 'walking':
-                confidence = 0.80
-            elif activity_from_device == 'idle':
-                confidence = 0.75
-            elif activity_from_device == 'calibrating':
-                confidence = 0.50
-            else:
-                confidence = 0.70
-
-            # Store prediction (even if calibrating, to show status)
-            cursor.execute('''
-                INSERT INTO predictions (activity, confidence, source, timestamp)
-                VALUES (?, ?, ?, ?)
-            ''', (activity_label, confidence, 'device', timestamp))
+        if not body:
+            return jsonify({'status': 'error', 'message': 'Empty body'}), 400
 
-            conn.commit()
-            conn.close()
+        try:
+            frames = list(iter_frames(body))
+        except FrameError as e:
+            return jsonify({'status': 'error', 'message': str(e)}), 400
+
+        sensor_rows, prediction_rows = frames_to_rows(frames, sequence_tracker, datetime.now(timezone.utc))
+        # Handed back below if the rows do not get committed
+        pending = sensor_rows
 
-        print(f"✅ STORED: {activity_label} (conf={confidence:.2f}, mag={magnitude:.3f}, source=device)")
+        with db_lock:
+            saved = window_accumulator.snapshot(sensor_rows)
+            conn = get_db_connection()
+            try:
+                cursor = conn.cursor()
+
+                written = {}
+                for device_id, rows in sensor_rows.items():
+                    written[device_id] = insert_sensor_rows(cursor, rows)
+                    insert_feature_rows(cursor, window_accumulator.add(device_id, rows))
+
+                insert_predictions(cursor, prediction_rows)
+                segment_tracker.record_rows(cursor, prediction_rows)
+
+                conn.commit()
+                pending = {}
+            except Exception:
+                conn.rollback()
+                window_accumulator.restore(saved)
+                raise
+            finally:
+                conn.close()
+            data_version.bump()
+
+        stored = 0
+        for device_id, count in written.items():
+            # Ignored rows are retries older than the in-memory dedup window
+            sequence_tracker.record_db_duplicates(device_id, len(sensor_rows[device_id]) - count)
+            stored += count
 
         return jsonify({
             'status': 'success',
-            'message': 'Data received',
-            'activity_detected': activity_label,
-            'magnitude': round(magnitude, 3)
+            'frames': len(frames),
+            'samples': stored,
+            'duplicates': sum(h.count for h, _ in frames) - stored
         }), 200
 
     except Exception as e:
-        print(f"❌ Upload error: {e}")
-        import traceback
-        traceback.print_exc()
+        forget_rows(sequence_tracker, pending)
+        segment_tracker.reset()
+        log.exception('binary upload failed')
         return jsonify({'status': 'error', 'message': str(e)}), 500
 
 # Backup prediction worker (validates device predictions using same STM32 logic)
@@ -407,15 +428,14 @@ def prediction_worker():
     """Backup prediction system using same logic as STM32"""
     global prediction_buffer
 
-    print("=" * 60)
-    print("✓ BACKUP PREDICTION WORKER STARTED")
-    print("=" * 60)
+    log.info('backup prediction worker started')
 
     last_prediction_time = 0
 
     while True:
         try:
             current_time = time.time()
+            loop_started = time.perf_counter()
 
             # Make backup predictions every 30 seconds (only if device hasn't sent data)
             if (current_time - last_prediction_time) >= 30:
@@ -434,24 +454,46 @@ def prediction_worker():
                     device_count = cursor.fetchone()['count']
 
                     if device_count == 0:
-                        # Get recent sensor data for backup prediction
+                        window = None
+
+                        # Latest window statistics computed at ingest
                         cursor.execute('''
-                            SELECT ax, ay, az, magnitude
-                            FROM sensor_data
+                            SELECT device_id, complete, mag_var, mag_max
+                            FROM window_features
                             ORDER BY id DESC
-                            LIMIT ?
-                        ''', (WINDOW_SIZE,))
-
-                        rows = cursor.fetchall()
-
-                        if len(rows) >= WINDOW_SIZE:
-                            # Use same classification logic as STM32
-                            magnitudes = [row['magnitude'] for row in rows]
-
-                            # Calculate statistics
-                            mean_mag = sum(magnitudes) / len(magnitudes)
-                            variance = sum((m - mean_mag)**2 for m in magnitudes) / len(magnitudes)
-                            max_mag = max(magnitudes)
+                            LIMIT 1
+                        ''')
+                        feature_row = cursor.fetchone()
+
+                        if feature_row:
+                            window = (feature_row['device_id'], bool(feature_row['complete']),
+                                      feature_row['mag_var'], feature_row['mag_max'])
+                        else:
+                            # No feature windows yet - fall back to raw sensor data
+                            cursor.execute('''
+                                SELECT magnitude, device_id, seq
+                                FROM sensor_data
+                                ORDER BY id DESC
+                                LIMIT ?
+                            ''', (WINDOW_SIZE,))
+
+                            rows = cursor.fetchall()
+
+                            if len(rows) >= WINDOW_SIZE:
+                                magnitudes = [row['magnitude'] for row in rows]
+                                mean_mag = sum(magnitudes) / len(magnitudes)
+                                window = (rows[0]['device_id'],
+                                          window_is_contiguous([row['seq'] for row in rows]),
+                                          sum((m - mean_mag)**2 for m in magnitudes) / len(magnitudes),
+                                          max(magnitudes))
+
+                        if window:
+                            window_device, complete, variance, max_mag = window
+
+                            # Flag windows with lost samples (sequence holes)
+                            if not complete:
+                                sequence_tracker.mark_incomplete_window(window_device)
+                                log.warning('incomplete backup window', extra={'fields': {'device_id': window_device}})
 
                             # Same thresholds as STM32
                             RUNNING_THRESHOLD = 1.5
@@ -468,22 +510,25 @@ def prediction_worker():
                                 activity_label = 'Idle'
                                 confidence = 0.75
 
-                            cursor.execute('''
-                                INSERT INTO predictions (activity, confidence, source, timestamp)
-                                VALUES (?, ?, ?, ?)
-                            ''', (activity_label, confidence, 'server_backup',
-                                  datetime.now(timezone.utc).isoformat()))
+                            backup_row = (activity_label, confidence, 'server_backup',
+                                          datetime.now(timezone.utc).isoformat(), window_device)
+                            insert_predictions(cursor, [backup_row])
+                            segment_tracker.record_rows(cursor, [backup_row])
 
                             conn.commit()
-                            print(f"⚠ BACKUP PREDICTION: {activity_label} (var={variance:.3f}, max={max_mag:.3f})")
+                            data_version.bump()
+                            log.info('backup prediction', extra={'fields': {
+                                'activity': activity_label, 'variance': variance, 'max_magnitude': max_mag}})
 
                     conn.close()
                     last_prediction_time = current_time
 
+            loop_seconds.observe(time.perf_counter() - loop_started, 'backup_prediction')
             time.sleep(10)
 
         except Exception as e:
-            print(f"✗ Backup prediction worker error: {e}")
+            segment_tracker.reset()
+            log.exception('backup prediction worker error')
             time.sleep(10)
 
 # Start worker thread
@@ -495,7 +540,7 @@ def start_worker():
             _worker_thread = threading.Thread(target=prediction_worker, daemon=True, name="BackupPredictionWorker")
             _worker_thread.start()
             _thread_started = True
-            print("✓ Backup prediction worker initialized")
+            log.info('backup prediction worker initialized')
 
 # Hook to start thread on first request
 @app.before_request
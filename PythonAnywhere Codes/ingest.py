@@ -0,0 +1,248 @@
+"""
+Ingest pipeline shared by the Flask and ASGI front ends: payload parsing into
+sensor/prediction rows plus per-device sequence tracking.
+
+Boards number every sample with a monotonic sequence number. The tracker keeps
+a bounded window of recently seen numbers per device so retried uploads are
+dropped before they touch the database, and counts gaps so the backup
+predictor can tell when a window is not contiguous. A sample that is accepted
+but never stored (failed write, full queue) must be handed back with forget(),
+otherwise its retry would be dropped as a duplicate. The unique index on
+sensor_data(device_id, seq) is the backstop for anything older than the window.
+"""
+
+import threading
+from collections import OrderedDict
+from datetime import timedelta
+
+import numpy as np
+
+from wire_protocol import to_physical
+
+DEDUP_WINDOW = 4096  # sequence numbers remembered per device
+
+# Activity mapping - matches STM32 output
+ACTIVITY_MAP = {
+    'walking': 'Walking',
+    'running': 'Running',
+    'idle': 'Idle',
+    'calibrating': 'Calibrating'
+}
+
+
+class DeviceStats:
+    __slots__ = ('last_seq', 'seen', 'received', 'duplicates', 'missing', 'gap_events',
+                 'late', 'incomplete_windows')
+
+    def __init__(self):
+        self.last_seq = None
+        self.seen = OrderedDict()
+        self.received = 0
+        self.duplicates = 0
+        self.missing = 0
+        self.gap_events = 0
+        self.late = 0
+        self.incomplete_windows = 0
+
+    def to_dict(self):
+        return {
+            'last_seq': self.last_seq,
+            'received': self.received,
+            'duplicates': self.duplicates,
+            'missing': self.missing,
+            'gap_events': self.gap_events,
+            'late_arrivals': self.late,
+            'incomplete_windows': self.incomplete_windows
+        }
+
+
+class SequenceTracker:
+    """Thread-safe dedup window and gap accounting keyed by device id"""
+
+    def __init__(self, window=DEDUP_WINDOW):
+        self.window = window
+        self._devices = {}
+        self._lock = threading.Lock()
+
+    def _device(self, device_id):
+        state = self._devices.get(device_id)
+        if state is None:
+            state = self._devices[device_id] = DeviceStats()
+        return state
+
+    def _remember(self, state, seq, undo):
+        # undo: what accept() changed, so forget() can take it back
+        state.seen[seq] = undo
+        if len(state.seen) > self.window:
+            state.seen.popitem(last=False)
+
+    def accept(self, device_id, seq):
+        """Return True if (device_id, seq) is new and should be stored"""
+        with self._lock:
+            state = self._device(device_id)
+
+            if seq in state.seen:
+                state.duplicates += 1
+                return False
+
+            if state.last_seq is None or seq == state.last_seq + 1:
+                undo = ('advance', state.last_seq, 0)
+                state.last_seq = seq
+            elif seq > state.last_seq + 1:
+                undo = ('advance', state.last_seq, seq - state.last_seq - 1)
+                state.missing += seq - state.last_seq - 1
+                state.gap_events += 1
+                state.last_seq = seq
+            elif state.last_seq - seq < self.window:
+                # Retransmission filling an earlier gap
+                undo = ('late', None, min(state.missing, 1))
+                state.late += 1
+                state.missing -= undo[2]
+            else:
+                # Too old to judge here - let the unique index decide
+                undo = ('old', None, 0)
+
+            state.received += 1
+            self._remember(state, seq, undo)
+            return True
+
+    def forget(self, device_id, seq):
+        """Take back accept(device_id, seq) for a sample that was not stored"""
+        with self._lock:
+            state = self._devices.get(device_id)
+            if state is None or seq not in state.seen:
+                return
+            kind, prev_seq, count = state.seen.pop(seq)
+            state.received -= 1
+
+            if kind == 'advance' and state.last_seq == seq:
+                # Later numbers keep last_seq - the retry then counts as late
+                state.last_seq = prev_seq
+                if count:
+                    state.missing -= count
+                    state.gap_events -= 1
+            elif kind == 'late':
+                state.late -= 1
+                state.missing += count
+
+    def accept_range(self, device_id, first_seq, count):
+        """Return the offsets in [0, count) of a frame that are new"""
+        return [i for i in range(count) if self.accept(device_id, first_seq + i)]
+
+    def record_db_duplicates(self, device_id, count):
+        """Rows rejected by the unique index (older than the in-memory window)"""
+        if count <= 0:
+            return
+        with self._lock:
+            state = self._device(device_id)
+            state.duplicates += count
+            state.received -= count
+
+    def mark_incomplete_window(self, device_id):
+        with self._lock:
+            self._device(device_id).incomplete_windows += 1
+
+    def seed(self, device_id, last_seq):
+        """Resume from the highest stored sequence number after a restart"""
+        with self._lock:
+            state = self._device(device_id)
+            if state.last_seq is None or last_seq > state.last_seq:
+                state.last_seq = last_seq
+
+    def stats(self):
+        with self._lock:
+            return {str(device_id): state.to_dict() for device_id, state in self._devices.items()}
+
+
+def window_is_contiguous(seqs):
+    """True if a window's sequence numbers have no holes (None = legacy rows, unknown)"""
+    known = [s for s in seqs if s is not None]
+    if len(known) < 2:
+        return True
+    return max(known) - min(known) + 1 == len(known)
+
+
+def device_confidence(activity):
+    """Fixed confidence per device label (matching STM32 thresholds)"""
+    if activity == 'running':
+        return 0.85
+    elif activity == 'walking':
+        return 0.80
+    elif activity == 'idle':
+        return 0.75
+    elif activity == 'calibrating':
+        return 0.50
+    return 0.70
+
+
+def activity_label(activity):
+    return ACTIVITY_MAP.get(activity, activity.capitalize())
+
+
+def parse_json_sample(data, now):
+    """Turn one JSON upload into (sensor_row, prediction_row).
+
+    Raises KeyError/TypeError/ValueError on malformed payloads.
+    """
+    ax = float(data['ax'])
+    ay = float(data['ay'])
+    az = float(data['az'])
+    magnitude = (ax**2 + ay**2 + az**2)**0.5
+
+    device_id = str(data.get('device_id', 'default'))
+    seq = int(data['seq']) if data.get('seq') is not None else None
+    activity = str(data.get('activity') or 'unknown').lower().strip()
+    timestamp = now.isoformat()
+
+    # Gyro is optional in the JSON format
+    gx, gy, gz = (float(data[k]) if data.get(k) is not None else None for k in ('gx', 'gy', 'gz'))
+
+    sensor_row = (ax, ay, az, magnitude, device_id, seq, timestamp, gx, gy, gz)
+    prediction_row = (activity_label(activity), device_confidence(activity), 'device', timestamp, device_id)
+    return sensor_row, prediction_row
+
+
+def frames_to_rows(frames, tracker, now):
+    """Turn decoded binary frames into sensor rows grouped by device plus one
+    prediction row per labelled frame. Samples already seen are dropped.
+    """
+    sensor_rows = {}
+    prediction_rows = []
+
+    for header, samples in frames:
+        if header.count == 0:
+            continue
+
+        device_id = str(header.device_id)
+        fresh = tracker.accept_range(device_id, header.seq, header.count)
+        if not fresh:
+            continue
+
+        accel, gyro = to_physical(samples)
+        magnitudes = np.sqrt((accel * accel).sum(axis=1))
+
+        # Spread timestamps back from arrival time using the device sample rate
+        period = 1.0 / header.sample_rate if header.sample_rate else 0.0
+        rows = sensor_rows.setdefault(device_id, [])
+        for i in fresh:
+            ts = (now - timedelta(seconds=(header.count - 1 - i) * period)).isoformat()
+            rows.append((float(accel[i, 0]), float(accel[i, 1]), float(accel[i, 2]),
+                         float(magnitudes[i]), device_id, header.seq + i, ts,
+                         float(gyro[i, 0]), float(gyro[i, 1]), float(gyro[i, 2])))
+
+        # One prediction per frame rather than per sample
+        if header.activity != 'unknown':
+            prediction_rows.append((activity_label(header.activity), device_confidence(header.activity),
+                                    'device', now.isoformat(), device_id))
+
+    return sensor_rows, prediction_rows
+
+
+def forget_rows(tracker, sensor_rows):
+    """Hand the sequence numbers of sensor rows (by device) that were not
+    stored back to the tracker, newest first so last_seq rewinds.
+    """
+    for device_id, rows in sensor_rows.items():
+        for row in reversed(rows):
+            if row[5] is not None:
+                tracker.forget(device_id, row[5])
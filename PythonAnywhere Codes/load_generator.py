@@ -0,0 +1,237 @@
+"""
+Local load generator for the ingestion endpoints.
+
+Opens N keep-alive connections (one simulated board each) on a single asyncio
+loop and posts samples as fast as possible or at a fixed per-board rate.
+Works against both the threaded Flask app and the ASGI app:
+
+    python flask_app_complete.py                  # :5000
+    uvicorn asgi_app:app --port 8000
+    python load_generator.py --port 5000 --connections 200 --duration 20
+    python load_generator.py --port 8000 --connections 200 --duration 20
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import time
+from collections import defaultdict
+
+from wire_protocol import encode_frame
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    k = min(len(sorted_values) - 1, int(round(pct / 100.0 * (len(sorted_values) - 1))))
+    return sorted_values[k]
+
+
+def latency_summary(latencies):
+    latencies = sorted(latencies)
+    return {
+        'p50': round(percentile(latencies, 50), 3),
+        'p95': round(percentile(latencies, 95), 3),
+        'p99': round(percentile(latencies, 99), 3),
+        'max': round(latencies[-1], 3) if latencies else 0.0
+    }
+
+
+def json_payload(device_id, seq):
+    return json.dumps({
+        'device_id': device_id,
+        'seq': seq,
+        'ax': random.uniform(-1.5, 1.5),
+        'ay': random.uniform(-1.5, 1.5),
+        'az': random.uniform(0.5, 1.5),
+        'activity': random.choice(['idle', 'walking', 'running'])
+    }).encode('utf-8')
+
+
+def binary_payload(device_id, seq, frame_size):
+    samples = [[random.randint(-20000, 20000) for _ in range(6)] for _ in range(frame_size)]
+    return encode_frame(device_id, seq, 50, samples, activity=random.choice(['idle', 'walking', 'running']))
+
+
+def build_request(host, method, path, body=b'', content_type='application/json'):
+    head = (f"{method} {path} HTTP/1.1\r\n"
+            f"Host: {host}\r\n"
+            f"Content-Type: {content_type}\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            f"Connection: keep-alive\r\n\r\n")
+    return head.encode('ascii') + body
+
+
+async def read_response(reader):
+    status_line = await reader.readline()
+    if not status_line:
+        raise ConnectionError('Connection closed by server')
+    status = int(status_line.split()[1])
+
+    length = 0
+    close = False
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b''):
+            break
+        name, _, value = line.decode('latin-1').partition(':')
+        name = name.strip().lower()
+        if name == 'content-length':
+            length = int(value.strip())
+        elif name == 'connection' and value.strip().lower() == 'close':
+            close = True
+
+    body = await reader.readexactly(length) if length else b''
+    return status, body, close
+
+
+class Recorder:
+    """Request counters and per-endpoint latencies shared by all clients"""
+
+    def __init__(self):
+        self.connections = 0
+        self.connect_errors = 0
+        self.requests = 0
+        self.samples = 0
+        self.errors = 0
+        self.latencies = defaultdict(list)
+        self.endpoint_errors = defaultdict(int)
+
+    def summary(self, elapsed):
+        all_latencies = [ms for values in self.latencies.values() for ms in values]
+        return {
+            'connections': self.connections,
+            'connect_errors': self.connect_errors,
+            'requests': self.requests,
+            'samples': self.samples,
+            'errors': self.errors,
+            'elapsed_s': round(elapsed, 3),
+            'requests_per_s': round(self.requests / elapsed, 1),
+            'samples_per_s': round(self.samples / elapsed, 1),
+            'latency_ms': latency_summary(all_latencies),
+            'endpoints': {
+                path: dict(count=len(values), errors=self.endpoint_errors[path], **latency_summary(values))
+                for path, values in sorted(self.latencies.items())
+            }
+        }
+
+
+class Client:
+    """One keep-alive HTTP/1.1 connection that reconnects when the server closes it"""
+
+    def __init__(self, host, port, recorder):
+        self.host = host
+        self.port = port
+        self.recorder = recorder
+        self.reader = None
+        self.writer = None
+
+    async def request(self, method, path, body=b'', content_type='application/json', samples=0):
+        if self.writer is None:
+            try:
+                self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+                self.recorder.connections += 1
+            except OSError:
+                self.recorder.connect_errors += 1
+                await asyncio.sleep(0.1)
+                return None
+
+        started = time.perf_counter()
+        try:
+            self.writer.write(build_request(self.host, method, path, body, content_type))
+            await self.writer.drain()
+            status, _, close = await read_response(self.reader)
+        except (OSError, ConnectionError, asyncio.IncompleteReadError):
+            self.recorder.errors += 1
+            self.recorder.endpoint_errors[path] += 1
+            self.close()
+            return None
+
+        self.recorder.latencies[path].append((time.perf_counter() - started) * 1000)
+        if status == 200:
+            self.recorder.requests += 1
+            self.recorder.samples += samples
+        else:
+            self.recorder.errors += 1
+            self.recorder.endpoint_errors[path] += 1
+
+        if close:
+            self.close()
+        return status
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+            self.writer = None
+
+
+async def board(host, port, device_id, mode, rate, frame_size, deadline, recorder):
+    """One simulated device holding one connection open"""
+    client = Client(host, port, recorder)
+    interval = 1.0 / rate if rate else 0.0
+    seq = 0
+
+    while time.perf_counter() < deadline:
+        started = time.perf_counter()
+        if mode == 'binary':
+            await client.request('POST', '/api/upload/binary', binary_payload(device_id, seq, frame_size),
+                                 'application/octet-stream', samples=frame_size)
+            seq += frame_size
+        elif mode == 'realtime':
+            await client.request('GET', '/api/realtime')
+        else:
+            await client.request('POST', '/api/upload', json_payload(device_id, seq), samples=1)
+            seq += 1
+
+        if interval:
+            await asyncio.sleep(max(0.0, interval - (time.perf_counter() - started)))
+
+    client.close()
+
+
+async def poller(host, port, paths, interval, deadline, recorder):
+    """One dashboard tab polling read endpoints in turn"""
+    client = Client(host, port, recorder)
+    while time.perf_counter() < deadline:
+        started = time.perf_counter()
+        for path in paths:
+            await client.request('GET', path)
+        await asyncio.sleep(max(0.0, interval - (time.perf_counter() - started)))
+    client.close()
+
+
+async def run_load(host='127.0.0.1', port=5000, connections=50, duration=10.0, mode='json', rate=0.0,
+                   frame_size=50, first_device=1, pollers=0, poll_paths=(), poll_interval=1.0):
+    recorder = Recorder()
+    deadline = time.perf_counter() + duration
+    started = time.perf_counter()
+
+    tasks = [board(host, port, first_device + i, mode, rate, frame_size, deadline, recorder)
+             for i in range(connections)]
+    tasks += [poller(host, port, poll_paths, poll_interval, deadline, recorder) for _ in range(pollers)]
+    await asyncio.gather(*tasks)
+
+    results = recorder.summary(time.perf_counter() - started)
+    results.update({'mode': mode, 'target': f'{host}:{port}', 'concurrency': connections})
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Simulate many boards posting to an ingest server')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=5000)
+    parser.add_argument('--connections', type=int, default=50, help='simulated boards, one connection each')
+    parser.add_argument('--duration', type=float, default=10.0, help='seconds')
+    parser.add_argument('--mode', choices=['json', 'binary', 'realtime'], default='json')
+    parser.add_argument('--rate', type=float, default=0.0, help='requests/s per board (0 = unthrottled)')
+    parser.add_argument('--frame-size', type=int, default=50, help='samples per binary frame')
+    args = parser.parse_args()
+
+    results = asyncio.run(run_load(args.host, args.port, args.connections, args.duration,
+                                   args.mode, args.rate, args.frame_size))
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,187 @@
+"""
+In-process metrics exposed in Prometheus text format.
+
+Histograms keep one counter per bucket (bisect + increment under a lock), so
+an observation costs about a microsecond. Timers exist for:
+  - HTTP requests (Flask before_request/after_request hooks)
+  - SQLite statements (TimedConnection, used by storage.get_db_connection)
+  - background loops (worker iterations, write-behind flushes)
+Gauges are read through callbacks at scrape time.
+"""
+
+import re
+import sqlite3
+import threading
+import time
+from bisect import bisect_left
+from functools import lru_cache
+
+# Seconds - covers sub-millisecond SQLite statements up to slow HTTP requests
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+
+def _format_labels(names, values):
+    if not names:
+        return ''
+    pairs = ','.join('{}="{}"'.format(n, str(v).replace('\\', '\\\\').replace('"', '\\"'))
+                     for n, v in zip(names, values))
+    return '{' + pairs + '}'
+
+
+class Histogram:
+    def __init__(self, name, help_text, labels=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *label_values):
+        idx = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][idx] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            snapshot = [(k, list(v[0]), v[1], v[2]) for k, v in self._series.items()]
+        for label_values, counts, total, count in sorted(snapshot):
+            cumulative = 0
+            for bound, n in zip(self.buckets + (float('inf'),), counts):
+                cumulative += n
+                le = '+Inf' if bound == float('inf') else repr(bound)
+                lines.append(f'{self.name}_bucket{_format_labels(self.labels + ("le",), label_values + (le,))} {cumulative}')
+            lines.append(f'{self.name}_sum{_format_labels(self.labels, label_values)} {total}')
+            lines.append(f'{self.name}_count{_format_labels(self.labels, label_values)} {count}')
+        return lines
+
+
+class Gauge:
+    """Value read from a callback at scrape time"""
+
+    def __init__(self, name, help_text, callback):
+        self.name = name
+        self.help = help_text
+        self.callback = callback
+
+    def render(self):
+        try:
+            value = self.callback()
+        except Exception:
+            return []
+        return [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} gauge', f'{self.name} {value}']
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _register(self, metric):
+        with self._lock:
+            return self._metrics.setdefault(metric.name, metric)
+
+    def histogram(self, name, help_text, labels=(), buckets=DEFAULT_BUCKETS):
+        return self._register(Histogram(name, help_text, labels, buckets))
+
+    def gauge(self, name, help_text, callback):
+        """Register (or replace) a callback gauge"""
+        with self._lock:
+            self._metrics[name] = Gauge(name, help_text, callback)
+
+    def render(self):
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+http_request_seconds = REGISTRY.histogram(
+    'http_request_duration_seconds', 'HTTP request latency', ('method', 'endpoint', 'status'))
+db_statement_seconds = REGISTRY.histogram(
+    'sqlite_statement_duration_seconds', 'SQLite execute/executemany time', ('statement',))
+loop_seconds = REGISTRY.histogram(
+    'worker_loop_duration_seconds', 'Background loop iteration time', ('worker',))
+
+
+# SQLite statement timing
+_STATEMENT_RE = re.compile(r'^\s*(INSERT(?:\s+OR\s+\w+)?\s+INTO|SELECT|UPDATE|DELETE\s+FROM|CREATE|PRAGMA|ALTER|\w+)\s*([\w(]*)',
+                           re.IGNORECASE)
+_FROM_RE = re.compile(r'\bFROM\s+(\w+)', re.IGNORECASE)
+
+
+@lru_cache(maxsize=256)
+def statement_label(sql):
+    """Short, low-cardinality label such as 'INSERT sensor_data' or 'SELECT predictions'"""
+    match = _STATEMENT_RE.match(sql)
+    if not match:
+        return 'OTHER'
+    verb = match.group(1).split()[0].upper()
+    if verb == 'SELECT':
+        table = _FROM_RE.search(sql)
+        return f'SELECT {table.group(1)}' if table else 'SELECT'
+    if verb in ('INSERT', 'UPDATE', 'DELETE'):
+        return f'{verb} {match.group(2)}'
+    return verb
+
+
+class TimedCursor(sqlite3.Cursor):
+    def execute(self, sql, *args):
+        started = time.perf_counter()
+        try:
+            return super().execute(sql, *args)
+        finally:
+            db_statement_seconds.observe(time.perf_counter() - started, statement_label(sql))
+
+    def executemany(self, sql, *args):
+        started = time.perf_counter()
+        try:
+            return super().executemany(sql, *args)
+        finally:
+            db_statement_seconds.observe(time.perf_counter() - started, statement_label(sql))
+
+
+class TimedConnection(sqlite3.Connection):
+    """sqlite3.connect(factory=TimedConnection) - every cursor times its statements"""
+
+    def cursor(self, factory=TimedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, *args):
+        return self.cursor().execute(sql, *args)
+
+    def executemany(self, sql, *args):
+        return self.cursor().executemany(sql, *args)
+
+
+def install_flask(app):
+    """Time every request and serve GET /metrics"""
+    from flask import request, g, Response
+
+    @app.before_request
+    def _start_timer():
+        g._metrics_started = time.perf_counter()
+
+    @app.after_request
+    def _record_request(response):
+        started = getattr(g, '_metrics_started', None)
+        if started is not None:
+            endpoint = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+            http_request_seconds.observe(time.perf_counter() - started,
+                                         request.method, endpoint, response.status_code)
+        return response
+
+    @app.route('/metrics')
+    def metrics():
+        return Response(REGISTRY.render(), mimetype=CONTENT_TYPE)
@@ -0,0 +1,361 @@
+"""
+Versioned schema migrations tracked with PRAGMA user_version.
+
+Each migration is either:
+  - schema:   quick DDL, applied in one transaction together with the
+              user_version bump
+  - backfill: data rewrite done in small batches, one short transaction
+              each, so ingestion keeps writing between batches. Backfills
+              select their own remaining work (e.g. WHERE magnitude IS NULL)
+              and are safe to interrupt and resume.
+
+Steps are idempotent so databases created by the old init_db() or by
+database_setup_sqlite.py (user_version 0, any subset of columns) upgrade
+cleanly.
+
+    python migrations.py --db activity_recognition.db            # upgrade
+    python migrations.py --db activity_recognition.db --status
+"""
+
+import argparse
+import json
+import math
+import sqlite3
+import threading
+import time
+from datetime import datetime, timezone
+
+BACKFILL_BATCH = 500
+BACKFILL_PAUSE = 0.01  # seconds between batches - lets writers take the lock
+
+
+def columns(cursor, table):
+    cursor.execute(f"PRAGMA table_info({table})")
+    return {col[1] for col in cursor.fetchall()}
+
+
+def _tables(cursor):
+    cursor.execute("SELECT name FROM sqlite_master WHERE type = 'table'")
+    return {row[0] for row in cursor.fetchall()}
+
+
+def add_column(cursor, table, column, declaration):
+    if column not in columns(cursor, table):
+        print(f"⚠ Adding '{column}' column to {table} table...")
+        cursor.execute(f'ALTER TABLE {table} ADD COLUMN {column} {declaration}')
+
+
+# Migrations
+def base_schema(cursor):
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS sensor_data (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            ax REAL NOT NULL,
+            ay REAL NOT NULL,
+            az REAL NOT NULL,
+            magnitude REAL,
+            timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS predictions (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            activity TEXT NOT NULL,
+            confidence REAL,
+            source TEXT DEFAULT 'device',
+            timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+    # Databases from database_setup_sqlite.py predate these columns
+    add_column(cursor, 'sensor_data', 'magnitude', 'REAL')
+    add_column(cursor, 'predictions', 'source', "TEXT DEFAULT 'device'")
+
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_sensor_timestamp ON sensor_data(timestamp DESC)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_predictions_timestamp ON predictions(timestamp DESC)')
+
+
+def sensor_sequence_numbers(cursor):
+    add_column(cursor, 'sensor_data', 'device_id', "TEXT DEFAULT 'default'")
+    add_column(cursor, 'sensor_data', 'seq', 'INTEGER')
+
+    # Backstop for retries older than the in-memory dedup window
+    cursor.execute('''
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_sensor_device_seq
+        ON sensor_data(device_id, seq) WHERE seq IS NOT NULL
+    ''')
+
+
+def backfill_magnitude(conn, batch_size):
+    """Compute magnitude for one batch of legacy rows. Returns rows updated.
+
+    Legacy ax/ay/az are nullable; rows missing an axis keep a NULL magnitude.
+    """
+    rows = conn.execute('''
+        SELECT id, ax, ay, az FROM sensor_data
+        WHERE magnitude IS NULL AND ax IS NOT NULL AND ay IS NOT NULL AND az IS NOT NULL
+        ORDER BY id
+        LIMIT ?
+    ''', (batch_size,)).fetchall()
+
+    if rows:
+        conn.executemany('UPDATE sensor_data SET magnitude = ? WHERE id = ?',
+                         [(math.sqrt(ax * ax + ay * ay + az * az), row_id) for row_id, ax, ay, az in rows])
+    return len(rows)
+
+
+# Frozen copy of features.FEATURE_NAMES at the time window_features was added
+WINDOW_FEATURE_COLUMNS = [f'{axis}_{stat}' for axis in ('ax', 'ay', 'az', 'gx', 'gy', 'gz')
+                          for stat in ('mean', 'std', 'min', 'max', 'median')]
+
+
+def window_feature_store(cursor):
+    add_column(cursor, 'sensor_data', 'gx', 'REAL')
+    add_column(cursor, 'sensor_data', 'gy', 'REAL')
+    add_column(cursor, 'sensor_data', 'gz', 'REAL')
+
+    feature_columns = ',\n'.join(f'            {name} REAL' for name in WINDOW_FEATURE_COLUMNS)
+    cursor.execute(f'''
+        CREATE TABLE IF NOT EXISTS window_features (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            device_id TEXT NOT NULL,
+            first_seq INTEGER,
+            last_seq INTEGER,
+            start_ts DATETIME,
+            end_ts DATETIME,
+            n_samples INTEGER NOT NULL,
+            complete INTEGER NOT NULL DEFAULT 1,
+{feature_columns},
+            mag_mean REAL,
+            mag_var REAL,
+            mag_max REAL
+        )
+    ''')
+
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_features_device ON window_features(device_id, id DESC)')
+    cursor.execute('''
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_features_device_seq
+        ON window_features(device_id, last_seq) WHERE last_seq IS NOT NULL
+    ''')
+
+
+def prediction_provenance(cursor):
+    # Which device and which sensor row a prediction was made for (rescoring, sharding)
+    add_column(cursor, 'predictions', 'device_id', 'TEXT')
+    add_column(cursor, 'predictions', 'window_end_id', 'INTEGER')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_predictions_source ON predictions(source, window_end_id)')
+
+
+def activity_segments(cursor):
+    created = 'activity_segments' not in _tables(cursor)
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS activity_segments (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            device_id TEXT NOT NULL,
+            source TEXT NOT NULL,
+            activity TEXT NOT NULL,
+            start_ts DATETIME NOT NULL,
+            end_ts DATETIME NOT NULL,
+            n_samples INTEGER NOT NULL,
+            mean_confidence REAL
+        )
+    ''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_segments_device ON activity_segments(device_id, source, end_ts DESC)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_segments_end ON activity_segments(end_ts DESC)')
+
+    # Predictions stored before the table existed are compacted by the next backfill
+    if created:
+        cursor.execute('CREATE TABLE IF NOT EXISTS segment_backfill (cutoff INTEGER, last_id INTEGER, open TEXT)')
+        cursor.execute("INSERT INTO segment_backfill SELECT COALESCE(MAX(id), 0), 0, '{}' FROM predictions")
+
+
+# Frozen copy of segments.MAX_GAP at the time the backfill was added
+SEGMENT_GAP_SECONDS = 60
+
+
+def _parse_ts(ts):
+    parsed = datetime.fromisoformat(ts)
+    return parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
+
+
+def backfill_activity_segments(conn, batch_size):
+    """Fold one batch of pre-existing predictions into activity_segments (no smoothing)"""
+    if 'segment_backfill' not in _tables(conn.cursor()):
+        return 0
+    state = conn.execute('SELECT cutoff, last_id, open FROM segment_backfill').fetchone()
+    if state is None:
+        conn.execute('DROP TABLE segment_backfill')
+        return 0
+    cutoff, last_id, open_segments = state[0], state[1], json.loads(state[2])
+
+    rows = conn.execute('''
+        SELECT id, COALESCE(device_id, 'default'), COALESCE(source, 'device'), activity, confidence, timestamp
+        FROM predictions
+        WHERE id > ? AND id <= ? AND source IS NOT 'rescore' AND timestamp IS NOT NULL
+        ORDER BY id
+        LIMIT ?
+    ''', (last_id, cutoff, batch_size)).fetchall()
+    if not rows:
+        conn.execute('DROP TABLE segment_backfill')
+        return 0
+
+    for _, device_id, source, activity, confidence, ts in rows:
+        key = f'{device_id}\x1f{source}'
+        current = open_segments.get(key)
+        if (current and current[1] == activity
+                and (_parse_ts(ts) - _parse_ts(current[2])).total_seconds() <= SEGMENT_GAP_SECONDS):
+            conn.execute('''
+                UPDATE activity_segments
+                SET end_ts = MAX(end_ts, ?), start_ts = MIN(start_ts, ?),
+                    mean_confidence = (mean_confidence * n_samples + ?) / (n_samples + 1),
+                    n_samples = n_samples + 1
+                WHERE id = ?
+            ''', (ts, ts, confidence or 0.0, current[0]))
+            current[2] = max(current[2], ts)
+        else:
+            cursor = conn.execute('''
+                INSERT INTO activity_segments (device_id, source, activity, start_ts, end_ts, n_samples, mean_confidence)
+                VALUES (?, ?, ?, ?, ?, 1, ?)
+            ''', (device_id, source, activity, ts, ts, confidence or 0.0))
+            open_segments[key] = [cursor.lastrowid, activity, ts]
+
+    conn.execute('UPDATE segment_backfill SET last_id = ?, open = ?', (rows[-1][0], json.dumps(open_segments)))
+    return len(rows)
+
+
+# (version, name, kind, function) - append only, never renumber
+MIGRATIONS = [
+    (1, 'base_schema', 'schema', base_schema),
+    (2, 'sensor_sequence_numbers', 'schema', sensor_sequence_numbers),
+    (3, 'backfill_magnitude', 'backfill', backfill_magnitude),
+    (4, 'window_feature_store', 'schema', window_feature_store),
+    (5, 'prediction_provenance', 'schema', prediction_provenance),
+    (6, 'activity_segments', 'schema', activity_segments),
+    (7, 'backfill_activity_segments', 'backfill', backfill_activity_segments),
+]
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+
+def current_version(conn):
+    return conn.execute('PRAGMA user_version').fetchone()[0]
+
+
+def _set_version(conn, version):
+    conn.execute(f'PRAGMA user_version = {int(version)}')
+
+
+def _run_schema(conn, version, fn):
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        fn(conn.cursor())
+        if version is not None:
+            _set_version(conn, version)
+        conn.execute('COMMIT')
+    except Exception:
+        conn.execute('ROLLBACK')
+        raise
+
+
+def _run_backfill(conn, version, fn, batch_size, pause):
+    total = 0
+    while True:
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            updated = fn(conn, batch_size)
+            if updated == 0:
+                _set_version(conn, version)
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        if updated == 0:
+            return total
+        total += updated
+        time.sleep(pause)
+
+
+def _apply(conn, pending, batch_size, pause):
+    for version, name, kind, fn in pending:
+        if kind == 'schema':
+            _run_schema(conn, version, fn)
+            print(f"✅ Migration {version} ({name}) applied")
+        else:
+            total = _run_backfill(conn, version, fn, batch_size, pause)
+            print(f"✅ Migration {version} ({name}) backfilled {total} rows")
+
+
+def migrate(db_path, batch_size=BACKFILL_BATCH, pause=BACKFILL_PAUSE, background_backfills=False):
+    """Bring the database at db_path up to LATEST_VERSION.
+
+    With background_backfills=True, all schema steps run now and everything
+    from the first backfill onward continues on a daemon thread (returned).
+    """
+    # isolation_level=None: transactions are managed explicitly above
+    conn = sqlite3.connect(db_path, timeout=10.0, isolation_level=None, check_same_thread=False)
+    conn.execute('PRAGMA journal_mode=WAL')
+
+    version = current_version(conn)
+    pending = [m for m in MIGRATIONS if m[0] > version]
+    if not pending:
+        conn.close()
+        return None
+
+    split = next((i for i, m in enumerate(pending) if m[2] == 'backfill'), len(pending))
+    if not background_backfills:
+        split = len(pending)
+
+    try:
+        _apply(conn, pending[:split], batch_size, pause)
+    except Exception:
+        conn.close()
+        raise
+
+    if split == len(pending):
+        conn.close()
+        return None
+
+    # Schema steps are idempotent DDL: apply the later ones now as well, so
+    # the app never writes to missing columns. The background pass re-runs
+    # them in order and bumps user_version.
+    try:
+        for version, name, kind, fn in pending[split:]:
+            if kind == 'schema':
+                _run_schema(conn, None, fn)
+    except Exception:
+        conn.close()
+        raise
+
+    def run_rest():
+        try:
+            _apply(conn, pending[split:], batch_size, pause)
+        except Exception as e:
+            print(f"⚠ Background migration stopped: {e}")
+        finally:
+            conn.close()
+
+    thread = threading.Thread(target=run_rest, daemon=True, name="MigrationBackfill")
+    thread.start()
+    return thread
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Upgrade the activity recognition database')
+    parser.add_argument('--db', required=True)
+    parser.add_argument('--batch', type=int, default=BACKFILL_BATCH)
+    parser.add_argument('--pause', type=float, default=BACKFILL_PAUSE)
+    parser.add_argument('--status', action='store_true', help='print the schema version and exit')
+    args = parser.parse_args()
+
+    if args.status:
+        conn = sqlite3.connect(args.db)
+        print(f"user_version = {current_version(conn)} (latest {LATEST_VERSION})")
+        conn.close()
+        return
+
+    migrate(args.db, args.batch, args.pause)
+
+
+if __name__ == '__main__':
+    main()
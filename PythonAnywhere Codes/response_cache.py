@@ -0,0 +1,147 @@
+"""
+Read-through response cache for the dashboard's polling endpoints.
+
+Writes call data_version.bump(). A cached response is reused while the
+version it was built at is still current, keyed on path + query string, so
+any number of viewers polling /api/stats between two uploads cost one query.
+Concurrent misses for the same key wait for a single build.
+
+Responses carry an ETag (hash of the body) and Last-Modified (time of the
+write they reflect); a matching If-None-Match or If-Modified-Since gets an
+empty 304.
+
+Writes made by other processes (another web worker, rescore.py, a backfill)
+do not bump this process's counter, so entries also expire after
+ACTIVITY_CACHE_TTL seconds (default 2).
+
+Usage:
+    @app.route('/api/stats')
+    @response_cache.cached
+    def get_stats(): ...
+"""
+
+import functools
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+
+from flask import current_app, request
+
+CACHE_TTL = float(os.environ.get('ACTIVITY_CACHE_TTL', '2'))
+CACHE_SIZE = 256
+
+
+class DataVersion:
+    """Counter bumped by every write, with the time of the last bump"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.value = 0
+        self.modified = datetime.now(timezone.utc).replace(microsecond=0)
+
+    def bump(self):
+        with self._lock:
+            self.value += 1
+            self.modified = datetime.now(timezone.utc).replace(microsecond=0)
+
+    def current(self):
+        with self._lock:
+            return self.value, self.modified
+
+
+class ResponseCache:
+    def __init__(self, version, ttl=CACHE_TTL, maxsize=CACHE_SIZE):
+        self.version = version
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self.not_modified = 0
+        self._entries = OrderedDict()   # key -> (version, built_at, body, mimetype, etag, modified)
+        self._lock = threading.Lock()
+        self._building = {}             # key -> Lock held while one request builds it
+
+    def _lookup(self, key, version):
+        entry = self._entries.get(key)
+        if entry is None or entry[0] != version or time.monotonic() - entry[1] > self.ttl:
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    def _store(self, key, entry):
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def _build(self, view, args, kwargs, version, modified):
+        response = current_app.make_response(view(*args, **kwargs))
+        if response.status_code != 200:
+            return None, response
+        body = response.get_data()
+        etag = hashlib.blake2b(body, digest_size=8).hexdigest()
+        return (version, time.monotonic(), body, response.mimetype, etag, modified), None
+
+    def _respond(self, entry):
+        _, _, body, mimetype, etag, modified = entry
+        response = current_app.response_class(body, mimetype=mimetype)
+        response.set_etag(etag)
+        response.last_modified = modified
+        response.make_conditional(request)
+        if response.status_code == 304:
+            self.not_modified += 1
+        return response
+
+    def cached(self, view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            key = (request.path, request.query_string)
+            version, modified = self.version.current()
+
+            with self._lock:
+                entry = self._lookup(key, version)
+                if entry is None:
+                    building = self._building.setdefault(key, threading.Lock())
+            if entry is not None:
+                self.hits += 1
+                return self._respond(entry)
+
+            with building:
+                # Another request may have built it while we waited
+                with self._lock:
+                    entry = self._lookup(key, version)
+                if entry is not None:
+                    self.hits += 1
+                    return self._respond(entry)
+
+                self.misses += 1
+                try:
+                    entry, uncached = self._build(view, args, kwargs, version, modified)
+                finally:
+                    with self._lock:
+                        if entry is not None:
+                            self._store(key, entry)
+                        self._building.pop(key, None)
+                if entry is None:
+                    return uncached
+            return self._respond(entry)
+
+        return wrapper
+
+    def stats(self):
+        with self._lock:
+            size = len(self._entries)
+        return {
+            'entries': size,
+            'hits': self.hits,
+            'misses': self.misses,
+            'not_modified': self.not_modified,
+            'version': self.version.current()[0]
+        }
+
+
+data_version = DataVersion()
+response_cache = ResponseCache(data_version)
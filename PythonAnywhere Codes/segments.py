@@ -0,0 +1,211 @@
+"""
+Activity segments: runs of one activity per device and prediction source.
+
+Instead of reading one predictions row per sample, history and stats read
+activity_segments rows (start_ts, end_ts, activity, n_samples,
+mean_confidence). The open segment of a device is extended in place with an
+UPDATE while the activity stays the same; a new row starts when it changes
+or after MAX_GAP seconds without predictions.
+
+Hysteresis (ACTIVITY_SEGMENT_MIN_RUN, default 1 = off): a different activity
+has to be reported MIN_RUN times in a row before a new segment starts.
+Shorter flickers are counted in the surrounding segment. Candidate samples
+are held in memory until that decision, so segments can trail predictions
+by up to MIN_RUN - 1 samples per device.
+
+Segments cover live predictions only (source='rescore' is skipped).
+`python segments.py --db ... --rebuild` recomputes the table from predictions.
+"""
+
+import argparse
+import os
+import sqlite3
+import threading
+from datetime import datetime, timezone
+
+MIN_RUN = max(1, int(os.environ.get('ACTIVITY_SEGMENT_MIN_RUN', '1')))
+MAX_GAP = float(os.environ.get('ACTIVITY_SEGMENT_GAP', '60'))  # seconds
+
+
+def _parse_ts(ts):
+    parsed = datetime.fromisoformat(ts)
+    return parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
+
+
+class _Open:
+    """In-memory view of a device's open segment plus pending candidate samples"""
+
+    def __init__(self, device_id, source, segment_id=None, activity=None, end_ts=None):
+        self.device_id = device_id
+        self.source = source
+        self.segment_id = segment_id
+        self.activity = activity
+        self.end = _parse_ts(end_ts) if end_ts else None
+        self.pending = []   # (activity, confidence, timestamp) of a possible new activity
+
+
+class SegmentTracker:
+    def __init__(self, min_run=MIN_RUN, max_gap=MAX_GAP):
+        self.min_run = max(1, min_run)
+        self.max_gap = max_gap
+        self._open = {}
+        self._lock = threading.Lock()
+
+    def _state(self, cursor, device_id, source):
+        key = (device_id, source)
+        state = self._open.get(key)
+        if state is None:
+            cursor.execute('''
+                SELECT id, activity, end_ts FROM activity_segments
+                WHERE device_id = ? AND source = ?
+                ORDER BY end_ts DESC
+                LIMIT 1
+            ''', (device_id, source))
+            row = cursor.fetchone()
+            state = _Open(device_id, source, *row) if row else _Open(device_id, source)
+            self._open[key] = state
+        return state
+
+    def _extend(self, cursor, state, samples):
+        if state.segment_id is not None:
+            timestamps = [s[2] for s in samples]
+            cursor.execute('''
+                UPDATE activity_segments
+                SET end_ts = MAX(end_ts, ?), start_ts = MIN(start_ts, ?),
+                    mean_confidence = (mean_confidence * n_samples + ?) / (n_samples + ?),
+                    n_samples = n_samples + ?
+                WHERE id = ?
+            ''', (max(timestamps), min(timestamps), sum(s[1] for s in samples), len(samples), len(samples),
+                  state.segment_id))
+            if cursor.rowcount:
+                state.end = max(state.end, _parse_ts(max(timestamps)))
+                return
+        # Segment gone (rolled back, rebuilt): start over with these samples
+        self._start(cursor, state, samples, samples[0][0])
+
+    def _start(self, cursor, state, samples, activity):
+        timestamps = [s[2] for s in samples]
+        cursor.execute('''
+            INSERT INTO activity_segments (device_id, source, activity, start_ts, end_ts, n_samples, mean_confidence)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        ''', (state.device_id, state.source, activity, min(timestamps), max(timestamps),
+              len(samples), sum(s[1] for s in samples) / len(samples)))
+        state.segment_id = cursor.lastrowid
+        state.activity = activity
+        state.end = _parse_ts(max(timestamps))
+
+    def record(self, cursor, activity, confidence, source, timestamp, device_id='default'):
+        """Fold one prediction into its device's segments (call inside the insert transaction)"""
+        device_id = device_id or 'default'
+        sample = (activity, float(confidence or 0.0), timestamp)
+
+        with self._lock:
+            state = self._state(cursor, device_id, source)
+
+            if state.segment_id is None or (_parse_ts(timestamp) - state.end).total_seconds() > self.max_gap:
+                if state.pending and state.segment_id is not None:
+                    self._extend(cursor, state, state.pending)
+                state.pending = []
+                self._start(cursor, state, [sample], activity)
+            elif activity == state.activity:
+                self._extend(cursor, state, state.pending + [sample])
+                state.pending = []
+            else:
+                if state.pending and state.pending[0][0] != activity:
+                    # A different flicker: the earlier candidate was noise
+                    self._extend(cursor, state, state.pending)
+                    state.pending = []
+                state.pending.append(sample)
+                if len(state.pending) >= self.min_run:
+                    self._start(cursor, state, state.pending, activity)
+                    state.pending = []
+
+    def record_rows(self, cursor, rows):
+        """Prediction row tuples (activity, confidence, source, timestamp, device_id)"""
+        for row in rows:
+            self.record(cursor, row[0], row[1], row[2], row[3], row[4] if len(row) > 4 else 'default')
+
+    def flush(self, cursor):
+        """Count undecided candidate samples in their current segments"""
+        with self._lock:
+            for state in self._open.values():
+                if state.pending:
+                    self._extend(cursor, state, state.pending)
+                    state.pending = []
+
+    def reset(self):
+        """Forget cached segment ids, e.g. after a rollback"""
+        with self._lock:
+            self._open.clear()
+
+
+def fetch_segments(cursor, since=None, device_id=None, limit=100):
+    """Segments ending at or after `since`, newest first"""
+    query = '''
+        SELECT device_id, source, activity, start_ts, end_ts, n_samples, mean_confidence
+        FROM activity_segments
+        WHERE end_ts >= ?
+    '''
+    params = [since or '']
+    if device_id is not None:
+        query += ' AND device_id = ?'
+        params.append(device_id)
+    query += ' ORDER BY end_ts DESC LIMIT ?'
+    params.append(limit)
+    cursor.execute(query, params)
+    return cursor.fetchall()
+
+
+def activity_counts(cursor, since=None):
+    """{activity: samples} over segments ending at or after `since`"""
+    cursor.execute('''
+        SELECT activity, SUM(n_samples) FROM activity_segments
+        WHERE end_ts >= ?
+        GROUP BY activity
+    ''', (since or '',))
+    return {row[0]: row[1] for row in cursor.fetchall()}
+
+
+def rebuild(db_path, min_run=MIN_RUN, max_gap=MAX_GAP, batch_size=5000):
+    """Recompute activity_segments from predictions, streaming rows in id order"""
+    conn = sqlite3.connect(db_path, timeout=10.0)
+    read = conn.cursor()
+    write = conn.cursor()
+
+    write.execute('DELETE FROM activity_segments')
+    write.execute('DROP TABLE IF EXISTS segment_backfill')
+    tracker = SegmentTracker(min_run, max_gap)
+
+    read.execute('''
+        SELECT activity, confidence, COALESCE(source, 'device'), timestamp, COALESCE(device_id, 'default')
+        FROM predictions
+        WHERE source IS NOT 'rescore' AND timestamp IS NOT NULL
+        ORDER BY id
+    ''')
+    while True:
+        batch = read.fetchmany(batch_size)
+        if not batch:
+            break
+        tracker.record_rows(write, batch)
+        conn.commit()
+    tracker.flush(write)
+
+    count = write.execute('SELECT COUNT(*) FROM activity_segments').fetchone()[0]
+    conn.commit()
+    conn.close()
+    return count
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Maintain the activity_segments table')
+    parser.add_argument('--db', required=True)
+    parser.add_argument('--rebuild', action='store_true', help='recompute every segment from predictions')
+    parser.add_argument('--min-run', type=int, default=MIN_RUN, help='hysteresis for --rebuild (1 = off)')
+    args = parser.parse_args()
+
+    if args.rebuild:
+        print(f"✓ Rebuilt {rebuild(args.db, args.min_run)} activity segments")
+
+
+if __name__ == '__main__':
+    main()
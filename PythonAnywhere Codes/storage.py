@@ -0,0 +1,67 @@
+"""
+SQLite storage layer shared by the Flask app, the ASGI front end and the
+write-behind writer.
+"""
+
+import os
+import sqlite3
+
+from metrics import TimedConnection
+from migrations import migrate
+
+DB_PATH = os.environ.get('ACTIVITY_DB_PATH', '/home/cathlynramo/iot/activity_recognition.db')
+
+# Column order of a sensor row tuple everywhere in the ingest pipeline
+SENSOR_COLUMNS = ('ax', 'ay', 'az', 'magnitude', 'device_id', 'seq', 'timestamp', 'gx', 'gy', 'gz')
+PREDICTION_COLUMNS = ('activity', 'confidence', 'source', 'timestamp', 'device_id')
+
+
+def get_db_connection(path=None):
+    conn = sqlite3.connect(path or DB_PATH, timeout=10.0, factory=TimedConnection)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode=WAL")
+    return conn
+
+
+def init_db(tracker=None):
+    """Upgrade the schema (backfills continue in the background) and seed the sequence tracker"""
+    migrate(DB_PATH, background_backfills=True)
+
+    if tracker is not None:
+        conn = get_db_connection()
+        cursor = conn.cursor()
+        cursor.execute('SELECT device_id, MAX(seq) AS last_seq FROM sensor_data WHERE seq IS NOT NULL GROUP BY device_id')
+        for row in cursor.fetchall():
+            tracker.seed(row['device_id'], row['last_seq'])
+        conn.close()
+
+
+def insert_sensor_rows(cursor, rows):
+    """Insert sensor row tuples, skipping (device_id, seq) already stored. Returns rows written."""
+    if not rows:
+        return 0
+    cursor.executemany('''
+        INSERT OR IGNORE INTO sensor_data (ax, ay, az, magnitude, device_id, seq, timestamp, gx, gy, gz)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ''', rows)
+    return cursor.rowcount
+
+
+def insert_predictions(cursor, rows):
+    if not rows:
+        return 0
+    cursor.executemany('''
+        INSERT INTO predictions (activity, confidence, source, timestamp, device_id)
+        VALUES (?, ?, ?, ?, ?)
+    ''', rows)
+    return cursor.rowcount
+
+
+def fetch_latest_prediction(cursor):
+    cursor.execute('''
+        SELECT activity, confidence, source, timestamp
+        FROM predictions
+        ORDER BY timestamp DESC
+        LIMIT 1
+    ''')
+    return cursor.fetchone()
@@ -0,0 +1,124 @@
+"""
+Buffered structured logging.
+
+Request threads only put LogRecords on a bounded queue (QueueHandler); one
+background QueueListener thread formats them as JSON lines and writes to
+stderr. When the queue is full the record is dropped and counted rather than
+blocking the request.
+
+Environment:
+    ACTIVITY_LOG_LEVEL    DEBUG / INFO / WARNING ... (default INFO)
+    ACTIVITY_LOG_SAMPLE   keep 1 in N per-sample debug lines (default 100)
+
+Usage:
+    log = get_logger(__name__)
+    log.info('stored', extra={'fields': {'activity': label}})
+    log.debug('received', extra={'fields': data, 'sampled': True})
+"""
+
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+import threading
+
+LOG_LEVEL = os.environ.get('ACTIVITY_LOG_LEVEL', 'INFO').upper()
+SAMPLE_EVERY = max(1, int(os.environ.get('ACTIVITY_LOG_SAMPLE', '100')))
+QUEUE_SIZE = 10000
+
+_listener = None
+_setup_lock = threading.Lock()
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            'ts': self.formatTime(record, '%Y-%m-%dT%H:%M:%S'),
+            'level': record.levelname,
+            'logger': record.name,
+            'msg': record.getMessage()
+        }
+        fields = getattr(record, 'fields', None)
+        if fields:
+            entry.update(fields)
+        if record.exc_info:
+            entry['exc'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class SampleFilter(logging.Filter):
+    """Pass 1 in `every` records marked sampled=True, per message"""
+
+    def __init__(self, every=SAMPLE_EVERY):
+        super().__init__()
+        self.every = every
+        self._counts = {}
+
+    def filter(self, record):
+        if not getattr(record, 'sampled', False):
+            return True
+        n = self._counts.get(record.msg, 0)
+        self._counts[record.msg] = n + 1
+        if n % self.every:
+            return False
+        record.fields = dict(getattr(record, 'fields', None) or {}, sample_rate=self.every)
+        return True
+
+
+class NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record):
+        # Formatting happens in the listener thread, not here
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+def setup_logging():
+    """Install the queue handler on the root logger once per process"""
+    global _listener
+
+    with _setup_lock:
+        if _listener is not None:
+            return
+
+        log_queue = queue.Queue(maxsize=QUEUE_SIZE)
+        stream = logging.StreamHandler(sys.stderr)
+        stream.setFormatter(JsonFormatter())
+
+        handler = NonBlockingQueueHandler(log_queue)
+        # Sampling runs in the caller so skipped records never reach the queue
+        handler.addFilter(SampleFilter())
+
+        root = logging.getLogger()
+        root.setLevel(getattr(logging, LOG_LEVEL, logging.INFO))
+        root.addHandler(handler)
+
+        _listener = logging.handlers.QueueListener(log_queue, stream, respect_handler_level=True)
+        _listener.start()
+        atexit.register(shutdown_logging)
+
+
+def shutdown_logging():
+    """Flush queued records and stop the writer thread"""
+    global _listener
+
+    with _setup_lock:
+        if _listener is not None:
+            _listener.stop()
+            _listener = None
+
+
+def get_logger(name):
+    setup_logging()
+    return logging.getLogger(name)
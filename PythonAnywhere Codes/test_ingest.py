@@ -0,0 +1,223 @@
+"""
+Sequence tracking across failed writes.
+
+    python -m pytest test_ingest.py
+"""
+
+import asyncio
+import json
+import os
+import sqlite3
+import tempfile
+import time
+import unittest
+from unittest import mock
+
+import numpy as np
+
+import storage
+from feature_store import WindowAccumulator
+from ingest import SequenceTracker
+from migrations import migrate
+from wire_protocol import encode_frame
+from write_behind import WriteBehindWriter
+
+
+class ForgetTest(unittest.TestCase):
+    def test_forgotten_seq_is_accepted_again(self):
+        tracker = SequenceTracker()
+        self.assertTrue(tracker.accept('dev', 1))
+        tracker.forget('dev', 1)
+        self.assertTrue(tracker.accept('dev', 1))
+        self.assertEqual(tracker.stats()['dev']['duplicates'], 0)
+        self.assertEqual(tracker.stats()['dev']['received'], 1)
+
+    def test_forget_rewinds_a_gap(self):
+        tracker = SequenceTracker()
+        tracker.accept('dev', 1)
+        tracker.accept('dev', 5)
+        tracker.forget('dev', 5)
+        stats = tracker.stats()['dev']
+        self.assertEqual((stats['last_seq'], stats['missing'], stats['gap_events']), (1, 0, 0))
+
+
+class FailedWriteTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.tmp.name, 'activity.db')
+        patcher = mock.patch.object(storage, 'DB_PATH', self.db_path)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(self.tmp.cleanup)
+
+        import flask_app_complete
+        self.app = flask_app_complete
+        self.app.sequence_tracker = SequenceTracker()
+        self.app.window_accumulator = WindowAccumulator()
+        storage.init_db(self.app.sequence_tracker)
+        self.client = self.app.app.test_client()
+
+    def stored_seqs(self):
+        conn = sqlite3.connect(self.db_path)
+        try:
+            return [row[0] for row in conn.execute('SELECT seq FROM sensor_data ORDER BY seq')]
+        finally:
+            conn.close()
+
+    def test_retry_after_failed_write_is_stored(self):
+        sample = {'ax': 0.1, 'ay': 0.2, 'az': 9.8, 'activity': 'walking', 'device_id': 'dev', 'seq': 7}
+        real_insert = self.app.insert_predictions
+        calls = []
+
+        def fail_once(cursor, rows):
+            calls.append(rows)
+            if len(calls) == 1:
+                raise sqlite3.OperationalError('disk I/O error')
+            return real_insert(cursor, rows)
+
+        with mock.patch.object(self.app, 'insert_predictions', fail_once):
+            first = self.client.post('/api/upload', json=sample)
+            retry = self.client.post('/api/upload', json=sample)
+
+        self.assertEqual(first.status_code, 500)
+        self.assertEqual(retry.status_code, 200)
+        self.assertEqual(retry.get_json()['status'], 'success')
+        self.assertEqual(self.stored_seqs(), [7])
+
+    def test_retry_after_failed_write_completes_the_window_once(self):
+        sample = {'ax': 0.1, 'ay': 0.2, 'az': 9.8, 'activity': 'walking', 'device_id': 'dev'}
+        for seq in range(49):
+            self.client.post('/api/upload', json=dict(sample, seq=seq))
+
+        real_insert = self.app.insert_feature_rows
+        calls = []
+
+        # Fails after the accumulator emitted the window
+        def fail_once(cursor, rows):
+            calls.append(rows)
+            if len(calls) == 1:
+                raise sqlite3.OperationalError('disk I/O error')
+            return real_insert(cursor, rows)
+
+        with mock.patch.object(self.app, 'insert_feature_rows', fail_once):
+            self.assertEqual(self.client.post('/api/upload', json=dict(sample, seq=49)).status_code, 500)
+            self.assertEqual(self.client.post('/api/upload', json=dict(sample, seq=49)).status_code, 200)
+
+        conn = sqlite3.connect(self.db_path)
+        try:
+            windows = conn.execute('SELECT first_seq, last_seq, complete FROM window_features').fetchall()
+        finally:
+            conn.close()
+        self.assertEqual(windows, [(0, 49, 1)])
+
+    def test_frame_retry_after_failed_write_is_stored(self):
+        frame = encode_frame(3, 100, 50, np.ones((4, 6)), activity='walking')
+        real_insert = self.app.insert_predictions
+        calls = []
+
+        def fail_once(cursor, rows):
+            calls.append(rows)
+            if len(calls) == 1:
+                raise sqlite3.OperationalError('disk I/O error')
+            return real_insert(cursor, rows)
+
+        with mock.patch.object(self.app, 'insert_predictions', fail_once):
+            first = self.client.post('/api/upload/binary', data=frame)
+            retry = self.client.post('/api/upload/binary', data=frame)
+
+        self.assertEqual(first.status_code, 500)
+        self.assertEqual(retry.get_json()['samples'], 4)
+        self.assertEqual(self.stored_seqs(), [100, 101, 102, 103])
+
+
+class WriteBehindTest(unittest.TestCase):
+    def row(self, seq, device_id='dev'):
+        return (0.1, 0.2, 9.8, 9.8, device_id, seq, '2024-01-01T00:00:00+00:00', None, None, None)
+
+    def test_full_queue_releases_seqs(self):
+        tracker = SequenceTracker()
+        writer = WriteBehindWriter(tracker=tracker, maxsize=1)
+        tracker.accept('dev', 1)
+        self.assertTrue(writer.submit({'dev': [self.row(1)]}))
+
+        tracker.accept('a', 5)
+        tracker.accept('b', 9)
+        self.assertFalse(writer.submit({'a': [self.row(5, 'a')], 'b': [self.row(9, 'b')]}))
+        self.assertTrue(tracker.accept('a', 5))
+        self.assertTrue(tracker.accept('b', 9))
+        self.assertFalse(tracker.accept('dev', 1))
+
+    def test_failed_flush_releases_seqs(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            db_path = os.path.join(tmp, 'activity.db')
+            migrate(db_path)
+            tracker = SequenceTracker()
+            writer = WriteBehindWriter(tracker=tracker, db_path=db_path, flush_interval=0.01)
+
+            with mock.patch('write_behind.insert_predictions', side_effect=sqlite3.OperationalError('disk I/O error')):
+                writer.start()
+                tracker.accept('dev', 1)
+                writer.submit({'dev': [self.row(1)]}, [('Walking', 0.8, 'device', 't', 'dev')])
+                deadline = time.time() + 5
+                while writer.rows_dropped == 0 and time.time() < deadline:
+                    time.sleep(0.01)
+                writer.stop()
+
+            self.assertEqual(writer.rows_dropped, 2)
+            self.assertTrue(tracker.accept('dev', 1))
+
+
+class AsgiQueueFullTest(unittest.TestCase):
+    def test_retry_after_queue_full_is_queued(self):
+        import asgi_app
+        tracker = SequenceTracker()
+        writer = WriteBehindWriter(tracker=tracker, maxsize=1)
+        writer.submit_predictions([('Idle', 0.75, 'device', 't', 'other')])
+        body = json.dumps({'ax': 0.1, 'ay': 0.2, 'az': 9.8, 'device_id': 'dev', 'seq': 3}).encode()
+
+        with mock.patch.object(asgi_app, 'sequence_tracker', tracker), mock.patch.object(asgi_app, 'writer', writer):
+            status, _ = asyncio.run(asgi_app.upload_sensor_data(body))
+            self.assertEqual(status, 503)
+            writer._queue.get_nowait()
+            status, payload = asyncio.run(asgi_app.upload_sensor_data(body))
+
+        self.assertEqual((status, payload['status']), (200, 'success'))
+
+
+class UdpGatewayTest(unittest.TestCase):
+    class Transport:
+        def __init__(self):
+            self.sent = []
+
+        def sendto(self, data, addr):
+            self.sent.append(data)
+
+    def setUp(self):
+        from udp_gateway import IngestProtocol
+        self.tracker = SequenceTracker()
+        self.writer = WriteBehindWriter(tracker=self.tracker, maxsize=1)
+        self.protocol = IngestProtocol(self.tracker, self.writer)
+        self.transport = self.Transport()
+        self.protocol.connection_made(self.transport)
+
+    def test_frames_not_queued_are_not_acked(self):
+        datagram = encode_frame(1, 0, 50, np.ones((2, 6))) + encode_frame(2, 0, 50, np.ones((2, 6)))
+        self.writer.submit_predictions([('Idle', 0.75, 'device', 't', 'other')])
+        self.protocol.datagram_received(datagram, ('127.0.0.1', 1))
+        self.assertEqual((self.transport.sent, self.protocol.dropped), ([], 2))
+
+        # Room for one more item: the first frame is queued and acked, the second is not
+        self.writer._queue.get_nowait()
+        self.protocol.datagram_received(datagram, ('127.0.0.1', 1))
+        self.assertEqual(len(self.transport.sent), 1)
+        self.assertEqual(self.protocol.dropped, 3)
+        self.assertTrue(self.tracker.accept('2', 0))
+
+    def test_malformed_json_is_rejected(self):
+        for body in [b'{"ax": 1, "ay": 1, "az": 1, "activity": null}', b'{"ax": [1], "ay": 1, "az": 1}', b'{"ax": 1}']:
+            self.protocol.datagram_received(body, ('127.0.0.1', 1))
+        self.assertEqual(self.protocol.rejected, 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,58 @@
+"""
+Upgrading databases created by the original database_setup_sqlite.py.
+
+    python -m pytest test_migrations.py
+"""
+
+import os
+import sqlite3
+import tempfile
+import unittest
+
+from migrations import LATEST_VERSION, current_version, migrate
+
+# Schema of the original database_setup_sqlite.py - ax/ay/az are nullable
+LEGACY_SCHEMA = '''
+    CREATE TABLE predictions (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        activity TEXT NOT NULL,
+        confidence REAL,
+        timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
+    );
+    CREATE TABLE sensor_data (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        ax REAL,
+        ay REAL,
+        az REAL,
+        timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
+    );
+'''
+
+
+class LegacyDatabaseTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.db_path = os.path.join(self.tmp.name, 'legacy.db')
+
+        conn = sqlite3.connect(self.db_path)
+        conn.executescript(LEGACY_SCHEMA)
+        conn.executemany('INSERT INTO sensor_data (ax, ay, az) VALUES (?, ?, ?)',
+                         [(3.0, 4.0, 0.0), (None, 1.0, 1.0), (0.0, 0.0, 2.0)])
+        conn.commit()
+        conn.close()
+
+    def test_null_axes_do_not_stop_the_migration(self):
+        migrate(self.db_path, batch_size=1, pause=0)
+
+        conn = sqlite3.connect(self.db_path)
+        try:
+            self.assertEqual(current_version(conn), LATEST_VERSION)
+            magnitudes = [row[0] for row in conn.execute('SELECT magnitude FROM sensor_data ORDER BY id')]
+        finally:
+            conn.close()
+        self.assertEqual(magnitudes, [5.0, None, 2.0])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,166 @@
+"""
+UDP ingestion gateway.
+
+Boards send one datagram per batch instead of one HTTP request per sample.
+A datagram holds one or more binary frames (wire_protocol.py) or a single
+JSON object in the /api/upload format. Rows go through the same ingest
+pipeline (sequence dedup, row building) and write-behind writer as the HTTP
+front ends.
+
+Every binary frame whose rows were queued (or were all duplicates) is
+acknowledged with a 10-byte datagram ('AK', device_id, next expected seq) so
+a board can retransmit on loss; retransmissions are dropped by the sequence
+tracker. Frames the writer could not queue get no ack and are retransmitted.
+
+    python udp_gateway.py --port 9999
+    python udp_gateway.py --simulate --devices 5 --frames 20   # localhost smoke test
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import struct
+from datetime import datetime, timezone
+
+from feature_store import WindowAccumulator
+from ingest import SequenceTracker, parse_json_sample, frames_to_rows
+from segments import SegmentTracker
+from storage import init_db
+from wire_protocol import iter_frames, encode_frame, FrameError
+from write_behind import WriteBehindWriter
+
+ACK = struct.Struct('<2sII')
+ACK_MAGIC = b'AK'
+
+
+class IngestProtocol(asyncio.DatagramProtocol):
+    def __init__(self, tracker, writer):
+        self.tracker = tracker
+        self.writer = writer
+        self.transport = None
+        self.datagrams = 0
+        self.rejected = 0
+        self.dropped = 0
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def datagram_received(self, data, addr):
+        self.datagrams += 1
+        try:
+            if data[:1] == b'{':
+                self._handle_json(data)
+            else:
+                self._handle_frames(data, addr)
+        except (FrameError, ValueError, KeyError, TypeError, AttributeError):
+            # Malformed payload - never let it escape the protocol callback
+            self.rejected += 1
+
+    def _handle_json(self, data):
+        sample = json.loads(data)
+        if not isinstance(sample, dict):
+            raise ValueError('JSON datagram is not an object')
+        sensor_row, prediction_row = parse_json_sample(sample, datetime.now(timezone.utc))
+        device_id, seq = sensor_row[4], sensor_row[5]
+        if seq is not None and not self.tracker.accept(device_id, seq):
+            return
+        # The writer hands the seq back if it cannot queue the sample
+        if not self.writer.submit({device_id: [sensor_row]}, [prediction_row]):
+            self.dropped += 1
+
+    def _handle_frames(self, data, addr):
+        frames = list(iter_frames(data))
+        now = datetime.now(timezone.utc)
+
+        for frame in frames:
+            header = frame[0]
+            # One queue item per frame: it is either queued or handed back whole
+            sensor_rows, prediction_rows = frames_to_rows([frame], self.tracker, now)
+            if not self.writer.submit(sensor_rows, prediction_rows):
+                self.dropped += 1
+                continue
+
+            # Acknowledge duplicates too - the board only needs to know it arrived
+            self.transport.sendto(ACK.pack(ACK_MAGIC, header.device_id, header.seq + header.count), addr)
+
+    def stats(self):
+        return {'datagrams': self.datagrams, 'rejected': self.rejected, 'dropped': self.dropped}
+
+
+async def serve(host='0.0.0.0', port=9999, tracker=None, writer=None):
+    """Start the gateway and return (transport, protocol)"""
+    tracker = tracker or SequenceTracker()
+    writer = writer or WriteBehindWriter(tracker=tracker, accumulator=WindowAccumulator(), segments=SegmentTracker())
+    writer.start()
+
+    loop = asyncio.get_running_loop()
+    return await loop.create_datagram_endpoint(lambda: IngestProtocol(tracker, writer), local_addr=(host, port))
+
+
+async def simulate(host, port, devices, frames, frame_size):
+    """Send frames from several fake boards and wait for every ack"""
+    loop = asyncio.get_running_loop()
+    acked = {}
+    done = loop.create_future()
+    expected = devices * frames
+
+    class Client(asyncio.DatagramProtocol):
+        def datagram_received(self, data, addr):
+            magic, device_id, next_seq = ACK.unpack(data)
+            acked[(device_id, next_seq)] = True
+            if len(acked) >= expected and not done.done():
+                done.set_result(True)
+
+    transport, _ = await loop.create_datagram_endpoint(Client, remote_addr=(host, port))
+    for n in range(frames):
+        for device_id in range(1, devices + 1):
+            samples = [[random.randint(-20000, 20000) for _ in range(6)] for _ in range(frame_size)]
+            transport.sendto(encode_frame(device_id, n * frame_size, 50, samples, activity='walking'))
+    try:
+        await asyncio.wait_for(done, timeout=5.0)
+    except asyncio.TimeoutError:
+        pass
+    transport.close()
+    return len(acked), expected
+
+
+async def main_async(args):
+    tracker = SequenceTracker()
+    writer = WriteBehindWriter(tracker=tracker, accumulator=WindowAccumulator(), segments=SegmentTracker())
+    init_db(tracker)
+    transport, protocol = await serve(args.host, args.port, tracker, writer)
+    print(f"✓ UDP gateway listening on {args.host}:{args.port}")
+
+    try:
+        if args.simulate:
+            acked, expected = await simulate('127.0.0.1', args.port, args.devices, args.frames, args.frame_size)
+            await asyncio.sleep(writer.flush_interval * 4)
+            print(json.dumps({'acked_frames': acked, 'sent_frames': expected,
+                              'gateway': protocol.stats(), 'writer': writer.stats(),
+                              'devices': tracker.stats()}, indent=2))
+        else:
+            await asyncio.Event().wait()
+    finally:
+        transport.close()
+        writer.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='UDP ingestion gateway for STM32 binary frames')
+    parser.add_argument('--host', default='0.0.0.0')
+    parser.add_argument('--port', type=int, default=9999)
+    parser.add_argument('--simulate', action='store_true', help='send test frames from localhost, print stats and exit')
+    parser.add_argument('--devices', type=int, default=5)
+    parser.add_argument('--frames', type=int, default=20)
+    parser.add_argument('--frame-size', type=int, default=50)
+    args = parser.parse_args()
+
+    try:
+        asyncio.run(main_async(args))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,101 @@
+"""
+Compact binary framing for STM32 sensor uploads.
+
+A frame is a fixed 16-byte little-endian header followed by `count` packed
+samples. Each sample is six int16 values straight from the ICM20608
+registers: ax, ay, az, gx, gy, gz (raw LSB, no float conversion on device).
+
+    offset  size  field
+    0       2     magic 'AR'
+    2       1     version
+    3       1     activity code (see ACTIVITY_CODES)
+    4       4     device id
+    8       4     sequence number of the first sample in the frame
+    12      2     sample rate (Hz)
+    14      2     sample count
+
+Several frames may be concatenated in one request body.
+"""
+
+import struct
+from collections import namedtuple
+
+import numpy as np
+
+MAGIC = b'AR'
+VERSION = 1
+
+HEADER = struct.Struct('<2sBBIIHH')
+HEADER_SIZE = HEADER.size          # 16 bytes
+AXES = 6
+SAMPLE_SIZE = AXES * 2             # 12 bytes per sample
+SAMPLE_DTYPE = np.dtype('<i2')
+
+# ICM20608 defaults used by the firmware (+-2g, +-250 deg/s)
+ACCEL_LSB_PER_G = 16384.0
+GYRO_LSB_PER_DPS = 131.0
+
+ACTIVITY_CODES = {
+    0: 'unknown',
+    1: 'idle',
+    2: 'walking',
+    3: 'running',
+    4: 'calibrating'
+}
+
+FrameHeader = namedtuple('FrameHeader', ['version', 'activity', 'device_id', 'seq', 'sample_rate', 'count'])
+
+
+class FrameError(ValueError):
+    """Raised when a body is not a well-formed sequence of frames"""
+
+
+def decode_frame(buf, offset=0):
+    """Decode one frame starting at `offset`.
+
+    Returns (header, samples, next_offset). `samples` is an (count, 6) int16
+    array that views `buf` directly - nothing is copied.
+    """
+    if len(buf) - offset < HEADER_SIZE:
+        raise FrameError(f'Truncated header at offset {offset}')
+
+    magic, version, activity, device_id, seq, rate, count = HEADER.unpack_from(buf, offset)
+
+    if magic != MAGIC:
+        raise FrameError(f'Bad magic {magic!r} at offset {offset}')
+    if version != VERSION:
+        raise FrameError(f'Unsupported frame version {version}')
+
+    start = offset + HEADER_SIZE
+    end = start + count * SAMPLE_SIZE
+    if end > len(buf):
+        raise FrameError(f'Frame at offset {offset} declares {count} samples but body is truncated')
+
+    samples = np.frombuffer(buf, dtype=SAMPLE_DTYPE, count=count * AXES, offset=start).reshape(count, AXES)
+    header = FrameHeader(version, ACTIVITY_CODES.get(activity, 'unknown'), device_id, seq, rate, count)
+
+    return header, samples, end
+
+
+def iter_frames(buf):
+    """Yield (header, samples) for every frame in a request body"""
+    view = memoryview(buf)
+    offset = 0
+    while offset < len(view):
+        header, samples, offset = decode_frame(view, offset)
+        yield header, samples
+
+
+def to_physical(samples):
+    """Convert raw int16 samples to (accel in g, gyro in deg/s) float arrays"""
+    accel = samples[:, :3] / ACCEL_LSB_PER_G
+    gyro = samples[:, 3:] / GYRO_LSB_PER_DPS
+    return accel, gyro
+
+
+def encode_frame(device_id, seq, sample_rate, samples, activity='unknown'):
+    """Build a frame from raw int16 samples (used by simulators and tests)"""
+    codes = {name: code for code, name in ACTIVITY_CODES.items()}
+    raw = np.ascontiguousarray(samples, dtype=SAMPLE_DTYPE).reshape(-1, AXES)
+    header = HEADER.pack(MAGIC, VERSION, codes.get(activity, 0), device_id, seq, sample_rate, len(raw))
+    return header + raw.tobytes()
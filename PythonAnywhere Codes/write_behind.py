@@ -0,0 +1,170 @@
+"""
+Write-behind writer: request handlers enqueue rows and return immediately,
+a single background thread drains the queue and commits rows in batches
+(one transaction per batch instead of one per sample).
+
+Sequence numbers of rows that never reach the database - queue full or a
+failed flush - are handed back to the tracker so the client's retry is stored.
+"""
+
+import queue
+import threading
+import time
+
+from metrics import loop_seconds
+from feature_store import insert_feature_rows
+from ingest import forget_rows
+from storage import get_db_connection, insert_sensor_rows, insert_predictions
+from structured_log import get_logger
+
+log = get_logger('activity.write_behind')
+
+
+class WriteBehindWriter:
+    def __init__(self, tracker=None, batch_size=500, flush_interval=0.05, maxsize=10000, db_path=None,
+                 accumulator=None, segments=None):
+        self.tracker = tracker
+        self.accumulator = accumulator
+        self.segments = segments
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.db_path = db_path
+        self.latest_prediction = None
+
+        self._queue = queue.Queue(maxsize=maxsize)
+        self._thread = None
+        self._stop = threading.Event()
+
+        self.batches = 0
+        self.rows_written = 0
+        self.rows_dropped = 0
+        self.last_flush_ms = 0.0
+
+    # Producer side - never blocks the caller
+    def submit(self, sensor_rows, prediction_rows=()):
+        """Queue sensor rows ({device_id: rows}) and prediction rows as one item.
+
+        Returns False, with nothing queued, if the queue is full.
+        """
+        prediction_rows = list(prediction_rows)
+        count = sum(len(rows) for rows in sensor_rows.values()) + len(prediction_rows)
+        if count == 0:
+            return True
+        try:
+            self._queue.put_nowait((sensor_rows, prediction_rows, count))
+        except queue.Full:
+            self.rows_dropped += count
+            self._release(sensor_rows)
+            return False
+        if prediction_rows:
+            self.latest_prediction = prediction_rows[-1]
+        return True
+
+    def submit_samples(self, device_id, rows):
+        """Queue sensor rows for one device. Returns False if the queue is full."""
+        return self.submit({device_id: rows})
+
+    def submit_predictions(self, rows):
+        return self.submit({}, rows)
+
+    def _release(self, sensor_rows):
+        if self.tracker is not None:
+            forget_rows(self.tracker, sensor_rows)
+
+    # Consumer side
+    def start(self):
+        if self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, daemon=True, name="WriteBehindWriter")
+            self._thread.start()
+
+    def stop(self, timeout=5.0):
+        """Flush what is queued and stop the writer thread"""
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join(timeout)
+            self._thread = None
+
+    def _drain(self):
+        items = []
+        count = 0
+        try:
+            item = self._queue.get(timeout=self.flush_interval)
+        except queue.Empty:
+            return items
+        items.append(item)
+        count += item[2]
+        while count < self.batch_size:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            items.append(item)
+            count += item[2]
+        return items
+
+    @staticmethod
+    def _merge(items):
+        sensor_rows = {}
+        prediction_rows = []
+        for sensors, predictions, _ in items:
+            for device_id, rows in sensors.items():
+                sensor_rows.setdefault(device_id, []).extend(rows)
+            prediction_rows.extend(predictions)
+        return sensor_rows, prediction_rows
+
+    def _flush(self, conn, sensor_rows, prediction_rows):
+        started = time.perf_counter()
+        cursor = conn.cursor()
+
+        stored = {}
+        for device_id, rows in sensor_rows.items():
+            stored[device_id] = insert_sensor_rows(cursor, rows)
+            if self.accumulator is not None:
+                insert_feature_rows(cursor, self.accumulator.add(device_id, rows))
+        written = sum(stored.values()) + insert_predictions(cursor, prediction_rows)
+        if self.segments is not None:
+            self.segments.record_rows(cursor, prediction_rows)
+        conn.commit()
+
+        if self.tracker is not None:
+            for device_id, count in stored.items():
+                self.tracker.record_db_duplicates(device_id, len(sensor_rows[device_id]) - count)
+
+        elapsed = time.perf_counter() - started
+        self.batches += 1
+        self.rows_written += written
+        self.last_flush_ms = elapsed * 1000
+        loop_seconds.observe(elapsed, 'write_behind_flush')
+
+    def _run(self):
+        conn = get_db_connection(self.db_path)
+        try:
+            while not (self._stop.is_set() and self._queue.empty()):
+                items = self._drain()
+                if not items:
+                    continue
+                sensor_rows, prediction_rows = self._merge(items)
+                saved = self.accumulator.snapshot(sensor_rows) if self.accumulator is not None else None
+                try:
+                    self._flush(conn, sensor_rows, prediction_rows)
+                except Exception:
+                    conn.rollback()
+                    if saved is not None:
+                        self.accumulator.restore(saved)
+                    if self.segments is not None:
+                        self.segments.reset()
+                    self.rows_dropped += sum(item[2] for item in items)
+                    self._release(sensor_rows)
+                    log.exception('write-behind flush failed', extra={'fields': {'items': len(items)}})
+        finally:
+            conn.close()
+
+    def stats(self):
+        return {
+            'queue_size': self._queue.qsize(),
+            'batches': self.batches,
+            'rows_written': self.rows_written,
+            'rows_dropped': self.rows_dropped,
+            'last_flush_ms': round(self.last_flush_ms, 3)
+        }